@@ -9,10 +9,173 @@ class Settings:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    OPENAI_API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions")
     
     HW_API_KEY = os.getenv("HW_SERVER_API_KEY")
     HW_API_URL = os.getenv("HW_API_URL", "").replace("localhost", "host.docker.internal")
 
+    HEYGEN_API_URL = os.getenv("HEYGEN_API_URL", "https://api.heygen.com")
 
-settings = Settings()
+    # LLM providers in order of preference: openai, local (llama.cpp / Ollama, OpenAI-compatible), fake (in-process, offline)
+    LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", "openai")
+    LOCAL_LLM_URL = os.getenv("LOCAL_LLM_URL", "http://localhost:11434/v1/chat/completions")
+    LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "llama3.2")
+    LOCAL_LLM_API_KEY = os.getenv("LOCAL_LLM_API_KEY")
+    FAKE_LLM_TTFT = float(os.getenv("FAKE_LLM_TTFT", "0.3"))
+    FAKE_LLM_TOKEN_DELAY = float(os.getenv("FAKE_LLM_TOKEN_DELAY", "0.02"))
+    FAKE_LLM_TOKENS = int(os.getenv("FAKE_LLM_TOKENS", "40"))
+    FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0.2"))
+    FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+    FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+    # "latency" tries providers by observed time-to-first-token and error rate; "ordered" keeps LLM_PROVIDERS order
+    LLM_ROUTING = os.getenv("LLM_ROUTING", "latency")
+    # Seconds without a first token before the request is also sent to the next provider; 0 disables hedging
+    LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "2.0"))
+    # Requests per provider kept for the p50/p95 and error-rate figures
+    LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", "200"))
+
+    # Admission control for upstream LLM streams: global and per-user concurrency, optional global rate (streams/s)
+    LLM_MAX_CONCURRENT_STREAMS = int(os.getenv("LLM_MAX_CONCURRENT_STREAMS", "50"))
+    LLM_MAX_STREAMS_PER_USER = int(os.getenv("LLM_MAX_STREAMS_PER_USER", "2"))
+    LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "0"))
+    LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "10"))
+    # Streams that cannot start at once wait (homework first, then lessons, then English chat) for at most LLM_QUEUE_TIMEOUT seconds
+    LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "200"))
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "15"))
+
+    # Key for GET /api/metrics and /api/metrics/snapshot, sent as x-api-key or "Authorization: Bearer"; unset disables both
+    METRICS_API_KEY = os.getenv("METRICS_API_KEY")
+
+    # Diagnostic mode: measures event-loop lag and logs every stretch where the loop was blocked
+    # for longer than LOOP_BLOCK_THRESHOLD seconds, with the route and stack of the blocking code
+    LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() == "true"
+    LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.05"))
+    LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+
+    # Shared outbound HTTP connection pool (app lifetime, see app/services/http.py)
+    HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+    HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "50"))
+    HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+    HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+    # Max silence between two reads; streams can legitimately run longer than this in total
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+
+    # Proxied REST upstreams (HeyGen, HW server): per-upstream timeout, retries, circuit breaker
+    HEYGEN_TIMEOUT = float(os.getenv("HEYGEN_TIMEOUT", "10"))
+    HW_API_TIMEOUT = float(os.getenv("HW_API_TIMEOUT", "10"))
+    UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+    UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.2"))
+    UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "2"))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+    # Bulk stop of HeyGen streaming sessions
+    HEYGEN_STOP_CONCURRENCY = int(os.getenv("HEYGEN_STOP_CONCURRENCY", "10"))
+    HEYGEN_STOP_TIMEOUT = float(os.getenv("HEYGEN_STOP_TIMEOUT", "10"))
+
+    # HeyGen avatar list and remaining credits: served from memory, refetched in the background once older
+    # than their TTL; if HeyGen is down the last good value is served (marked stale) for up to HEYGEN_CACHE_MAX_STALE
+    HEYGEN_AVATAR_LIST_TTL = float(os.getenv("HEYGEN_AVATAR_LIST_TTL", "600"))
+    HEYGEN_CREDITS_TTL = float(os.getenv("HEYGEN_CREDITS_TTL", "60"))
+    HEYGEN_CACHE_MAX_STALE = float(os.getenv("HEYGEN_CACHE_MAX_STALE", "86400"))
+
+    # Streaming tokens fetched ahead of avatar starts. The pool keeps enough tokens for HEYGEN_TOKEN_POOL_HORIZON
+    # seconds of the start rate seen over the last HEYGEN_TOKEN_POOL_WINDOW seconds, between MIN and MAX (MAX=0
+    # disables it). HeyGen does not always say when a token expires: HEYGEN_TOKEN_TTL is assumed then, and tokens
+    # with less than HEYGEN_TOKEN_MIN_REMAINING seconds left are dropped
+    HEYGEN_TOKEN_POOL_MIN = int(os.getenv("HEYGEN_TOKEN_POOL_MIN", "1"))
+    HEYGEN_TOKEN_POOL_MAX = int(os.getenv("HEYGEN_TOKEN_POOL_MAX", "8"))
+    HEYGEN_TOKEN_POOL_WINDOW = float(os.getenv("HEYGEN_TOKEN_POOL_WINDOW", "60"))
+    HEYGEN_TOKEN_POOL_HORIZON = float(os.getenv("HEYGEN_TOKEN_POOL_HORIZON", "15"))
+    HEYGEN_TOKEN_TTL = float(os.getenv("HEYGEN_TOKEN_TTL", "600"))
+    HEYGEN_TOKEN_MIN_REMAINING = float(os.getenv("HEYGEN_TOKEN_MIN_REMAINING", "60"))
+
+    # Zombie avatar reaper: registered sessions without a heartbeat for AVATAR_HEARTBEAT_TTL seconds get stopped
+    AVATAR_REAPER_ENABLED = os.getenv("AVATAR_REAPER_ENABLED", "true").lower() == "true"
+    AVATAR_HEARTBEAT_TTL = float(os.getenv("AVATAR_HEARTBEAT_TTL", "30"))
+    AVATAR_REAPER_INTERVAL = float(os.getenv("AVATAR_REAPER_INTERVAL", "10"))
+
+    # Classroom background: uploads above BACKGROUND_MAX_BYTES are refused; with Pillow installed, WebP variants
+    # of BACKGROUND_WIDTHS pixels are generated and displays get the one closest to BACKGROUND_DISPLAY_WIDTH
+    BACKGROUND_DIR = os.getenv("BACKGROUND_DIR", "app/data/backgrounds")
+    # Names the current background; kept outside BACKGROUND_DIR, which is served with immutable caching
+    BACKGROUND_POINTER_FILE = os.getenv("BACKGROUND_POINTER_FILE", "app/data/background.json")
+    BACKGROUND_MAX_BYTES = int(os.getenv("BACKGROUND_MAX_BYTES", str(10 * 1024 * 1024)))
+    BACKGROUND_WIDTHS = os.getenv("BACKGROUND_WIDTHS", "640,1280,1920")
+    BACKGROUND_DISPLAY_WIDTH = int(os.getenv("BACKGROUND_DISPLAY_WIDTH", "1280"))
+    BACKGROUND_WEBP_QUALITY = int(os.getenv("BACKGROUND_WEBP_QUALITY", "80"))
+    BACKGROUND_TRANSCODE_WORKERS = int(os.getenv("BACKGROUND_TRANSCODE_WORKERS", "1"))
+
+    # Lesson videos (/api/media/Videos): the first MEDIA_HOT_BYTES of a video requested MEDIA_HOT_AFTER times
+    # are kept in memory, up to MEDIA_HOT_CACHE_BYTES in total, so playback starts without touching the disk
+    MEDIA_VIDEO_DIR = os.getenv("MEDIA_VIDEO_DIR", "app/data/Videos")
+    MEDIA_CHUNK_SIZE = int(os.getenv("MEDIA_CHUNK_SIZE", str(256 * 1024)))
+    MEDIA_HOT_BYTES = int(os.getenv("MEDIA_HOT_BYTES", str(2 * 1024 * 1024)))
+    MEDIA_HOT_CACHE_BYTES = int(os.getenv("MEDIA_HOT_CACHE_BYTES", str(128 * 1024 * 1024)))
+    MEDIA_HOT_AFTER = int(os.getenv("MEDIA_HOT_AFTER", "2"))
+    MEDIA_STAT_INTERVAL = float(os.getenv("MEDIA_STAT_INTERVAL", "2.0"))
+    MEDIA_MAX_AGE = int(os.getenv("MEDIA_MAX_AGE", "300"))
 
+    # Lesson history storage: "sqlite" (HISTORY_DIR/history.db) or "jsonl" (HISTORY_DIR/history.jsonl + .idx,
+    # single worker only: a second process refuses to open it)
+    HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "sqlite")
+    HISTORY_DIR = os.getenv("HISTORY_DIR", "app/data")
+    HISTORY_FSYNC_EVERY = int(os.getenv("HISTORY_FSYNC_EVERY", "64"))
+    HISTORY_FSYNC_INTERVAL = float(os.getenv("HISTORY_FSYNC_INTERVAL", "1.0"))
+    # GET /api/history page size when the client pages with ?cursor= but no ?limit=, and the largest limit accepted
+    HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "500"))
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "5000"))
+
+    # Homework chat sessions: "memory" (per-process LRU) or "sqlite" (HW_SESSION_DB, shared by all workers).
+    # Keep the database outside app/data, which is served at /api/media
+    HW_SESSION_BACKEND = os.getenv("HW_SESSION_BACKEND", "memory")
+    HW_SESSION_DB = os.getenv("HW_SESSION_DB", "var/hw_sessions.db")
+    # Avatar heartbeats for the zombie reaper: "memory" is per process, so with several workers use "sqlite"
+    # (a table in HW_SESSION_DB) or each worker's reaper would stop sessions kept alive through another worker
+    AVATAR_REGISTRY_BACKEND = os.getenv("AVATAR_REGISTRY_BACKEND", HW_SESSION_BACKEND)
+    # Sessions idle for HW_SESSION_TTL seconds are dropped; the caps evict least recently used sessions first
+    HW_SESSION_TTL = float(os.getenv("HW_SESSION_TTL", "3600"))
+    HW_SESSION_MAX_ENTRIES = int(os.getenv("HW_SESSION_MAX_ENTRIES", "10000"))
+    HW_SESSION_MAX_BYTES = int(os.getenv("HW_SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    # Server-side chat memory (hw and English chat): estimated prompt token budget per request.
+    # Older turns that no longer fit are dropped, or folded into a rolling summary when CHAT_MEMORY_SUMMARIZE is on.
+    CHAT_MEMORY_TOKEN_BUDGET = int(os.getenv("CHAT_MEMORY_TOKEN_BUDGET", "3000"))
+    CHAT_MEMORY_SUMMARIZE = os.getenv("CHAT_MEMORY_SUMMARIZE", "false").lower() == "true"
+    CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "200"))
+
+    # Prompts are sent as static prefix -> session context -> turn; a prefix seen again within this window counts as reusable
+    PROMPT_REUSE_WINDOW = float(os.getenv("PROMPT_REUSE_WINDOW", "300"))
+    # Ask the upstream for a final usage chunk (stream_options.include_usage) to report real cached_tokens
+    LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "false").lower() == "true"
+
+    # ?mode=speech on the chat routers: clauses shorter than this are held until the sentence ends,
+    # and a run without punctuation is broken at a word gap once it reaches SPEECH_MAX_CHARS
+    SPEECH_MIN_CLAUSE_CHARS = int(os.getenv("SPEECH_MIN_CLAUSE_CHARS", "40"))
+    SPEECH_MAX_CHARS = int(os.getenv("SPEECH_MAX_CHARS", "200"))
+
+    # How often (seconds) the in-memory lesson catalog re-checks sessions/topics/script files for changes
+    CATALOG_CHECK_INTERVAL = float(os.getenv("CATALOG_CHECK_INTERVAL", "1.0"))
+
+    # LLM streams are forwarded byte-for-byte; transcript capture for logging is opt-in
+    LLM_TRANSCRIPT_LOG = os.getenv("LLM_TRANSCRIPT_LOG", "false").lower() == "true"
+    LLM_TRANSCRIPT_MAX_BYTES = int(os.getenv("LLM_TRANSCRIPT_MAX_BYTES", "65536"))
+
+    # Answer cache for the lesson Q&A path (/api/chat)
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+    LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "600"))
+    # Jaccard similarity (0-1) for near-duplicate questions; 0 keeps the cache exact-match only
+    LLM_CACHE_NEAR_THRESHOLD = float(os.getenv("LLM_CACHE_NEAR_THRESHOLD", "0"))
+    # Replay pacing relative to the recorded stream; 0 replays without delays
+    LLM_CACHE_REPLAY_SPEED = float(os.getenv("LLM_CACHE_REPLAY_SPEED", "1.0"))
+
+    # Single-flight: identical concurrent prompts share one upstream stream
+    LLM_COALESCE_ENABLED = os.getenv("LLM_COALESCE_ENABLED", "true").lower() == "true"
+    # Per-subscriber queue length (in chunks) before a slow client falls back to catch-up reads
+    LLM_COALESCE_BUFFER = int(os.getenv("LLM_COALESCE_BUFFER", "256"))
+
+
+settings = Settings()
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import requests
 from app.core.config import settings
+from app.services.http import hw_api, UpstreamError
 
 router = APIRouter()
 
@@ -12,8 +12,6 @@ class LoginRequest(BaseModel):
 @router.post("/auth/login")
 async def login(request: LoginRequest):
     # Proxy to HW API
-    url = f"{settings.HW_API_URL}/api/login"
-    
     try:
         # Include API Key if available, though login is typically public
         headers = {}
@@ -25,7 +23,7 @@ async def login(request: LoginRequest):
             "password": request.password
         }
             
-        response = requests.post(url, json=payload, headers=headers)
+        response = await hw_api.post("/api/login", json=payload, headers=headers)
         
         # Forward error
         if response.status_code != 200:
@@ -38,5 +36,5 @@ async def login(request: LoginRequest):
             
         return response.json()
         
-    except requests.exceptions.RequestException as e:
+    except UpstreamError as e:
         raise HTTPException(status_code=500, detail=f"Failed to connect to auth provider: {str(e)}")
@@ -1,17 +1,24 @@
 from fastapi import APIRouter, Request
-from fastapi.responses import StreamingResponse
 from app.services.llm import get_llm_service
+from app.services.speech import speech_streamer
+from app.services.streaming import CancellableStreamingResponse
+from app.services.admission import Caller, identify, PRIORITY_LESSON
 
 router = APIRouter()
 
 @router.post("/chat")
-async def chat_proxy(request: Request):
+async def chat_proxy(request: Request, mode: str = "tokens"):
     body = await request.json()
     messages = body.get("messages", [])
     
     llm_service = get_llm_service()
     
-    return StreamingResponse(
-        llm_service.generate_response(messages), 
+    stream = llm_service.generate_response(messages, Caller(identify(request), PRIORITY_LESSON))
+    # mode=speech: complete sentences/clauses with sequence numbers, ready for avatar speak calls
+    if mode == "speech":
+        stream = speech_streamer.stream(stream)
+    
+    return CancellableStreamingResponse(
+        stream, 
         media_type="text/event-stream"
     )
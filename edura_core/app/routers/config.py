@@ -1,11 +1,15 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from starlette.datastructures import UploadFile
 from app.core.config import settings
-import shutil
-import os
-import uuid
+from app.services.backgrounds import background_store, UploadRejected
+from app.services.etag import etag_response
 
 router = APIRouter()
 
+# Multipart boundaries and part headers on top of the image itself
+MULTIPART_OVERHEAD = 64 * 1024
+
 @router.get("/config")
 async def get_config():
     return {
@@ -13,50 +17,26 @@ async def get_config():
     }
 
 @router.get("/config/background")
-async def get_background():
-    upload_dir = "app/data/backgrounds"
-    if not os.path.exists(upload_dir):
-        return {"url": None}
-    
-    files = os.listdir(upload_dir)
-    # Filter for image files if needed, or just take the first one
-    images = [f for f in files if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp'))]
-    
-    if not images:
-        return {"url": None}
-        
-    # Return the first found image
-    return {"url": f"/api/media/backgrounds/{images[0]}"}
+async def get_background(request: Request, width: Optional[int] = Query(None, ge=1)):
+    # `url` is a resized variant for a display `width` pixels wide (BACKGROUND_DISPLAY_WIDTH by default).
+    # Polled by every avatar screen: served from memory, and a matching If-None-Match gets a 304
+    return etag_response(request, await background_store.current(width))
 
 @router.post("/config/upload_background")
-async def upload_background(file: UploadFile = File(...)):
-    # Validate file type
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
-    
-    # Create directory if not exists
-    upload_dir = "app/data/backgrounds"
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    # Clean existing files
-    for filename in os.listdir(upload_dir):
-        file_path = os.path.join(upload_dir, filename)
-        try:
-            if os.path.isfile(file_path) or os.path.islink(file_path):
-                os.unlink(file_path)
-        except Exception as e:
-            print(f"Failed to delete {file_path}. Reason: {e}")
+async def upload_background(request: Request):
+    # Refuse oversized bodies before reading them; the store also counts the bytes it copies
+    length = request.headers.get("content-length")
+    if length is None:
+        raise HTTPException(status_code=411, detail="Content-Length required")
+    if not length.isdigit() or int(length) > settings.BACKGROUND_MAX_BYTES + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail=f"Image is larger than {settings.BACKGROUND_MAX_BYTES // (1024 * 1024)} MB")
 
-    # Generate unique filename to avoid caching issues with same name
-    file_extension = os.path.splitext(file.filename)[1]
-    filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(upload_dir, filename)
-    
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Could not save file: {str(e)}")
-        
-    # Return URL path served by StaticFiles (mounted at /api/media)
-    return {"url": f"/api/media/backgrounds/{filename}"}
+    async with request.form(max_files=1, max_fields=10) as form:
+        file = form.get("file")
+        if not isinstance(file, UploadFile):
+            raise HTTPException(status_code=400, detail="Missing file")
+        try:
+            # Content-addressed URLs, served with immutable cache headers from /api/media/backgrounds
+            return await background_store.save(file)
+        except UploadRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
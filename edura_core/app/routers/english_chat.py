@@ -1,36 +1,50 @@
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Request
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
+import uuid
 from app.services.llm import get_llm_service
+from app.services.session_store import english_sessions, ChatSession
+from app.services.memory import chat_memory
+from app.services.prompt_builder import prompt_builder
+from app.services.speech import speech_streamer
+from app.services.streaming import CancellableStreamingResponse
+from app.services.admission import Caller, identify, PRIORITY_ENGLISH
 
 router = APIRouter()
 
 class ChatRequest(BaseModel):
     message: str
-    history: List[Dict[str, str]] = [] # Optional client-provided history
+    session_id: Optional[str] = None # Returned in the X-Session-Id header of the first reply
+    history: List[Dict[str, str]] = [] # Optional; only seeds a new session
 
 @router.post("/chat")
-async def english_chat(request: ChatRequest):
+async def english_chat(request: ChatRequest, http_request: Request, mode: str = "tokens"):
     llm_service = get_llm_service()
     
-    # 1. Specialized System Prompt
-    system_prompt = """
-You are a helpful and knowledgeable English teacher. 
-Your goal is to clarify the student's doubts about English grammar, vocabulary, literature, or writing.
-Keep your answers concise (strictly under 50 words) and easy to understand.
-If the question is unrelated to English, politely steer the student back to the subject.
-"""
+    # 1. Specialized System Prompt (precompiled and interned, identical for every student)
+    system_prompt = prompt_builder.english_prefix
     
-    # 2. Combine client history with current message
-    client_messages = [m for m in request.history if m.get('role') != 'system']
-    messages = client_messages + [{"role": "user", "content": request.message}]
+    # 2. Resume the conversation, or start one (unknown/expired ids get a fresh session)
+    session = await english_sessions.get(request.session_id) if request.session_id else None
+    if session is None:
+        session = ChatSession(str(uuid.uuid4()), {}, "", system_prompt)
+        chat_memory.seed(session, request.history)
+    messages = chat_memory.assemble(session, request.message)
     
     # 3. Generate Response
-    return StreamingResponse(
+    stream = chat_memory.stream_turn(
+        english_sessions, session, request.message,
         llm_service.generate_conversational_response(
-            system_prompt=system_prompt.strip(),
-            messages=messages
-        ),
-        media_type="text/event-stream"
+            system_prompt=session.system_prompt,
+            messages=messages,
+            caller=Caller(identify(http_request, session.session_id), PRIORITY_ENGLISH)
+        )
+    )
+    if mode == "speech":
+        stream = speech_streamer.stream(stream)
+    
+    return CancellableStreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"X-Session-Id": session.session_id}
     )
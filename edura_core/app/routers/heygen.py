@@ -1,38 +1,42 @@
-import requests
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from app.core.config import settings
+from app.services.etag import etag_response
+from app.services.http import heygen_api
+from app.services import heygen
+from app.services.avatar_sessions import avatar_registry
 
 router = APIRouter()
 
-HEYGEN_API_URL = "https://api.heygen.com"
+
+async def cached_response(request: Request, lookup: heygen.CachedLookup, what: str) -> Response:
+    try:
+        prepared, status, age = await lookup.get()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get HeyGen {what}: {str(e)}")
+    response = etag_response(request, prepared)
+    # HIT / REVALIDATING / STALE (HeyGen failing, body has "stale": true) / MISS
+    response.headers["X-Cache"] = status
+    response.headers["Age"] = str(age)
+    return response
+
 
 @router.post("/heygen/token")
 async def get_heygen_token():
     if not settings.HEYGEN_API_KEY:
         raise HTTPException(status_code=500, detail="HEYGEN_API_KEY not configured on server.")
 
-    headers = {
-        "x-api-key": settings.HEYGEN_API_KEY
-    }
-    
     try:
-        response = requests.post(f"{HEYGEN_API_URL}/v1/streaming.create_token", headers=headers)
-        response.raise_for_status()
-        return response.json()
+        # From the pre-fetched pool when it has one, else straight from HeyGen
+        body = await heygen.token_pool.take()
+        # A new session starts spending credits; refetch them on the next read
+        heygen.credits_cache.invalidate()
+        return body
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get HeyGen token: {str(e)}")
 
 @router.get("/heygen/avatar_list")
-async def get_avatar_list():
-    try:
-        headers = {
-            "x-api-key": settings.HEYGEN_API_KEY
-        }
-        response = requests.get(f"{HEYGEN_API_URL}/v1/streaming/avatar.list", headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get HeyGen avatar list: {str(e)}")
+async def get_avatar_list(request: Request):
+    return await cached_response(request, heygen.avatar_list_cache, "avatar list")
 
 
 @router.get("/heygen/active_sessions")
@@ -41,7 +45,7 @@ async def get_active_sessions():
         headers = {
             "x-api-key": settings.HEYGEN_API_KEY
         }
-        response = requests.get(f"{HEYGEN_API_URL}/v1/streaming.list", headers=headers)
+        response = await heygen_api.get("/v1/streaming.list", headers=headers)
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -51,41 +55,43 @@ async def get_active_sessions():
 @router.post("/heygen/stop_all_sessions")
 async def stop_all_sessions():
     try:
-        headers = {
-            "x-api-key": settings.HEYGEN_API_KEY
-        }
-        response = requests.get(f"{HEYGEN_API_URL}/v1/streaming.list", headers=headers)
-        response.raise_for_status()
-        sessionData = response.json()["data"]["sessions"]
-
-        if not sessionData:
-            return {"data": "No active sessions found"}
-
-        stoppedSessions = []
-
-        for session in sessionData:
-            session_id = session["session_id"]
-            response = requests.post(f"{HEYGEN_API_URL}/v1/streaming.stop", 
-                headers=headers, 
-                json={"session_id": session_id})
-            if response.status_code == 200:
-                stoppedSessions.append(session_id)
-            else:
-                raise HTTPException(status_code=500, detail=f"Failed to stop HeyGen active sessions: {str(response.json())}")
-        return {"data": "All sessions stopped successfully", "stoppedSessions": stoppedSessions}
+        sessionData = await heygen.list_sessions()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to stop HeyGen active sessions: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to list HeyGen active sessions: {str(e)}")
+
+    if not sessionData:
+        return {"data": "No active sessions found"}
+
+    # Stop everything concurrently; one failure no longer leaves the remaining sessions running
+    report = await heygen.stop_sessions([session["session_id"] for session in sessionData])
+    heygen.credits_cache.invalidate()
+    if report["failed"]:
+        report["data"] = f"Stopped {len(report['stoppedSessions'])} sessions, {len(report['failed'])} failed"
+    else:
+        report["data"] = "All sessions stopped successfully"
+    return report
 
 
 
 @router.get("/heygen/available_credits")
-async def get_credits():
-    try:
-        headers = {
-            "x-api-key": settings.HEYGEN_API_KEY
-        }
-        response = requests.get(f"{HEYGEN_API_URL}/v2/user/remaining_quota", headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get HeyGen available credits: {str(e)}")
+async def get_credits(request: Request):
+    return await cached_response(request, heygen.credits_cache, "available credits")
+
+
+# Session registry for the zombie reaper (see AVATAR_SESSION_CLEANUP_GUIDE.md)
+@router.post("/heygen/sessions/{session_id}")
+async def register_session(session_id: str):
+    await avatar_registry.touch(session_id)
+    return {"session_id": session_id, "heartbeat_ttl": settings.AVATAR_HEARTBEAT_TTL}
+
+@router.post("/heygen/sessions/{session_id}/heartbeat", status_code=204)
+async def session_heartbeat(session_id: str):
+    # Hit every few seconds by every client: one registry write (a dict store, or a SQLite upsert off the loop
+    # when workers share the registry) and an empty 204, nothing else
+    await avatar_registry.touch(session_id)
+    return Response(status_code=204)
+
+@router.delete("/heygen/sessions/{session_id}")
+async def unregister_session(session_id: str):
+    await avatar_registry.discard(session_id)
+    return {"session_id": session_id, "message": "Session unregistered"}
@@ -1,14 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import os
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 import json
-from datetime import datetime
-from typing import List
+from app.core.config import settings
+from app.services.history_store import get_history_store
 
 router = APIRouter()
 
-HISTORY_FILE = os.path.join("app", "data", "history.json")
-
 class SessionHistory(BaseModel):
     id: str
     sessionId: str
@@ -22,48 +22,72 @@ class SessionHistory(BaseModel):
 @router.post("/history")
 async def save_history(history: SessionHistory):
     try:
-        # Load existing history
-        data = []
-        if os.path.exists(HISTORY_FILE):
-             try:
-                 with open(HISTORY_FILE, "r") as f:
-                     content = f.read()
-                     if content:
-                        data = json.loads(content)
-             except json.JSONDecodeError:
-                 data = []  # Reset if corrupt
-        
-        # Append new entry
-        data.append(history.dict())
-        
-        # Save back
-        with open(HISTORY_FILE, "w") as f:
-            json.dump(data, f, indent=2)
-            
+        # Single appended record; the store handles atomicity and fsync batching
+        await run_in_threadpool(get_history_store().append, history.dict())
         return {"status": "success", "message": "History saved"}
     except Exception as e:
         print(f"Error saving history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def ndjson_export(session_id: Optional[str], created_from: Optional[str], created_to: Optional[str]):
+    # Sync generator: StreamingResponse drives it from the threadpool, one store page at a time
+    store = get_history_store()
+    for record in store.iter_records(session_id, created_from, created_to):
+        yield json.dumps(record, separators=(",", ":")).encode() + b"\n"
+
+def json_array_export(session_id: Optional[str], created_from: Optional[str], created_to: Optional[str]):
+    # The whole matching history as one JSON array, streamed so memory stays bounded by a store page
+    store = get_history_store()
+    yield b"["
+    first = True
+    for record in store.iter_records(session_id, created_from, created_to):
+        yield (b"" if first else b",") + json.dumps(record, separators=(",", ":")).encode()
+        first = False
+    yield b"]"
+
+async def history_page(response: Response, cursor, limit, session_id, created_from, created_to):
+    store = get_history_store()
+    try:
+        records, next_cursor = await run_in_threadpool(
+            store.page, cursor, limit or settings.HISTORY_PAGE_SIZE, session_id, created_from, created_to
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # The body stays a plain array for existing clients; the cursor for the next page travels in a header
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return records
+
 @router.get("/history")
-async def get_all_history():
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, "r") as f:
-                 return json.load(f)
-        except:
-             return []
-    return []
+async def get_all_history(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    sessionId: Optional[str] = None,
+    createdFrom: Optional[str] = None,
+    createdTo: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    if format == "ndjson":
+        return StreamingResponse(
+            ndjson_export(sessionId, createdFrom, createdTo),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": "attachment; filename=history.ndjson"},
+        )
+    if cursor is None and limit is None:
+        # Unpaged clients (the History page) still get every record, not just the first page
+        return StreamingResponse(json_array_export(sessionId, createdFrom, createdTo), media_type="application/json")
+    return await history_page(response, cursor, limit, sessionId, createdFrom, createdTo)
 
 @router.get("/history/{session_id}")
-async def get_session_history(session_id: str):
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, "r") as f:
-                 data = json.load(f)
-                 # Filter by sessionId
-                 results = [h for h in data if h['sessionId'] == session_id]
-                 return results
-        except:
-             return []
-    return []
+async def get_session_history(
+    session_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+):
+    # Served from the sessionId index instead of scanning every record
+    if limit is None and cursor is None:
+        store = get_history_store()
+        return await run_in_threadpool(lambda: list(store.iter_records(session_id=session_id)))
+    return await history_page(response, cursor, limit, session_id, None, None)
@@ -1,23 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import uuid
 from app.services.llm import get_llm_service, LLMService
+from app.services.session_store import hw_sessions, ChatSession
+from app.services.memory import chat_memory
+from app.services.prompt_builder import prompt_builder
+from app.services.speech import speech_streamer
+from app.services.streaming import CancellableStreamingResponse
+from app.services.admission import Caller, identify, PRIORITY_HOMEWORK
 
 router = APIRouter()
 
-# In-memory session store (Not scalable, POC only)
-# Structure: { session_id: { student_data: {}, context_prompt: "" } }
-hw_sessions: Dict[str, Any] = {}
-
 class StartSessionRequest(BaseModel):
     student_data: Dict[str, Any]
     grade_report: Optional[str] = None
 
 class ChatRequest(BaseModel):
     message: str
-    history: List[Dict[str, str]] = [] # Optional client-provided history
+    history: List[Dict[str, str]] = [] # Optional; only seeds a session that has no server-side memory yet
 
 @router.post("/session/start")
 async def start_hw_session(request: StartSessionRequest):
@@ -27,52 +28,45 @@ async def start_hw_session(request: StartSessionRequest):
     student_name = request.student_data.get("name", "Student")
     grade_report = request.grade_report or "No grade report available."
     
-    # Create a system prompt specialized for this student
-    system_prompt = f"""
-You are a helpful and encouraging tutor for {student_name}.
-You have access to their grade report: {grade_report}.
-Use this context to help answer their questions about their grades, performance, and homework.
-Be concise, friendly, and motivational.
-make sure the answer is not too lon, keep it under 50 words and is easy to understand.
-"""
+    # Shared tutor prompt plus a per-student context message, so every session has the same cacheable prefix
+    context = prompt_builder.student_context(student_name, grade_report)
     
-    hw_sessions[session_id] = {
-        "student_data": request.student_data,
-        "grade_report": grade_report,
-        "system_prompt": system_prompt.strip()
-    }
+    # Bounded store: idle sessions expire even if the client never calls DELETE
+    await hw_sessions.put(ChatSession(session_id, request.student_data, grade_report, prompt_builder.hw_tutor_prefix, context))
     
     return {"session_id": session_id, "message": "Session started successfully"}
 
 @router.post("/chat/{session_id}")
-async def hw_chat(session_id: str, request: ChatRequest):
-    session_data = hw_sessions.get(session_id)
-    if not session_data:
+async def hw_chat(session_id: str, request: ChatRequest, http_request: Request, mode: str = "tokens"):
+    session_data = await hw_sessions.get(session_id)
+    if session_data is None:
         raise HTTPException(status_code=404, detail="Session not found or expired")
     
     llm_service = get_llm_service()
     
-    # Combine client history with current message
-    # Filter out system messages from client if any (we provide the canonical system prompt)
-    client_messages = [m for m in request.history if m.get('role') != 'system']
-    
-    # Add current user message
-    # Note: If the client already adds the user message to history, checking duplication might be needed.
-    # We'll assume 'history' is PAST messages, and 'message' is the NEW one.
-    
-    messages = client_messages + [{"role": "user", "content": request.message}]
+    # The server remembers the conversation; clients only need to send the new message
+    chat_memory.seed(session_data, request.history)
+    messages = chat_memory.assemble(session_data, request.message)
     
-    return StreamingResponse(
+    stream = chat_memory.stream_turn(
+        hw_sessions, session_data, request.message,
         llm_service.generate_conversational_response(
-            system_prompt=session_data["system_prompt"],
-            messages=messages
-        ),
+            system_prompt=session_data.system_prompt,
+            messages=messages,
+            # Homework sessions are served ahead of free English chat when streams have to queue
+            caller=Caller(identify(http_request, session_id), PRIORITY_HOMEWORK)
+        )
+    )
+    if mode == "speech":
+        stream = speech_streamer.stream(stream)
+    
+    return CancellableStreamingResponse(
+        stream,
         media_type="text/event-stream"
     )
 
 @router.delete("/session/{session_id}")
 async def end_hw_session(session_id: str):
-    if session_id in hw_sessions:
-        del hw_sessions[session_id]
+    if await hw_sessions.delete(session_id):
         return {"message": "Session ended and context cleared"}
     raise HTTPException(status_code=404, detail="Session not found")
@@ -0,0 +1,59 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.core.config import settings
+from app.services.http import http_pool, heygen_api, hw_api
+from app.services.cache import response_cache
+from app.services.llm import single_flight, get_llm_service
+from app.services.avatar_sessions import avatar_reaper
+from app.services.heygen import cached_lookups, token_pool
+from app.services.session_store import hw_sessions, english_sessions
+from app.services.memory import chat_memory
+from app.services.prompt_builder import prompt_builder
+from app.services.speech import speech_streamer
+from app.services.admission import admission
+from app.services.telemetry import registry
+from app.services.streaming import disconnects
+from app.services.loop_monitor import loop_monitor
+from app.services.backgrounds import background_store
+from app.services.media import lesson_videos
+
+
+def require_metrics_key(x_api_key: Optional[str] = Header(None), authorization: Optional[str] = Header(None)):
+    # Upstream names, session counts and blocked-call stacks are operator data: never served without the key
+    if not settings.METRICS_API_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = x_api_key or (authorization[7:] if authorization and authorization.startswith("Bearer ") else "")
+    if not secrets.compare_digest(supplied.encode(), settings.METRICS_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics key")
+
+router = APIRouter(dependencies=[Depends(require_metrics_key)])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    # Prometheus text exposition: request, LLM stream and proxy latency histograms
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/metrics/snapshot")
+async def get_metrics_snapshot():
+    # Counters of every service in one document; "loop" is empty unless LOOP_MONITOR_ENABLED
+    return {
+        "pool": http_pool.snapshot(),
+        "upstreams": {api.name: api.snapshot() for api in (heygen_api, hw_api)},
+        "cache": response_cache.snapshot(),
+        "coalesce": single_flight.snapshot(),
+        "heygen_cache": {lookup.name: lookup.snapshot() for lookup in cached_lookups},
+        "token_pool": token_pool.snapshot(),
+        "avatars": avatar_reaper.snapshot(),
+        "hw_sessions": hw_sessions.snapshot(),
+        "chat_memory": {**chat_memory.snapshot(), "english_sessions": english_sessions.snapshot()},
+        "prompts": prompt_builder.snapshot(),
+        "speech": speech_streamer.snapshot(),
+        "llm": {**get_llm_service().router.snapshot(), "responses": disconnects.snapshot()},
+        "admission": admission.snapshot(),
+        "backgrounds": background_store.snapshot(),
+        "media": lesson_videos.snapshot(),
+        "loop": loop_monitor.snapshot(),
+    }
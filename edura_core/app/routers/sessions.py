@@ -1,7 +1,8 @@
-from fastapi import APIRouter, HTTPException
-import requests
-import json
+from fastapi import APIRouter, HTTPException, Request
 from app.core.config import settings
+from app.services.http import hw_api, UpstreamError
+from app.services.catalog import FileCatalog
+from app.services.etag import PreparedJSON, etag_response
 import os
 
 router = APIRouter()
@@ -12,55 +13,53 @@ SESSION_CHAPTER_MAP = {
     "nouns_1001": 2,
 }
 
-def load_json(filepath):
-    if not os.path.exists(filepath):
-        return None
-    with open(filepath, "r") as f:
-        return json.load(f)
+def resolve_script(script_data):
+    # If script file contains { "script": [...] } structure, extract it.
+    # Based on user request, "script attribute... will have name of json file".
+    # Assume the file content is the script array or an object containing "script".
+    if isinstance(script_data, dict) and "script" in script_data:
+        return script_data["script"]
+    elif isinstance(script_data, list):
+        return script_data
+    # Script file missing, empty or in an unknown shape
+    return []
 
-@router.get("/sessions")
-async def get_sessions():
-    data = load_json(SESSIONS_FILE)
+def build_sessions(load):
+    data = load(SESSIONS_FILE)
     if not data:
-        return {"sessions": []}
-    return data["sessions"]
+        return {"list": PreparedJSON({"sessions": []}), "by_id": None}
+
+    by_id = {}
+    for session in data["sessions"]:
+        # Copy: the list response keeps the script file name, the detail response gets the resolved script
+        detail = dict(session)
+        script_filename = session.get("script")
+        if not script_filename:
+            # If no script file is linked, return just session metadata (or empty script)
+            detail["script"] = []
+        else:
+            detail["script"] = resolve_script(load(os.path.join(DATA_DIR, script_filename)))
+        by_id.setdefault(session["id"], PreparedJSON(detail))
+    return {"list": PreparedJSON(data["sessions"]), "by_id": by_id}
+
+sessions_catalog = FileCatalog("sessions", build_sessions)
+
+@router.get("/sessions")
+async def get_sessions(request: Request):
+    catalog = await sessions_catalog.get()
+    return etag_response(request, catalog["list"])
 
 @router.get("/sessions/{session_id}")
-async def get_session(session_id: str):
-    data = load_json(SESSIONS_FILE)
-    if not data:
+async def get_session(session_id: str, request: Request):
+    catalog = await sessions_catalog.get()
+    if catalog["by_id"] is None:
          raise HTTPException(status_code=404, detail="Sessions data not found")
     
-    session = next((s for s in data["sessions"] if s["id"] == session_id), None)
+    session = catalog["by_id"].get(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    script_filename = session.get("script")
-    if not script_filename:
-        # If no script file is linked, return just session metadata (or empty script)
-        session["script"] = []
-        return session
-
-    script_path = os.path.join(DATA_DIR, script_filename)
-    script_data = load_json(script_path)
-    
-    if not script_data:
-        # Script file missing or empty
-        session["script"] = []
-    else:
-        # If script file contains { "script": [...] } structure, extract it.
-        # Based on user request, "script attribute... will have name of json file".
-        # Assume the file content is the script array or an object containing "script".
-        # Let's inspect `script_data`. If it has "script" key, use it. Else use the data itself if list.
-         if isinstance(script_data, dict) and "script" in script_data:
-             session["script"] = script_data["script"]
-         elif isinstance(script_data, list):
-             session["script"] = script_data
-         else:
-             # Fallback
-             session["script"] = []
-             
-    return session
+    return etag_response(request, session)
 
 @router.post("/sessions/post_homework/{session_id}")
 async def post_homework(session_id: str):
@@ -73,7 +72,12 @@ async def post_homework(session_id: str):
 
     ##/api/post_by_chapter/{chapter_id}
 
-    response = requests.put(f"{settings.HW_API_URL}/api/post_by_chapter/{chapter_id}", headers={"x-api-key": settings.HW_API_KEY})
+    try:
+        # Posting homework is not safe to repeat: a retried PUT after a timeout could post it twice
+        response = await hw_api.put(f"/api/post_by_chapter/{chapter_id}", idempotent=False,
+                                    headers={"x-api-key": settings.HW_API_KEY})
+    except UpstreamError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to connect to homework server: {str(e)}")
 
     if response.status_code != 200:
         raise HTTPException(status_code=response.status_code, detail=response.text)
@@ -83,11 +87,14 @@ async def post_homework(session_id: str):
 
 @router.get("/check_hw")
 async def check_hw_api():
-    response = requests.get(f"{settings.HW_API_URL}/api/check_api", headers={"x-api-key": settings.HW_API_KEY})
+    try:
+        response = await hw_api.get("/api/check_api", headers={"x-api-key": settings.HW_API_KEY})
+    except UpstreamError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to connect to homework server: {str(e)}")
     
     if response.status_code != 200:
         raise HTTPException(status_code=response.status_code, detail=response.text)
     
     return response.json()
 
-    
\ No newline at end of file
+    
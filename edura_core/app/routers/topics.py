@@ -1,28 +1,34 @@
-import json
 import os
-import requests
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from app.services.catalog import FileCatalog
+from app.services.etag import PreparedJSON, etag_response
 
 router = APIRouter()
 
 DATA_FILE = os.path.join(os.path.dirname(__file__), "../data/topics.json")
 
-def load_topics():
-    if not os.path.exists(DATA_FILE):
-        return []
-    with open(DATA_FILE, "r") as f:
-        return json.load(f)
+def build_topics(load):
+    topics = load(DATA_FILE) or []
+    by_id = {}
+    for t in topics:
+        by_id.setdefault(t["id"], PreparedJSON(t))
+    return {
+        # Return minimal info for list
+        "list": PreparedJSON([{"id": t["id"], "title": t["title"]} for t in topics]),
+        "by_id": by_id,
+    }
+
+topics_catalog = FileCatalog("topics", build_topics)
 
 @router.get("/topics")
-async def get_topics():
-    topics = load_topics()
-    # Return minimal info for list
-    return [{"id": t["id"], "title": t["title"]} for t in topics]
+async def get_topics(request: Request):
+    catalog = await topics_catalog.get()
+    return etag_response(request, catalog["list"])
 
 @router.get("/topics/{topic_id}")
-async def get_topic_details(topic_id: str):
-    topics = load_topics()
-    for t in topics:
-        if t["id"] == topic_id:
-            return t
-    raise HTTPException(status_code=404, detail="Topic not found")
+async def get_topic_details(topic_id: str, request: Request):
+    catalog = await topics_catalog.get()
+    topic = catalog["by_id"].get(topic_id)
+    if topic is None:
+        raise HTTPException(status_code=404, detail="Topic not found")
+    return etag_response(request, topic)
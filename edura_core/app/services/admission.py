@@ -0,0 +1,239 @@
+import asyncio
+import bisect
+import hashlib
+import itertools
+import time
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+
+from app.core.config import settings
+
+# Lower value is served first when streams have to queue
+PRIORITY_HOMEWORK = 0
+PRIORITY_LESSON = 1
+PRIORITY_ENGLISH = 2
+PRIORITY_NAMES = {PRIORITY_HOMEWORK: "homework", PRIORITY_LESSON: "lesson", PRIORITY_ENGLISH: "english"}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Server busy ({reason}), retry in {retry_after:.0f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Caller:
+    """Who an upstream LLM stream is for and its queue priority; user=None gets the global limits only."""
+
+    __slots__ = ("user", "priority")
+
+    def __init__(self, user: Optional[str], priority: int):
+        self.user = user
+        self.priority = priority
+
+
+def identify(request: Request, session_id: str = None) -> Optional[str]:
+    """Per-user identity: the bearer token from /auth/login, else the chat session id, else None (global limits only)."""
+    auth = request.headers.get("authorization", "")
+    if auth.lower().startswith("bearer ") and auth[7:].strip():
+        # Only a digest is kept, so tokens never show up in metrics or logs
+        return "token:" + hashlib.sha1(auth[7:].strip().encode()).hexdigest()[:16]
+    if session_id:
+        return "session:" + session_id
+    # Not the client address: a whole classroom shares one behind NAT or a proxy
+    return None
+
+
+class _Waiter:
+    __slots__ = ("caller", "future", "enqueued_at")
+
+    def __init__(self, caller: Caller, future: asyncio.Future, enqueued_at: float):
+        self.caller = caller
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+
+class AdmissionController:
+    """Gatekeeper for upstream LLM streams: global and per-user slots, an optional rate limit and a bounded priority queue."""
+
+    def __init__(self, max_concurrent: int, per_user: int, rate: float, burst: int, queue_size: int, max_wait: float):
+        self.max_concurrent = max_concurrent
+        self.per_user = per_user
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.active = 0
+        self._user_active: Dict[str, int] = {}
+        self._waiters: List[Tuple[Tuple[int, int], _Waiter]] = []
+        self._seq = itertools.count()
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._hold_avg: Optional[float] = None
+        self.admitted = 0
+        self.queued = 0
+        self.dequeued = 0
+        self.rejected_full = 0
+        self.rejected_deadline = 0
+        self.timed_out = 0
+        self.displaced = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def acquire(self, caller: Caller):
+        self._refill()
+        if not self._waiters and self._can_admit(caller):
+            self._admit(caller)
+            self.admitted += 1
+            return
+
+        ahead = sum(1 for (priority, _), _ in self._waiters if priority <= caller.priority)
+        estimate = self._estimated_wait(ahead)
+        if estimate > self.max_wait:
+            self.rejected_deadline += 1
+            raise AdmissionRejected("queue too long", max(estimate, 1.0))
+        if len(self._waiters) >= self.queue_size and not self._displace(caller.priority):
+            self.rejected_full += 1
+            raise AdmissionRejected("queue full", max(estimate, 1.0))
+
+        waiter = _Waiter(caller, asyncio.get_running_loop().create_future(), time.monotonic())
+        bisect.insort(self._waiters, ((caller.priority, next(self._seq)), waiter), key=lambda entry: entry[0])
+        self.queued += 1
+        self._dispatch()
+        try:
+            await asyncio.wait_for(waiter.future, self.max_wait)
+        except asyncio.TimeoutError:
+            self._remove(waiter)
+            self.timed_out += 1
+            raise AdmissionRejected("timed out in queue", max(self._estimated_wait(len(self._waiters)), 1.0))
+        except asyncio.CancelledError:
+            self._remove(waiter)
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                # Granted in the same tick the client went away: hand the slot back
+                self.release(caller, 0.0)
+            raise
+        self.admitted += 1
+
+    def release(self, caller: Caller, held: float):
+        self.active -= 1
+        if caller.user is not None:
+            remaining = self._user_active.get(caller.user, 0) - 1
+            if remaining > 0:
+                self._user_active[caller.user] = remaining
+            else:
+                self._user_active.pop(caller.user, None)
+        if held:
+            self._hold_avg = held if self._hold_avg is None else 0.8 * self._hold_avg + 0.2 * held
+        self._dispatch()
+
+    def _can_admit(self, caller: Caller) -> bool:
+        return (self.active < self.max_concurrent
+                and not self._user_full(caller)
+                and (not self.rate or self._tokens >= 1))
+
+    def _user_full(self, caller: Caller) -> bool:
+        return caller.user is not None and self._user_active.get(caller.user, 0) >= self.per_user
+
+    def _admit(self, caller: Caller):
+        self.active += 1
+        if caller.user is not None:
+            self._user_active[caller.user] = self._user_active.get(caller.user, 0) + 1
+        if self.rate:
+            self._tokens -= 1
+
+    def _refill(self):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _estimated_wait(self, ahead: int) -> float:
+        estimate = 0.0
+        if self._hold_avg is not None and self.active >= self.max_concurrent:
+            estimate = (ahead + 1) / self.max_concurrent * self._hold_avg
+        if self.rate:
+            estimate = max(estimate, (ahead + 1 - self._tokens) / self.rate)
+        return estimate
+
+    def _dispatch(self):
+        self._refill()
+        i = 0
+        while i < len(self._waiters) and self.active < self.max_concurrent:
+            waiter = self._waiters[i][1]
+            if waiter.future.done():
+                del self._waiters[i]
+                continue
+            if self._user_full(waiter.caller):
+                i += 1
+                continue
+            if self.rate and self._tokens < 1:
+                self._schedule_refill()
+                return
+            del self._waiters[i]
+            self._admit(waiter.caller)
+            waited = time.monotonic() - waiter.enqueued_at
+            self.dequeued += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            waiter.future.set_result(None)
+
+    def _schedule_refill(self):
+        if self._timer is not None:
+            return
+
+        def wake():
+            self._timer = None
+            self._dispatch()
+
+        self._timer = asyncio.get_running_loop().call_later((1 - self._tokens) / self.rate, wake)
+
+    def _displace(self, priority: int) -> bool:
+        # Newest waiter of the lowest priority, if it ranks below the arrival
+        for index in range(len(self._waiters) - 1, -1, -1):
+            (waiter_priority, _), waiter = self._waiters[index]
+            if waiter_priority <= priority:
+                return False
+            if not waiter.future.done():
+                del self._waiters[index]
+                waiter.future.set_exception(AdmissionRejected("displaced by a higher-priority request", 1.0))
+                self.displaced += 1
+                return True
+        return False
+
+    def _remove(self, waiter: _Waiter):
+        for index, (_, queued) in enumerate(self._waiters):
+            if queued is waiter:
+                del self._waiters[index]
+                return
+
+    def snapshot(self) -> Dict:
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for (priority, _), waiter in self._waiters:
+            if not waiter.future.done():
+                depth[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "users_active": len(self._user_active),
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_priority": depth,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_full": self.rejected_full,
+            "rejected_deadline": self.rejected_deadline,
+            "timed_out": self.timed_out,
+            "displaced": self.displaced,
+            "wait_avg_ms": round(self.wait_total / self.dequeued * 1000, 2) if self.dequeued else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 2),
+            "hold_avg_ms": round(self._hold_avg * 1000, 2) if self._hold_avg is not None else None,
+            "tokens": round(self._tokens, 2) if self.rate else None,
+        }
+
+
+admission = AdmissionController(
+    settings.LLM_MAX_CONCURRENT_STREAMS, settings.LLM_MAX_STREAMS_PER_USER, settings.LLM_RATE_LIMIT,
+    settings.LLM_RATE_BURST, settings.LLM_QUEUE_SIZE, settings.LLM_QUEUE_TIMEOUT,
+)
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services import heygen
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class SessionRegistry:
+    """Last-heartbeat time per HeyGen session the front end told us about, in this process only."""
+
+    __slots__ = ("_last_seen",)
+
+    def __init__(self):
+        self._last_seen: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+    async def touch(self, session_id: str):
+        self._last_seen[session_id] = time.monotonic()
+
+    async def discard(self, session_id: str):
+        self._last_seen.pop(session_id, None)
+
+    async def lapsed(self, ttl: float) -> List[str]:
+        cutoff = time.monotonic() - ttl
+        return [sid for sid, seen in self._last_seen.items() if seen < cutoff]
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionRegistry:
+    """Heartbeats in a SQLite file shared by all workers, so no reaper stops a session another worker sees."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS avatar_heartbeats (session_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM avatar_heartbeats").fetchone()[0]
+
+    def _execute(self, sql: str, params: tuple) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def touch(self, session_id: str):
+        # Wall clock, not monotonic: the timestamps are compared across processes
+        await run_in_threadpool(
+            self._execute, "INSERT OR REPLACE INTO avatar_heartbeats (session_id, last_seen) VALUES (?, ?)",
+            (session_id, time.time()))
+
+    async def discard(self, session_id: str):
+        await run_in_threadpool(self._execute, "DELETE FROM avatar_heartbeats WHERE session_id = ?", (session_id,))
+
+    async def lapsed(self, ttl: float) -> List[str]:
+        rows = await run_in_threadpool(
+            self._execute, "SELECT session_id FROM avatar_heartbeats WHERE last_seen < ?", (time.time() - ttl,))
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_session_registry(backend: str = None):
+    backend = (backend or settings.AVATAR_REGISTRY_BACKEND).lower()
+    if backend == "memory":
+        return SessionRegistry()
+    if backend == "sqlite":
+        os.makedirs(os.path.dirname(settings.HW_SESSION_DB) or ".", exist_ok=True)
+        return SQLiteSessionRegistry(settings.HW_SESSION_DB)
+    raise ValueError(f"Unknown AVATAR_REGISTRY_BACKEND: {backend}")
+
+
+class AvatarReaper:
+    """Background task that stops registered sessions whose heartbeats lapsed."""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.reaped = 0
+        self.failed = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.AVATAR_REAPER_INTERVAL)
+            try:
+                await self.reap_once()
+            except Exception as e:
+                logger.error(f"Avatar reaper failed: {e}")
+
+    async def reap_once(self) -> Dict[str, List[str]]:
+        self.runs += 1
+        lapsed = await self.registry.lapsed(settings.AVATAR_HEARTBEAT_TTL)
+        if not lapsed:
+            return {"stopped": [], "forgotten": []}
+
+        # Only stop sessions HeyGen still reports as live; the rest already ended on their own
+        live = {session["session_id"] for session in await heygen.list_sessions()}
+        zombies = [sid for sid in lapsed if sid in live]
+        forgotten = [sid for sid in lapsed if sid not in live]
+        for sid in forgotten:
+            await self.registry.discard(sid)
+
+        stopped: List[str] = []
+        if zombies:
+            report = await heygen.stop_sessions(zombies)
+            # Failed stops stay registered and are retried on the next pass. With a shared registry every
+            # worker's reaper may pick the same zombie; the later ones find it already gone
+            for sid in report["stoppedSessions"] + report["alreadyGone"]:
+                await self.registry.discard(sid)
+            stopped = report["stoppedSessions"]
+            self.reaped += len(stopped)
+            self.failed += len(report["failed"])
+            logger.info(f"Avatar reaper stopped {len(stopped)} zombie sessions")
+        return {"stopped": stopped, "forgotten": forgotten}
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "registered": len(self.registry),
+            "runs": self.runs,
+            "reaped": self.reaped,
+            "failed": self.failed,
+        }
+
+
+avatar_registry = create_session_registry()
+avatar_reaper = AvatarReaper(avatar_registry)
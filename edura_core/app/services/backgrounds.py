@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import json
+import importlib.util
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services.catalog import FileCatalog
+from app.services.etag import PreparedJSON
+
+MEDIA_URL = "/api/media/backgrounds"
+_CHUNK = 256 * 1024
+_EXTENSIONS = {"image/png": ".png", "image/jpeg": ".jpg", "image/gif": ".gif", "image/webp": ".webp"}
+_IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+_VARIANT = re.compile(r"^(?P<stem>.+)-(?P<width>\d+)\.webp$")
+_TEMP_SUFFIXES = (".upload", ".tmp")
+# Pointer name used inside the backgrounds directory before it moved out of the served (immutable) mount
+LEGACY_POINTER = "current.json"
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _extension(content_type: str, filename: str) -> Optional[str]:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext in _IMAGE_SUFFIXES:
+        return ext
+    return _EXTENSIONS.get(content_type)
+
+
+def _choose(widths: List[int], wanted: int) -> Optional[int]:
+    # The smallest variant that still covers the display, else the largest there is
+    fitting = [w for w in widths if w >= wanted]
+    return min(fitting) if fitting else (max(widths) if widths else None)
+
+
+class BackgroundStore:
+    """The classroom background image: content-addressed uploads with WebP variants, and a cached lookup."""
+
+    def __init__(self, directory: str, pointer: str, max_bytes: int, widths: List[int], display_width: int,
+                 quality: int, workers: int):
+        self.directory = directory
+        self.pointer = pointer
+        self.max_bytes = max_bytes
+        self.widths = sorted(set(widths))
+        self.display_width = display_width
+        self.quality = quality
+        self.workers = workers
+        self.transcoding = importlib.util.find_spec("PIL") is not None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = asyncio.Lock()
+        self.uploads = 0
+        self.rejected = 0
+        self.transcode_ms_total = 0.0
+        self.catalog = FileCatalog("background", self._build)
+
+    async def save(self, upload) -> Dict:
+        content_type = upload.content_type or ""
+        if not content_type.startswith("image/"):
+            self.rejected += 1
+            raise UploadRejected(400, "File must be an image")
+        ext = _extension(content_type, upload.filename)
+        if ext is None:
+            self.rejected += 1
+            raise UploadRejected(400, "Unsupported image type; use PNG, JPEG, GIF or WebP")
+
+        async with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                stem = await run_in_threadpool(self._store, upload.file, ext)
+            except UploadRejected:
+                self.rejected += 1
+                raise
+            path = os.path.join(self.directory, stem + ext)
+
+            widths: List[int] = []
+            if self.transcoding:
+                from app.services.images import InvalidImage, make_variants
+
+                started = time.perf_counter()
+                try:
+                    variants = await asyncio.get_running_loop().run_in_executor(
+                        self._executor(), make_variants, path, self.directory, stem, self.widths, self.quality)
+                except InvalidImage as e:
+                    await run_in_threadpool(self._remove, [path])
+                    self.rejected += 1
+                    raise UploadRejected(400, f"Could not read image: {e}")
+                self.transcode_ms_total += (time.perf_counter() - started) * 1000
+                widths = sorted({int(_VARIANT.match(name)["width"]) for name in variants.values()})
+
+            await run_in_threadpool(self._publish, stem + ext, widths)
+            self.catalog.invalidate()
+            self.uploads += 1
+            return self.describe(stem + ext, widths)
+
+    def _store(self, source: BinaryIO, ext: str) -> str:
+        """Copies the upload to a temp file, then renames it to its content hash; returns the hash stem."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".upload")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                source.seek(0)
+                while True:
+                    chunk = source.read(_CHUNK)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadRejected(413, f"Image is larger than {self.max_bytes // (1024 * 1024)} MB")
+                    digest.update(chunk)
+                    out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        if size == 0:
+            os.unlink(tmp_path)
+            raise UploadRejected(400, "Empty file")
+        stem = digest.hexdigest()[:32]
+        os.replace(tmp_path, os.path.join(self.directory, stem + ext))
+        return stem
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, not fork: the server process has threads (threadpool, loop monitor)
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _variant_widths(self, stem: str) -> List[int]:
+        widths = []
+        for name in os.listdir(self.directory):
+            match = _VARIANT.match(name)
+            if match and match["stem"] == stem:
+                widths.append(int(match["width"]))
+        return sorted(widths)
+
+    def _remove(self, paths: List[str]):
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _publish(self, original: str, widths: List[int]):
+        """Points the pointer file at the new background, then removes the previous one's files."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.pointer)), exist_ok=True)
+        tmp_path = f"{self.pointer}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"original": original, "widths": widths}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.pointer)
+
+        stem = os.path.splitext(original)[0]
+        # In-flight uploads of other workers are temp files and are left alone; a legacy pointer goes too
+        stale = [
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if not name.startswith(stem) and not name.endswith(_TEMP_SUFFIXES)
+        ]
+        self._remove(stale)
+
+    def _scan(self) -> Optional[Dict]:
+        # Backgrounds uploaded before the pointer file existed; runs only while there is no pointer
+        if not os.path.isdir(self.directory):
+            return None
+        originals = [
+            name for name in os.listdir(self.directory)
+            if name.lower().endswith(_IMAGE_SUFFIXES) and not _VARIANT.match(name)
+        ]
+        if not originals:
+            return None
+        name = max(originals, key=lambda n: os.stat(os.path.join(self.directory, n)).st_mtime_ns)
+        return {"original": name, "widths": self._variant_widths(os.path.splitext(name)[0])}
+
+    def _build(self, load) -> Dict:
+        pointer = load(self.pointer) or load(os.path.join(self.directory, LEGACY_POINTER)) or self._scan()
+        if pointer is None:
+            return {"default": PreparedJSON({"url": None}), "widths": [], "by_width": {}}
+        original, widths = pointer["original"], sorted(pointer["widths"])
+        return {
+            "default": PreparedJSON(self.describe(original, widths)),
+            "widths": widths,
+            # One prepared response per variant a ?width= request can resolve to
+            "by_width": {w: PreparedJSON(self.describe(original, widths, w)) for w in widths},
+        }
+
+    async def current(self, width: Optional[int] = None) -> PreparedJSON:
+        """The current background as a prepared response; `{"url": null}` when there is none."""
+        entries = await self.catalog.get()
+        if width is None or not entries["widths"]:
+            return entries["default"]
+        return entries["by_width"][_choose(entries["widths"], width)]
+
+    def describe(self, original: str, widths: List[int], width: Optional[int] = None) -> Dict:
+        stem = os.path.splitext(original)[0]
+        variants = {w: f"{MEDIA_URL}/{stem}-{w}.webp" for w in widths}
+        chosen = _choose(widths, width or self.display_width)
+        return {
+            "url": variants[chosen] if chosen is not None else f"{MEDIA_URL}/{original}",
+            "original": f"{MEDIA_URL}/{original}",
+            "variants": {str(w): url for w, url in variants.items()},
+        }
+
+    def close(self):
+        if self._pool is not None:
+            # Waits for a running transcode so no worker process outlives the server
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def snapshot(self) -> Dict:
+        return {
+            "transcoding": self.transcoding,
+            "uploads": self.uploads,
+            "rejected": self.rejected,
+            "lookup_rebuilds": self.catalog.rebuilds,
+            "avg_transcode_ms": round(self.transcode_ms_total / self.uploads, 1) if self.uploads and self.transcoding else None,
+        }
+
+
+background_store = BackgroundStore(
+    settings.BACKGROUND_DIR,
+    settings.BACKGROUND_POINTER_FILE,
+    settings.BACKGROUND_MAX_BYTES,
+    [int(w) for w in settings.BACKGROUND_WIDTHS.split(",") if w.strip()],
+    settings.BACKGROUND_DISPLAY_WIDTH,
+    settings.BACKGROUND_WEBP_QUALITY,
+    settings.BACKGROUND_TRANSCODE_WORKERS,
+)
@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import AsyncGenerator, Dict, FrozenSet, List, Optional, Set
+
+from app.core.config import settings
+from app.services.sse import SSEDeltaParser
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s?!.,;:]+$")
+
+# Rough chars-per-token ratio, only used to estimate the spend a hit saves
+CHARS_PER_TOKEN = 4
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _TRAILING.sub("", text)
+
+
+def shingles(text: str, n: int = 3) -> FrozenSet[int]:
+    # Hashed character n-grams of the normalized question, for near-duplicate matching
+    padded = f" {text} "
+    if len(padded) <= n:
+        return frozenset((hash(padded),))
+    return frozenset(hash(padded[i:i + n]) for i in range(len(padded) - n + 1))
+
+
+class CachedResponse:
+    __slots__ = ("key", "scope", "chunks", "gaps", "size", "created",
+                 "grams", "prompt_chars", "completion_chars")
+
+    def __init__(self, key, scope, chunks, gaps, grams, prompt_chars, completion_chars):
+        self.key = key
+        self.scope = scope
+        self.chunks = chunks
+        self.gaps = gaps
+        self.size = sum(len(c) for c in chunks) + 8 * len(gaps)
+        self.created = time.monotonic()
+        self.grams = grams
+        self.prompt_chars = prompt_chars
+        self.completion_chars = completion_chars
+
+
+class StreamRecorder:
+    """Captures a live SSE stream (chunks plus inter-chunk gaps) for later replay."""
+
+    __slots__ = ("chunks", "gaps", "_last", "_size", "_max_bytes", "overflow")
+
+    def __init__(self, max_bytes: int):
+        self.chunks: List[bytes] = []
+        self.gaps: List[float] = []
+        self._last = None
+        self._size = 0
+        self._max_bytes = max_bytes
+        self.overflow = False
+
+    def append(self, chunk):
+        if self.overflow:
+            return
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        now = time.monotonic()
+        # The first gap is the upstream TTFT, which a cache hit deliberately skips
+        self.gaps.append(0.0 if self._last is None else now - self._last)
+        self._last = now
+        self.chunks.append(chunk)
+        self._size += len(chunk)
+        if self._size > self._max_bytes:
+            self.overflow = True
+
+    def completed(self) -> bool:
+        # Only cache streams that finished normally; errors and cut-off streams never reach [DONE]
+        return not self.overflow and bool(self.chunks) and b"[DONE]" in self.chunks[-1][-32:]
+
+
+class ResponseCache:
+    """LRU + TTL cache of streamed lesson answers with a memory cap and optional near-duplicate matching."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float,
+                 near_threshold: float = 0.0, replay_speed: float = 1.0, max_gap: float = 0.25):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.near_threshold = near_threshold
+        self.replay_speed = replay_speed
+        self.max_gap = max_gap
+
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._scopes: Dict[str, Set[str]] = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.saved_prompt_chars = 0
+        self.saved_completion_chars = 0
+
+    @staticmethod
+    def _digest(*parts: str) -> str:
+        return hashlib.sha1("\x1f".join(parts).encode()).hexdigest()
+
+    def keys_for(self, context: str, question: str, model: str):
+        norm_question = normalize(question)
+        scope = self._digest(normalize(context), model)
+        return self._digest(scope, norm_question), scope, norm_question
+
+    def lookup(self, context: str, question: str, model: str) -> Optional[CachedResponse]:
+        key, scope, norm_question = self.keys_for(context, question, model)
+        entry = self._get(key)
+        if entry is not None:
+            self.hits += 1
+        elif self.near_threshold > 0:
+            entry = self._nearest(scope, shingles(norm_question))
+            if entry is not None:
+                self.near_hits += 1
+        if entry is None:
+            self.misses += 1
+            return None
+        self.saved_prompt_chars += entry.prompt_chars
+        self.saved_completion_chars += entry.completion_chars
+        return entry
+
+    def store(self, context: str, question: str, model: str, recorder: StreamRecorder, prompt_chars: int):
+        if not recorder.completed():
+            return
+        key, scope, norm_question = self.keys_for(context, question, model)
+        parser = SSEDeltaParser()
+        completion_chars = sum(len(d) for d in parser.feed(b"".join(recorder.chunks)))
+        entry = CachedResponse(key, scope, recorder.chunks, recorder.gaps,
+                               shingles(norm_question), prompt_chars, completion_chars)
+        if entry.size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = entry
+        self._scopes.setdefault(scope, set()).add(key)
+        self._bytes += entry.size
+        self.stores += 1
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    async def replay(self, entry: CachedResponse) -> AsyncGenerator[bytes, None]:
+        # Keep the original token cadence (capped) so the avatar front end behaves as with a live stream
+        for chunk, gap in zip(entry.chunks, entry.gaps):
+            if gap and self.replay_speed > 0:
+                await asyncio.sleep(min(gap, self.max_gap) / self.replay_speed)
+            yield chunk
+
+    def _get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created > self.ttl:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _nearest(self, scope: str, grams: FrozenSet[int]) -> Optional[CachedResponse]:
+        best, best_score = None, self.near_threshold
+        for key in list(self._scopes.get(scope, ())):
+            entry = self._get(key)
+            if entry is None:
+                continue
+            union = len(grams | entry.grams)
+            score = len(grams & entry.grams) / union if union else 0.0
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        keys = self._scopes.get(entry.scope)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._scopes[entry.scope]
+
+    def snapshot(self) -> Dict[str, float]:
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.near_hits) / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "saved_prompt_tokens_est": self.saved_prompt_chars // CHARS_PER_TOKEN,
+            "saved_completion_tokens_est": self.saved_completion_chars // CHARS_PER_TOKEN,
+        }
+
+
+response_cache = ResponseCache(
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    max_bytes=settings.LLM_CACHE_MAX_BYTES,
+    ttl=settings.LLM_CACHE_TTL,
+    near_threshold=settings.LLM_CACHE_NEAR_THRESHOLD,
+    replay_speed=settings.LLM_CACHE_REPLAY_SPEED,
+)
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import os
+import time
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+FileStamp = Optional[Tuple[int, int]]
+
+
+def file_stamp(path: str) -> FileStamp:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def load_json(path: str) -> Any:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class CatalogSnapshot:
+    """Pre-serialized responses built from one consistent read of the data files."""
+
+    __slots__ = ("stamps", "entries")
+
+    def __init__(self, stamps: Dict[str, FileStamp], entries: Dict[str, Any]):
+        self.stamps = stamps
+        self.entries = entries
+
+
+class FileCatalog:
+    """Loads JSON data files once and rebuilds when any of them changes."""
+
+    def __init__(self, name: str, build: Callable[[Callable[[str], Any]], Dict[str, Any]]):
+        self.name = name
+        self._build = build
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self.rebuilds = 0
+
+    def _load(self) -> CatalogSnapshot:
+        stamps: Dict[str, FileStamp] = {}
+
+        def load(path: str) -> Any:
+            stamps[path] = file_stamp(path)
+            return load_json(path)
+
+        entries = self._build(load)
+        self.rebuilds += 1
+        return CatalogSnapshot(stamps, entries)
+
+    def _stale(self, snapshot: CatalogSnapshot) -> bool:
+        return any(file_stamp(path) != stamp for path, stamp in snapshot.stamps.items())
+
+    def invalidate(self):
+        # The next get() re-stats the files now instead of after CATALOG_CHECK_INTERVAL
+        self._checked_at = 0.0
+
+    async def get(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < settings.CATALOG_CHECK_INTERVAL:
+            return snapshot.entries
+
+        async with self._lock:
+            # Another request may have checked while we waited for the lock
+            if self._snapshot is not None and time.monotonic() - self._checked_at < settings.CATALOG_CHECK_INTERVAL:
+                return self._snapshot.entries
+            self._checked_at = time.monotonic()
+            if self._snapshot is None or self._stale(self._snapshot):
+                if self._snapshot is not None:
+                    logger.info(f"Catalog {self.name}: data files changed, reloading")
+                self._snapshot = await run_in_threadpool(self._load)
+            return self._snapshot.entries
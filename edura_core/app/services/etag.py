@@ -0,0 +1,33 @@
+import hashlib
+import json
+from typing import Any
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+class PreparedJSON:
+    """A JSON body serialized once, with its strong ETag. Immutable once built."""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, value: Any):
+        self.body = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Compare ignoring weak validators, as If-None-Match allows
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def etag_response(request: Request, prepared: PreparedJSON, cache_control: str = "no-cache") -> Response:
+    headers = {"ETag": prepared.etag, "Cache-Control": cache_control}
+    if etag_matches(request, prepared.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=prepared.body, media_type="application/json", headers=headers)
@@ -0,0 +1,343 @@
+import asyncio
+import base64
+import json
+import math
+import time
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.etag import PreparedJSON
+from app.services.http import heygen_api, UpstreamError
+
+logger = logging.getLogger("uvicorn.error")
+
+STOPPED = "stopped"
+ALREADY_GONE = "already_gone"
+FAILED = "failed"
+
+
+def api_headers() -> Dict[str, str]:
+    return {"x-api-key": settings.HEYGEN_API_KEY}
+
+
+async def create_token() -> Dict[str, Any]:
+    response = await heygen_api.post("/v1/streaming.create_token", headers=api_headers())
+    response.raise_for_status()
+    return response.json()
+
+
+async def list_sessions() -> List[Dict[str, Any]]:
+    response = await heygen_api.get("/v1/streaming.list", headers=api_headers())
+    response.raise_for_status()
+    return response.json()["data"]["sessions"] or []
+
+
+def _is_gone(status: int, body: str) -> bool:
+    # HeyGen answers 400/404 with a "not found"/"closed" message for sessions that already ended
+    if status == 404:
+        return True
+    lowered = body.lower()
+    return status == 400 and ("not found" in lowered or "closed" in lowered or "not exist" in lowered)
+
+
+async def stop_session(session_id: str, timeout: float) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        response = await asyncio.wait_for(
+            heygen_api.post("/v1/streaming.stop", headers=api_headers(), json={"session_id": session_id}),
+            timeout,
+        )
+        if response.status == 200:
+            status, detail = STOPPED, None
+        elif _is_gone(response.status, response.text):
+            status, detail = ALREADY_GONE, response.text[:200]
+        else:
+            status, detail = FAILED, f"{response.status}: {response.text[:200]}"
+    except asyncio.TimeoutError:
+        status, detail = FAILED, f"timed out after {timeout}s"
+    except UpstreamError as e:
+        status, detail = FAILED, str(e)
+    return {
+        "session_id": session_id,
+        "status": status,
+        "detail": detail,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+async def stop_sessions(session_ids: List[str], concurrency: int = None, timeout: float = None) -> Dict[str, Any]:
+    """Stops sessions concurrently and reports each outcome instead of failing on the first error."""
+    concurrency = concurrency or settings.HEYGEN_STOP_CONCURRENCY
+    timeout = timeout or settings.HEYGEN_STOP_TIMEOUT
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    async def bounded(session_id):
+        async with semaphore:
+            return await stop_session(session_id, timeout)
+
+    results = await asyncio.gather(*(bounded(sid) for sid in session_ids))
+
+    stopped = [r["session_id"] for r in results if r["status"] == STOPPED]
+    gone = [r["session_id"] for r in results if r["status"] == ALREADY_GONE]
+    failed = [{"session_id": r["session_id"], "error": r["detail"]} for r in results if r["status"] == FAILED]
+    if failed:
+        logger.warning(f"HeyGen bulk stop: {len(failed)} of {len(session_ids)} sessions could not be stopped")
+
+    return {
+        "stoppedSessions": stopped,
+        "alreadyGone": gone,
+        "failed": failed,
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+class CachedLookup:
+    """Stale-while-revalidate cache of one rarely-changing HeyGen GET (avatar list, credits)."""
+
+    def __init__(self, name: str, path: str, ttl: float, max_stale: float):
+        self.name = name
+        self.path = path
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._value: Optional[PreparedJSON] = None
+        self._stale_value: Optional[PreparedJSON] = None
+        self._fetched_at = 0.0
+        self._fresh_until = 0.0
+        self._error: Optional[str] = None
+        self._refresh: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.revalidations = 0
+        self.stale_served = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.fetches = 0
+        self.failures = 0
+
+    async def get(self) -> Tuple[PreparedJSON, str, int]:
+        """The response, how it was served (HIT, REVALIDATING, STALE or MISS) and its age in seconds."""
+        now = time.monotonic()
+        if self._value is not None and now < self._fresh_until:
+            self.hits += 1
+            return self._value, "HIT", int(now - self._fetched_at)
+        if self._value is not None and now - self._fetched_at < self.max_stale:
+            self._start_refresh()
+            if self._error is not None:
+                self.stale_served += 1
+                return self._stale_value, "STALE", int(now - self._fetched_at)
+            self.revalidations += 1
+            return self._value, "REVALIDATING", int(now - self._fetched_at)
+
+        if self._refresh is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        # Shielded: a client that hangs up does not cancel the fetch the other waiters share
+        await asyncio.shield(self._start_refresh())
+        return self._value, "MISS", 0
+
+    def invalidate(self):
+        # The next get() still answers from memory but refetches in the background
+        self._fresh_until = 0.0
+
+    def warm(self):
+        if self._value is None:
+            self._start_refresh()
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh is None:
+            self._refresh = asyncio.create_task(self._fetch())
+            self._refresh.add_done_callback(self._refreshed)
+        return self._refresh
+
+    def _refreshed(self, task: asyncio.Task):
+        self._refresh = None
+        if not task.cancelled():
+            # Background refreshes have nobody awaiting them; the failure is already logged
+            task.exception()
+
+    async def _fetch(self):
+        self.fetches += 1
+        try:
+            response = await heygen_api.get(self.path, headers=api_headers())
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            self.failures += 1
+            self._error = str(e)
+            fallback = "serving the cached value" if self._value is not None else "nothing cached"
+            logger.warning(f"HeyGen {self.name} refresh failed ({e}); {fallback}")
+            raise
+        self._value = PreparedJSON(data)
+        self._stale_value = PreparedJSON({**data, "stale": True}) if isinstance(data, dict) else self._value
+        self._fetched_at = time.monotonic()
+        self._fresh_until = self._fetched_at + self.ttl
+        self._error = None
+
+    async def close(self):
+        task = self._refresh
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "cached": self._value is not None,
+            "age_s": round(time.monotonic() - self._fetched_at, 1) if self._value is not None else None,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "revalidations": self.revalidations,
+            "stale_served": self.stale_served,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "fetches": self.fetches,
+            "failures": self.failures,
+            "last_error": self._error,
+        }
+
+
+avatar_list_cache = CachedLookup(
+    "avatar_list", "/v1/streaming/avatar.list", settings.HEYGEN_AVATAR_LIST_TTL, settings.HEYGEN_CACHE_MAX_STALE)
+credits_cache = CachedLookup(
+    "credits", "/v2/user/remaining_quota", settings.HEYGEN_CREDITS_TTL, settings.HEYGEN_CACHE_MAX_STALE)
+cached_lookups = (avatar_list_cache, credits_cache)
+
+
+def token_expiry(body: Dict[str, Any], now: float) -> float:
+    """Monotonic expiry of a fetched token: its JWT `exp` claim if it has one, capped at HEYGEN_TOKEN_TTL."""
+    expires = now + settings.HEYGEN_TOKEN_TTL
+    parts = body["data"]["token"].split(".")
+    if len(parts) == 3:
+        try:
+            claims = json.loads(base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4)))
+            expires = min(expires, now + float(claims["exp"]) - time.time())
+        except (ValueError, KeyError, TypeError):
+            pass
+    return expires
+
+
+class TokenPool:
+    """Streaming tokens fetched ahead of time, so starting an avatar skips the create_token round-trip."""
+
+    def __init__(self, min_depth: int, max_depth: int, window: float, horizon: float):
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.window = window
+        self.horizon = horizon
+        # (expires at, create_token response), in fetch order
+        self._tokens: Deque[Tuple[float, Dict[str, Any]]] = deque()
+        self._starts: Deque[float] = deque()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.pooled = 0
+        self.fallbacks = 0
+        self.fetched = 0
+        self.expired = 0
+        self.failures = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def take(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._prune_starts(now)
+        self._starts.append(now)
+        self._wake.set()
+        self._drop_expiring(now)
+        if self._tokens:
+            self.pooled += 1
+            return self._tokens.popleft()[1]
+        self.fallbacks += 1
+        return await create_token()
+
+    def _prune_starts(self, now: float):
+        # Also on every take, so the deque stays bounded by the window even while the refill loop is not running
+        while self._starts and now - self._starts[0] > self.window:
+            self._starts.popleft()
+
+    def target(self, now: float) -> int:
+        self._prune_starts(now)
+        rate = len(self._starts) / self.window
+        return max(self.min_depth, min(self.max_depth, math.ceil(rate * self.horizon)))
+
+    def _drop_expiring(self, now: float):
+        while self._tokens and self._tokens[0][0] - now <= settings.HEYGEN_TOKEN_MIN_REMAINING:
+            self._tokens.popleft()
+            self.expired += 1
+
+    async def _run(self):
+        backoff = 0.0
+        while True:
+            self._wake.clear()
+            now = time.monotonic()
+            self._drop_expiring(now)
+            deficit = self.target(now) - len(self._tokens)
+            if deficit > 0:
+                failed = await self._refill(deficit)
+                if failed:
+                    backoff = min(max(backoff * 2, 1.0), 30.0)
+                    await asyncio.sleep(backoff)
+                else:
+                    backoff = 0.0
+                # Starts may have drained the pool while the fetches ran
+                continue
+            # Sleep until a token is taken or the oldest one is about to expire
+            timeout = None
+            if self._tokens:
+                timeout = max(0.0, self._tokens[0][0] - settings.HEYGEN_TOKEN_MIN_REMAINING - now)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refill(self, count: int) -> int:
+        results = await asyncio.gather(*(create_token() for _ in range(count)), return_exceptions=True)
+        now = time.monotonic()
+        failed = 0
+        for result in results:
+            if isinstance(result, Exception) or not (result.get("data") or {}).get("token"):
+                failed += 1
+                continue
+            self._tokens.append((token_expiry(result, now), result))
+            self.fetched += 1
+        if failed:
+            self.failures += failed
+            logger.warning(f"HeyGen token pool: {failed} of {count} token fetches failed")
+        return failed
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        served = self.pooled + self.fallbacks
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "depth": len(self._tokens),
+            "target": self.target(now),
+            "starts_per_min": round(len(self._starts) * 60 / self.window, 1),
+            "pooled": self.pooled,
+            "fallbacks": self.fallbacks,
+            "pool_hit_ratio": round(self.pooled / served, 3) if served else 0.0,
+            "fetched": self.fetched,
+            "expired": self.expired,
+            "failures": self.failures,
+        }
+
+
+token_pool = TokenPool(
+    settings.HEYGEN_TOKEN_POOL_MIN,
+    settings.HEYGEN_TOKEN_POOL_MAX,
+    settings.HEYGEN_TOKEN_POOL_WINDOW,
+    settings.HEYGEN_TOKEN_POOL_HORIZON,
+)
@@ -0,0 +1,354 @@
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from abc import ABC, abstractmethod
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+DATA_DIR = os.path.join("app", "data")
+LEGACY_HISTORY_FILE = os.path.join(DATA_DIR, "history.json")
+
+Record = Dict[str, Any]
+Page = Tuple[List[Record], Optional[str]]
+
+
+class HistoryStore(ABC):
+    """Storage engine for lesson history records; synchronous and thread-safe, called through the threadpool."""
+
+    @abstractmethod
+    def append(self, record: Record):
+        pass
+
+    @abstractmethod
+    def append_many(self, records: Iterable[Record]):
+        pass
+
+    @abstractmethod
+    def page(self, cursor: Optional[str] = None, limit: int = 100, session_id: Optional[str] = None,
+             created_from: Optional[str] = None, created_to: Optional[str] = None) -> Page:
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    def iter_records(self, session_id: Optional[str] = None, created_from: Optional[str] = None,
+                     created_to: Optional[str] = None, batch: int = 1000) -> Iterator[Record]:
+        # Page by page, so memory stays bounded by `batch` whatever the store size
+        cursor = None
+        while True:
+            records, cursor = self.page(cursor, batch, session_id, created_from, created_to)
+            yield from records
+            if cursor is None:
+                return
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """Embedded SQLite backend with a (sessionId, seq) index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " session_id TEXT NOT NULL,"
+            " created_at TEXT,"
+            " body TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS history_session ON history (session_id, seq)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS history_created ON history (created_at, seq)")
+
+    @staticmethod
+    def _row(record: Record) -> Tuple[str, Optional[str], str]:
+        return record["sessionId"], record.get("createdAt"), json.dumps(record, separators=(",", ":"))
+
+    def append(self, record: Record):
+        row = self._row(record)
+        with self._lock:
+            self._conn.execute("INSERT INTO history (session_id, created_at, body) VALUES (?, ?, ?)", row)
+
+    def append_many(self, records: Iterable[Record]):
+        rows = [self._row(r) for r in records]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT INTO history (session_id, created_at, body) VALUES (?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def page(self, cursor: Optional[str] = None, limit: int = 100, session_id: Optional[str] = None,
+             created_from: Optional[str] = None, created_to: Optional[str] = None) -> Page:
+        after = int(cursor) if cursor else 0
+        sql = "SELECT seq, body FROM history WHERE seq > ?"
+        params: List[Any] = [after]
+        if session_id is not None:
+            sql += " AND session_id = ?"
+            params.append(session_id)
+        if created_from is not None:
+            sql += " AND created_at >= ?"
+            params.append(created_from)
+        if created_to is not None:
+            sql += " AND created_at < ?"
+            params.append(created_to)
+        sql += " ORDER BY seq LIMIT ?"
+        params.append(limit + 1)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = str(rows[-1][0]) if more else None
+        return [json.loads(body) for _, body in rows], next_cursor
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JSONLHistoryStore(HistoryStore):
+    """Append-only JSON Lines backend with a sidecar offset index; single process only."""
+
+    def __init__(self, path: str, fsync_every: int = 64, fsync_interval: float = 1.0):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+
+        # offsets[i] is where record i starts; offsets[-1] is the end of the file
+        self._offsets = array("Q", [0])
+        self._by_session: Dict[str, array] = {}
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self._fd)
+            raise RuntimeError(f"{path} is open in another process; HISTORY_BACKEND=jsonl supports one worker "
+                               f"only, use HISTORY_BACKEND=sqlite with --workers N")
+        self._recover()
+        self._index_fd = os.open(self.index_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def _recover(self):
+        size = os.fstat(self._fd).st_size
+        if not self._load_sidecar(size):
+            logger.warning(f"History store: rebuilding index for {self.path}")
+            self._rebuild(size)
+
+    def _reset_index(self):
+        self._offsets = array("Q", [0])
+        self._by_session = {}
+
+    def _load_sidecar(self, size: int) -> bool:
+        # True only if the sidecar describes every record of the data file exactly
+        if not os.path.exists(self.index_path):
+            return size == 0
+        with open(self.index_path, "r") as f:
+            for line in f:
+                offset, _, session_id = line.rstrip("\n").partition("\t")
+                if not line.endswith("\n") or not offset.isdigit():
+                    return False
+                offset = int(offset)
+                count = len(self._offsets) - 1
+                # Starts must be 0 for the first record and strictly increasing after that
+                if (offset != 0 if count == 0 else offset <= self._offsets[-1]) or offset >= size:
+                    return False
+                self._offsets[-1] = offset
+                self._by_session.setdefault(session_id, array("Q")).append(len(self._offsets) - 1)
+                self._offsets.append(offset)
+        if len(self._offsets) == 1:
+            return size == 0
+        last = self._offsets[-2]
+        with open(self.path, "rb") as f:
+            f.seek(last)
+            line = f.readline()
+        self._offsets[-1] = last + len(line)
+        return line.endswith(b"\n") and self._offsets[-1] == size
+
+    def _rebuild(self, size: int):
+        self._reset_index()
+        offset = 0
+        tmp_path = self.index_path + ".tmp"
+        with open(self.path, "rb") as data, open(tmp_path, "w") as index:
+            for line in data:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    session_id = json.loads(line)["sessionId"]
+                except (ValueError, KeyError, TypeError):
+                    session_id = ""
+                index.write(f"{offset}\t{session_id}\n")
+                self._by_session.setdefault(session_id, array("Q")).append(len(self._offsets) - 1)
+                offset += len(line)
+                self._offsets.append(offset)
+            index.flush()
+            os.fsync(index.fileno())
+        if offset < size:
+            # A crash mid-write left a torn final line
+            logger.warning(f"History store: truncating {size - offset} bytes of torn data in {self.path}")
+            os.ftruncate(self._fd, offset)
+        os.replace(tmp_path, self.index_path)
+
+    def _maybe_sync(self, force: bool = False):
+        if not self._unsynced:
+            return
+        if force or self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            os.fsync(self._fd)
+            os.fsync(self._index_fd)
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def _write(self, record: Record):
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        session_id = record["sessionId"]
+        start = self._offsets[-1]
+        os.write(self._fd, line)
+        os.write(self._index_fd, f"{start}\t{session_id}\n".encode())
+        self._by_session.setdefault(session_id, array("Q")).append(len(self._offsets) - 1)
+        self._offsets.append(start + len(line))
+        self._unsynced += 1
+
+    def append(self, record: Record):
+        with self._lock:
+            self._write(record)
+            self._maybe_sync()
+
+    def append_many(self, records: Iterable[Record]):
+        with self._lock:
+            for record in records:
+                self._write(record)
+            self._maybe_sync(force=True)
+
+    def _read(self, ordinal: int) -> Record:
+        start, end = self._offsets[ordinal], self._offsets[ordinal + 1]
+        return json.loads(os.pread(self._fd, end - start, start))
+
+    def page(self, cursor: Optional[str] = None, limit: int = 100, session_id: Optional[str] = None,
+             created_from: Optional[str] = None, created_to: Optional[str] = None) -> Page:
+        after = int(cursor) if cursor else -1
+        with self._lock:
+            if session_id is None:
+                candidates = range(after + 1, len(self._offsets) - 1)
+            else:
+                matches = self._by_session.get(session_id, array("Q"))
+                # Ordinals are appended in increasing order, so bisect for the first one after the cursor
+                lo, hi = 0, len(matches)
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if matches[mid] <= after:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                candidates = matches[lo:]
+
+            ordinals: List[int] = []
+            records: List[Record] = []
+            filtered = created_from is not None or created_to is not None
+            for ordinal in candidates:
+                if len(records) > limit:
+                    break
+                record = self._read(ordinal)
+                if filtered:
+                    # createdAt is not indexed here, so range filters scan the candidates
+                    created = record.get("createdAt") or ""
+                    if (created_from is not None and created < created_from) or \
+                            (created_to is not None and created >= created_to):
+                        continue
+                ordinals.append(ordinal)
+                records.append(record)
+        more = len(records) > limit
+        next_cursor = str(ordinals[limit - 1]) if more else None
+        return records[:limit], next_cursor
+
+    def count(self) -> int:
+        return len(self._offsets) - 1
+
+    def close(self):
+        with self._lock:
+            self._maybe_sync(force=True)
+            os.close(self._fd)
+            os.close(self._index_fd)
+
+
+def create_history_store(backend: str = None, data_dir: str = None) -> HistoryStore:
+    backend = (backend or settings.HISTORY_BACKEND).lower()
+    data_dir = data_dir or settings.HISTORY_DIR
+    os.makedirs(data_dir, exist_ok=True)
+    if backend == "sqlite":
+        return SQLiteHistoryStore(os.path.join(data_dir, "history.db"))
+    if backend == "jsonl":
+        return JSONLHistoryStore(
+            os.path.join(data_dir, "history.jsonl"),
+            fsync_every=settings.HISTORY_FSYNC_EVERY,
+            fsync_interval=settings.HISTORY_FSYNC_INTERVAL,
+        )
+    raise ValueError(f"Unknown HISTORY_BACKEND: {backend}")
+
+
+def migrate_legacy_json(store: HistoryStore, json_path: str = LEGACY_HISTORY_FILE) -> int:
+    """One-shot import of the old history.json array; the file is renamed afterwards."""
+    if not os.path.exists(json_path):
+        return 0
+    try:
+        with open(json_path, "r") as f:
+            content = f.read()
+        records = json.loads(content) if content else []
+    except json.JSONDecodeError:
+        logger.error(f"History migration: {json_path} is not valid JSON, leaving it in place")
+        return 0
+    existing = store.count()
+    if existing and records:
+        # Never merge into a store already in use; the file stays where it is, so the warning repeats
+        logger.warning(f"History migration: store already holds {existing} records, skipped importing "
+                       f"{len(records)} records from {json_path} (left in place)")
+        return 0
+    valid = [r for r in records if isinstance(r, dict) and "sessionId" in r]
+    if valid:
+        store.append_many(valid)
+    os.replace(json_path, json_path + ".migrated")
+    logger.info(f"History migration: imported {len(valid)} records from {json_path}")
+    return len(valid)
+
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = create_history_store()
+            migrate_legacy_json(_store)
+        return _store
+
+
+def close_history_store():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
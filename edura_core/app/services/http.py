@@ -0,0 +1,312 @@
+import asyncio
+import json
+import random
+import time
+import logging
+from typing import Optional, Dict, Any
+
+import aiohttp
+from app.core.config import settings
+from app.services.telemetry import upstream_duration
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class PoolStats:
+    """Counters fed by aiohttp trace hooks, used to size the pool."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.queued_now = 0
+        self.queued_total = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+
+class HTTPClientPool:
+    """App-lifetime aiohttp session shared by every outbound call."""
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = asyncio.Lock()
+        self.stats = PoolStats()
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        stats = self.stats
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            stats.requests += 1
+
+        async def on_queued_start(session, ctx, params):
+            # No free connection under the limits: the request waits for a slot
+            ctx.queued_at = time.perf_counter()
+            stats.queued_now += 1
+            stats.queued_total += 1
+
+        async def on_queued_end(session, ctx, params):
+            stats.queued_now -= 1
+            waited = time.perf_counter() - ctx.queued_at
+            stats.queue_wait_total += waited
+            if waited > stats.queue_wait_max:
+                stats.queue_wait_max = waited
+
+        async def on_create_end(session, ctx, params):
+            stats.connections_created += 1
+
+        async def on_reuse(session, ctx, params):
+            stats.connections_reused += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_queued_start.append(on_queued_start)
+        trace.on_connection_queued_end.append(on_queued_end)
+        trace.on_connection_create_end.append(on_create_end)
+        trace.on_connection_reuseconn.append(on_reuse)
+        return trace
+
+    async def start(self) -> aiohttp.ClientSession:
+        async with self._lock:
+            if self._session is None or self._session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=settings.HTTP_POOL_LIMIT,
+                    limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+                    keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+                    ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+                    use_dns_cache=True,
+                )
+                timeout = aiohttp.ClientTimeout(
+                    total=None,
+                    connect=settings.HTTP_CONNECT_TIMEOUT,
+                    sock_read=settings.HTTP_READ_TIMEOUT,
+                )
+                self._session = aiohttp.ClientSession(
+                    connector=connector,
+                    timeout=timeout,
+                    trace_configs=[self._trace_config()],
+                )
+                logger.info(
+                    f"HTTP pool started (limit={settings.HTTP_POOL_LIMIT}, "
+                    f"per_host={settings.HTTP_POOL_LIMIT_PER_HOST})"
+                )
+            return self._session
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            return await self.start()
+        return self._session
+
+    async def close(self):
+        async with self._lock:
+            if self._session is not None and not self._session.closed:
+                await self._session.close()
+            self._session = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        stats = self.stats
+        in_use = 0
+        idle = 0
+        if self._session is not None and not self._session.closed:
+            connector = self._session.connector
+            # aiohttp keeps no public counters for these; read them defensively
+            in_use = len(getattr(connector, "_acquired", ()))
+            idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        limit = settings.HTTP_POOL_LIMIT
+        return {
+            "limit": limit,
+            "limit_per_host": settings.HTTP_POOL_LIMIT_PER_HOST,
+            "in_use": in_use,
+            "idle": idle,
+            "saturation": round(in_use / limit, 3) if limit else 0.0,
+            "requests": stats.requests,
+            "connections_created": stats.connections_created,
+            "connections_reused": stats.connections_reused,
+            "queued_now": stats.queued_now,
+            "queued_total": stats.queued_total,
+            "queue_wait_avg_ms": round(stats.queue_wait_total / stats.queued_total * 1000, 2) if stats.queued_total else 0.0,
+            "queue_wait_max_ms": round(stats.queue_wait_max * 1000, 2),
+        }
+
+
+http_pool = HTTPClientPool()
+
+
+class UpstreamError(Exception):
+    def __init__(self, message: str, status: int = 502, body: Any = None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+
+class UpstreamResponse:
+    __slots__ = ("status", "body", "url")
+
+    def __init__(self, status: int, body: bytes, url: str):
+        self.status = status
+        self.body = body
+        self.url = url
+
+    @property
+    def status_code(self) -> int:
+        return self.status
+
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise UpstreamError(f"{self.status} error for url: {self.url} - {self.text[:200]}", self.status, self.text)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; lets one probe through after `reset_timeout`."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        # Half-open: a probe is already on its way
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        # A probe abandoned before its outcome was known (cancelled, client gone) lets the next call probe
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+
+
+# Safe to resend even if the first attempt reached the server
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "PUT", "DELETE", "OPTIONS"))
+RETRY_STATUSES = frozenset((429, 502, 503, 504))
+
+
+class Upstream:
+    """Async REST client for one upstream service, with retries and a circuit breaker."""
+
+    def __init__(self, name: str, base_url: str, timeout: float, retries: int = None):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = settings.UPSTREAM_RETRIES if retries is None else retries
+        self.breaker = CircuitBreaker(settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_TIMEOUT)
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+        self.rejected = 0
+        self.latency_total = 0.0
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(settings.UPSTREAM_BACKOFF_MAX, settings.UPSTREAM_BACKOFF_BASE * (2 ** attempt)))
+
+    async def request(self, method: str, path: str, idempotent: Optional[bool] = None, **kwargs) -> UpstreamResponse:
+        method = method.upper()
+        url = f"{self.base_url}{path}"
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        if kwargs.get("headers"):
+            # Like requests, drop unset headers (e.g. an API key missing from the environment)
+            kwargs["headers"] = {k: v for k, v in kwargs["headers"].items() if v is not None}
+        session = await http_pool.get_session()
+        self.requests += 1
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} is unavailable (circuit open)", 503)
+
+            started = time.perf_counter()
+            try:
+                async with session.request(method, url, timeout=self.timeout, **kwargs) as response:
+                    body = await response.read()
+                    status = response.status
+            except aiohttp.ClientConnectorError as e:
+                # Never reached the server: safe to retry whatever the method
+                error, retryable = e, True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error, retryable = e, idempotent
+            except BaseException:
+                # Cancelled mid-attempt: no outcome to record, but a half-open breaker must not wait forever
+                self.breaker.release()
+                raise
+            else:
+                elapsed = time.perf_counter() - started
+                self.latency_total += elapsed
+                upstream_duration.observe(elapsed, self.name, str(status))
+                if status >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if idempotent and status in RETRY_STATUSES and attempt < self.retries:
+                    attempt += 1
+                    self.retried += 1
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+                if status >= 500:
+                    self.failures += 1
+                return UpstreamResponse(status, body, url)
+
+            elapsed = time.perf_counter() - started
+            self.latency_total += elapsed
+            upstream_duration.observe(elapsed, self.name, "timeout" if isinstance(error, asyncio.TimeoutError) else "error")
+            self.breaker.record_failure()
+            if retryable and attempt < self.retries:
+                attempt += 1
+                self.retried += 1
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            self.failures += 1
+            reason = str(error) or type(error).__name__
+            raise UpstreamError(f"{self.name} request failed: {reason}", 504 if isinstance(error, asyncio.TimeoutError) else 502)
+
+    async def get(self, path: str, **kwargs) -> UpstreamResponse:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> UpstreamResponse:
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path: str, **kwargs) -> UpstreamResponse:
+        return await self.request("PUT", path, **kwargs)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retried": self.retried,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "circuit": self.breaker.state,
+            "latency_avg_ms": round(self.latency_total / self.requests * 1000, 2) if self.requests else 0.0,
+        }
+
+
+heygen_api = Upstream("heygen", settings.HEYGEN_API_URL, settings.HEYGEN_TIMEOUT)
+hw_api = Upstream("hw", settings.HW_API_URL, settings.HW_API_TIMEOUT)
@@ -0,0 +1,41 @@
+"""Image transcoding, run in a worker process; kept free of app imports so workers start quickly."""
+import os
+from typing import Dict, List
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Backgrounds are at most a few thousand pixels a side; anything far larger is a decompression bomb
+Image.MAX_IMAGE_PIXELS = 64_000_000
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def make_variants(source: str, directory: str, stem: str, widths: List[int], quality: int) -> Dict[int, str]:
+    """Writes `{stem}-{width}.webp` for each requested width; returns {requested width: file name}."""
+    try:
+        with Image.open(source) as opened:
+            opened.load()
+            image = ImageOps.exif_transpose(opened)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise InvalidImage(str(e)) from e
+
+    if image.mode not in ("RGB", "RGBA"):
+        has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    variants: Dict[int, str] = {}
+    written: Dict[int, str] = {}
+    for width in sorted(set(widths)):
+        target = min(width, image.width)
+        if target not in written:
+            height = max(1, round(image.height * target / image.width))
+            resized = image if target == image.width else image.resize((target, height), Image.LANCZOS)
+            name = f"{stem}-{target}.webp"
+            tmp_path = os.path.join(directory, name + ".tmp")
+            resized.save(tmp_path, "WEBP", quality=quality, method=4)
+            os.replace(tmp_path, os.path.join(directory, name))
+            written[target] = name
+        variants[width] = written[target]
+    return variants
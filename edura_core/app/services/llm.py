@@ -1,33 +1,170 @@
-import aiohttp
+import asyncio
+import hashlib
 import json
 import logging
-from typing import AsyncGenerator, List, Dict, Any
+import time
+from typing import AsyncGenerator, AsyncIterator, Callable, List, Dict, Any, Optional, Set
 from abc import ABC, abstractmethod
+from contextlib import aclosing
 from app.core.config import settings
+from app.services.http import UpstreamError
+from app.services.llm_providers import LLMRouter, providers_from_settings
+from app.services.admission import admission, AdmissionRejected, Caller, PRIORITY_LESSON
+from app.services.sse import TranscriptTap
+from app.services.cache import response_cache, StreamRecorder
 
 logger = logging.getLogger("uvicorn.error")
 
 class LLMService(ABC):
     @abstractmethod
-    async def generate_response(self, messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
+    async def generate_response(self, messages: List[Dict[str, str]], caller: Caller = None) -> AsyncGenerator[str, None]:
         pass
 
     @abstractmethod
-    async def generate_conversational_response(self, system_prompt: str, messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
+    async def generate_conversational_response(self, system_prompt: str, messages: List[Dict[str, str]],
+                                               caller: Caller = None) -> AsyncGenerator[str, None]:
         pass
 
-from app.prompt import SYSTEM_PROMPT_TEMPLATE
+    @abstractmethod
+    async def complete(self, system_prompt: str, messages: List[Dict[str, str]], max_tokens: int = None) -> str:
+        pass
+
+from app.services.prompt_builder import prompt_builder
+
+_EOF = object()
+
+
+class _Subscriber:
+    __slots__ = ("queue", "lagging", "cursor")
+
+    def __init__(self, buffer_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        # A lagging subscriber overflowed its queue (or joined late) and reads from the flight log instead
+        self.lagging = False
+        self.cursor = 0
+
+
+class _Flight:
+    __slots__ = ("key", "chunks", "subscribers", "done", "task")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks: List[Any] = []
+        self.subscribers: Set[_Subscriber] = set()
+        self.done = False
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """Coalesces identical concurrent upstream streams."""
+
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self._flights: Dict[str, _Flight] = {}
+        self.flights = 0
+        self.coalesced = 0
+        self.overflows = 0
+
+    @staticmethod
+    def key_for(model: str, messages: List[Dict[str, str]]) -> str:
+        payload = json.dumps([model, messages], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncGenerator[Any, None]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(key)
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._pump(flight, factory))
+            self.flights += 1
+        else:
+            self.coalesced += 1
+
+        sub = _Subscriber(self.buffer_size)
+        # Late joiners first catch up on what the flight has already produced
+        sub.lagging = bool(flight.chunks)
+        flight.subscribers.add(sub)
+        try:
+            while True:
+                if not sub.queue.empty():
+                    item = sub.queue.get_nowait()
+                elif sub.lagging:
+                    if sub.cursor < len(flight.chunks):
+                        item = flight.chunks[sub.cursor]
+                    elif flight.done:
+                        return
+                    else:
+                        # Caught up with the live edge: go back to queue delivery
+                        sub.lagging = False
+                        continue
+                else:
+                    item = await sub.queue.get()
+                if item is _EOF:
+                    return
+                sub.cursor += 1
+                yield item
+        finally:
+            flight.subscribers.discard(sub)
+            if not flight.subscribers and not flight.done and flight.task is not None:
+                # Nobody is listening any more; stop paying for the upstream stream. Unregister it now so an
+                # identical request arriving before the pump unwinds starts a fresh flight instead of joining this one
+                flight.done = True
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+                flight.task.cancel()
+
+    async def _pump(self, flight: _Flight, factory: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for chunk in factory():
+                self._publish(flight, chunk)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"LLM stream failed: {e}")
+            self._publish(flight, f"data: {{\"error\": \"Upstream error: {type(e).__name__}\"}}\n\n")
+        finally:
+            flight.done = True
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            self._publish(flight, _EOF)
+
+    def _publish(self, flight: _Flight, item: Any):
+        if item is not _EOF:
+            flight.chunks.append(item)
+        for sub in flight.subscribers:
+            if sub.lagging:
+                continue
+            try:
+                sub.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                sub.lagging = True
+                self.overflows += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._flights),
+            "flights": self.flights,
+            "coalesced": self.coalesced,
+            "overflows": self.overflows,
+        }
+
+
+single_flight = SingleFlight(settings.LLM_COALESCE_BUFFER)
+
 
 class OpenAILLMService(LLMService):
     def __init__(self):
-        self.api_key = settings.OPENAI_API_KEY
+        # Cache and single-flight keys; the provider that serves a request may run a different model
         self.model = settings.OPENAI_MODEL
-        self.url = "https://api.openai.com/v1/chat/completions"
+        self.router = LLMRouter(providers_from_settings(), settings.LLM_ROUTING, settings.LLM_HEDGE_AFTER)
         
-    async def generate_response(self, messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
+    async def generate_response(self, messages: List[Dict[str, str]], caller: Caller = None) -> AsyncGenerator[str, None]:
         # Legacy one-shot logic
-        if not self.api_key:
-             yield f"data: {{\"error\": \"OpenAI API Key missing.\"}}\n\n"
+        if not self.router.providers:
+             yield f"data: {{\"error\": \"No LLM provider configured (OpenAI API Key missing).\"}}\n\n"
              return
 
         # Parse context and question from the last message
@@ -45,63 +182,125 @@ class OpenAILLMService(LLMService):
             except Exception as e:
                 logger.error(f"Error parsing context: {e}")
         
-        # Format the system prompt
-        formatted_prompt = SYSTEM_PROMPT_TEMPLATE.format(context=context, question=question)
+        # Static prefix, then lesson context, then the question: students on the same step share a cacheable prefix
+        api_messages = prompt_builder.lesson_messages(context, question)
 
-        # Construct payload with single system message containing everything
-        api_messages = [{"role": "system", "content": formatted_prompt}]
+        if not settings.LLM_CACHE_ENABLED:
+            async with aclosing(self._coalesced_stream(api_messages, caller)) as stream:
+                async for chunk in stream:
+                    yield chunk
+            return
 
-        async for chunk in self._stream_request(api_messages):
-            yield chunk
+        # Many students ask the same question about the same script step: replay a cached answer
+        cached = response_cache.lookup(context, question, self.model)
+        if cached is not None:
+            async for chunk in response_cache.replay(cached):
+                yield chunk
+            return
 
-    async def generate_conversational_response(self, system_prompt: str, messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
-        if not self.api_key:
-             yield f"data: {{\"error\": \"OpenAI API Key missing.\"}}\n\n"
+        recorder = StreamRecorder(response_cache.max_bytes)
+        async with aclosing(self._coalesced_stream(api_messages, caller)) as stream:
+            async for chunk in stream:
+                recorder.append(chunk)
+                yield chunk
+        response_cache.store(context, question, self.model, recorder, sum(len(m["content"]) for m in api_messages))
+
+    async def generate_conversational_response(self, system_prompt: str, messages: List[Dict[str, str]],
+                                               caller: Caller = None) -> AsyncGenerator[str, None]:
+        if not self.router.providers:
+             yield f"data: {{\"error\": \"No LLM provider configured (OpenAI API Key missing).\"}}\n\n"
              return
 
         api_messages = [{"role": "system", "content": system_prompt}] + messages
         
-        async for chunk in self._stream_request(api_messages):
-             yield chunk
-
-    async def _stream_request(self, messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
-         payload = {
-            "model": self.model,
-            "messages": messages,
-            "stream": True
-        }
+        async with aclosing(self._coalesced_stream(api_messages, caller)) as stream:
+            async for chunk in stream:
+                yield chunk
 
-         headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+    async def complete(self, system_prompt: str, messages: List[Dict[str, str]], max_tokens: int = None) -> str:
+        # Non-streaming call for background work (conversation summaries); raises once every provider has failed
+        return await self.router.complete([{"role": "system", "content": system_prompt}] + messages, max_tokens)
 
-         full_response_text = ""
-         
-         async with aiohttp.ClientSession() as session:
-             async with session.post(self.url, json=payload, headers=headers) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"LLM Error: {response.status} - {error_text}")
-                    yield f"data: {{\"error\": \"Upstream error: {response.status} - {error_text}\"}}\n\n"
-                    return
+    async def _coalesced_stream(self, messages: List[Dict[str, str]], caller: Caller = None) -> AsyncGenerator[bytes, None]:
+        if not settings.LLM_COALESCE_ENABLED:
+            async with aclosing(self._stream_request(messages, caller)) as stream:
+                async for chunk in stream:
+                    yield chunk
+            return
+
+        # Identical prompts in flight at the same time (a whole room on one lesson step) share one upstream stream,
+        # admitted once under the caller that started it
+        key = SingleFlight.key_for(self.model, messages)
+        async with aclosing(single_flight.stream(key, lambda: self._stream_request(messages, caller))) as stream:
+            async for chunk in stream:
+                yield chunk
+
+    async def _stream_request(self, messages: List[Dict[str, str]], caller: Caller = None) -> AsyncGenerator[bytes, None]:
+         # Admission control: wait for a global and per-user slot, or tell the client when to retry
+         caller = caller or Caller(None, PRIORITY_LESSON)
+         try:
+            await admission.acquire(caller)
+         except AdmissionRejected as e:
+            yield f"data: {json.dumps({'error': str(e), 'retry_after': round(e.retry_after, 1)})}\n\n"
+            return
+         started = time.monotonic()
+         try:
+            async with aclosing(self._upstream(messages)) as stream:
+                async for chunk in stream:
+                    yield chunk
+         finally:
+            admission.release(caller, time.monotonic() - started)
+
+    async def _upstream(self, messages: List[Dict[str, str]]) -> AsyncGenerator[bytes, None]:
+         prompt_builder.observe(messages)
+
+         # Transcript capture is a bounded side channel; the stream itself is passed through untouched
+         tap = TranscriptTap(settings.LLM_TRANSCRIPT_MAX_BYTES) if settings.LLM_TRANSCRIPT_LOG else None
+
+         # The usage event is the last one before [DONE]; only the stream tail is kept to find it
+         usage_tail = b"" if settings.LLM_STREAM_USAGE else None
+
+         # The router picks a provider, hedges slow first tokens and fails over until one starts streaming
+         try:
+            # Forward upstream chunks as they arrive, without re-splitting or decoding them
+            async with aclosing(self.router.stream(messages)) as stream:
+                async for chunk in stream:
+                    if tap is not None:
+                        tap.append(chunk)
+                    if usage_tail is not None:
+                        usage_tail = (usage_tail + chunk)[-_USAGE_TAIL_BYTES:]
+                    yield chunk
+         except UpstreamError as e:
+            # Raised only before the first byte, once every provider has failed
+            logger.error(f"LLM Error: {e}")
+            yield f"data: {json.dumps({'error': f'Upstream error: {e}'})}\n\n"
+            return
+
+         if usage_tail:
+             prompt_builder.record_usage(_parse_usage(usage_tail))
+
+         if tap is not None:
+             logger.info(f"LLM Response: {tap.text()[:100]}...")
+
+_USAGE_TAIL_BYTES = 4096
+
+def _parse_usage(tail: bytes) -> Optional[Dict[str, Any]]:
+    # Every chunk carries "usage": null when include_usage is on; the populated one comes last
+    for line in reversed(tail.split(b"\n")):
+        if line.startswith(b"data:") and b'"usage"' in line:
+            try:
+                usage = json.loads(line[5:]).get("usage")
+            except ValueError:
+                continue
+            if usage:
+                return usage
+    return None
 
-                async for line in response.content:
-                    if line:
-                        decoded_line = line.decode('utf-8').strip()
-                        if decoded_line.startswith("data: ") and decoded_line != "data: [DONE]":
-                             try:
-                                 json_str = decoded_line[6:]
-                                 data = json.loads(json_str)
-                                 # OpenAI delta content
-                                 content = data.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                                 if content:
-                                     full_response_text += content
-                             except:
-                                 pass
-                        yield line
-         
-         logger.info(f"LLM Response: {full_response_text[:100]}...")
+_llm_service: LLMService = None
 
 def get_llm_service() -> LLMService:
-    return OpenAILLMService()
+    # One shared instance: every router streams through the app-wide connection pool
+    global _llm_service
+    if _llm_service is None:
+        _llm_service = OpenAILLMService()
+    return _llm_service
@@ -0,0 +1,430 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, AsyncGenerator, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.http import http_pool, CircuitBreaker, UpstreamError
+from app.services.telemetry import (
+    llm_headers, llm_ttft, llm_duration, llm_rate, llm_errors, llm_cancelled, llm_tokens_saved, llm_seconds_saved,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class ProviderStats:
+    """Rolling window of time-to-first-token samples and request outcomes for one provider."""
+
+    def __init__(self, window: int):
+        self.ttft: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.ttft:
+            return None
+        ordered = sorted(self.ttft)
+        return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def score(self) -> float:
+        """Expected wait for a first token; lower is better. Unmeasured providers get probed first."""
+        if not self.ttft:
+            return float("inf") if self.failures else 0.0
+        expected = (self.percentile(0.5) + self.percentile(0.95)) / 2
+        return expected / max(1.0 - self.error_rate(), 0.1)
+
+
+class LLMProvider(ABC):
+    """One chat-completions backend. `stream` yields raw OpenAI-style SSE bytes and
+    raises UpstreamError before the first chunk if the request is rejected."""
+
+    kind = "provider"
+
+    def __init__(self, name: str, model: str):
+        self.name = name
+        self.model = model
+        self.stats = ProviderStats(settings.LLM_STATS_WINDOW)
+        self.breaker = CircuitBreaker(settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_TIMEOUT)
+
+    @abstractmethod
+    def stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[bytes]:
+        pass
+
+    @abstractmethod
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: int = None) -> str:
+        pass
+
+    def available(self) -> bool:
+        breaker = self.breaker
+        if breaker.state == CircuitBreaker.CLOSED:
+            return True
+        return breaker.state == CircuitBreaker.OPEN and time.monotonic() - breaker.opened_at >= breaker.reset_timeout
+
+    def record_success(self, ttft: float = None):
+        if ttft is not None:
+            self.stats.ttft.append(ttft)
+        self.stats.outcomes.append(True)
+        self.breaker.record_success()
+
+    def record_failure(self, error: Exception):
+        llm_errors.inc(self.name, str(error.status) if isinstance(error, UpstreamError) else type(error).__name__)
+        self.stats.failures += 1
+        self.stats.outcomes.append(False)
+        self.breaker.record_failure()
+
+    def release(self):
+        # An attempt abandoned before its outcome was known (hedge loser, client gone) must not
+        # leave a half-open breaker waiting for a probe that will never report back
+        self.breaker.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        stats = self.stats
+        p50, p95 = stats.percentile(0.5), stats.percentile(0.95)
+        return {
+            "kind": self.kind,
+            "model": self.model,
+            "circuit": self.breaker.state,
+            "requests": stats.requests,
+            "failures": stats.failures,
+            "error_rate": round(stats.error_rate(), 3),
+            "ttft_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "ttft_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "hedges": stats.hedges,
+            "hedges_won": stats.hedges_won,
+        }
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Any /v1/chat/completions endpoint: OpenAI itself, or a local llama.cpp / Ollama server."""
+
+    kind = "openai_compatible"
+
+    def __init__(self, name: str, url: str, model: str, api_key: str = None, include_usage: bool = False):
+        super().__init__(name, model)
+        self.url = url
+        self.api_key = api_key
+        self.include_usage = include_usage
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncGenerator[bytes, None]:
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True
+        }
+        if self.include_usage:
+            payload["stream_options"] = {"include_usage": True}
+
+        started = time.perf_counter()
+        session = await http_pool.get_session()
+        async with session.post(self.url, json=payload, headers=self._headers()) as response:
+            llm_headers.observe(time.perf_counter() - started, self.name)
+            if response.status != 200:
+                error_text = await response.text()
+                raise UpstreamError(f"{response.status} - {error_text}", response.status, error_text)
+            async for chunk in response.content.iter_any():
+                yield chunk
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: int = None) -> str:
+        payload = {"model": self.model, "messages": messages}
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        session = await http_pool.get_session()
+        async with session.post(self.url, json=payload, headers=self._headers()) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise UpstreamError(f"{response.status} - {error_text}", response.status, error_text)
+            data = await response.json(content_type=None)
+        return data["choices"][0]["message"]["content"] or ""
+
+
+_FAKE_SENTENCES = (
+    "Good question!",
+    "A noun is a word that names a person, place, thing or idea.",
+    "Verbs describe actions, and adjectives tell us more about nouns.",
+    "Let's look at an example from the lesson together.",
+    "Try reading the sentence again and find the subject first.",
+    "You are doing well, keep practising a little every day.",
+    "Do you want me to continue the lesson?",
+)
+
+
+class FakeProvider(LLMProvider):
+    """Deterministic in-process stand-in for offline tests and load tests."""
+
+    kind = "fake"
+
+    def __init__(self, name: str, ttft: float, token_delay: float, tokens: int,
+                 jitter: float = 0.2, error_rate: float = 0.0, seed: int = 0):
+        super().__init__(name, "fake")
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self._faults = random.Random(seed)
+
+    def _rng(self, messages: List[Dict[str, str]]) -> random.Random:
+        digest = hashlib.sha1(json.dumps([self.seed, messages], sort_keys=True).encode()).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def _reply(self, rng: random.Random) -> List[str]:
+        words: List[str] = []
+        while len(words) < self.tokens:
+            words.extend(rng.choice(_FAKE_SENTENCES).split())
+        return [word + " " for word in words[:self.tokens]]
+
+    def _delay(self, rng: random.Random, base: float) -> float:
+        return max(base * (1 + rng.uniform(-self.jitter, self.jitter)), 0.0)
+
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncGenerator[bytes, None]:
+        rng = self._rng(messages)
+        await asyncio.sleep(self._delay(rng, self.ttft))
+        if self.error_rate and self._faults.random() < self.error_rate:
+            raise UpstreamError("503 - fake provider fault", 503)
+
+        completion_id = f"chatcmpl-fake-{rng.getrandbits(48):012x}"
+        for i, token in enumerate(self._reply(rng)):
+            delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+            event = {"id": completion_id, "object": "chat.completion.chunk", "model": self.model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            yield b"data: " + json.dumps(event).encode() + b"\n\n"
+            await asyncio.sleep(self._delay(rng, self.token_delay))
+        event = {"id": completion_id, "object": "chat.completion.chunk", "model": self.model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield b"data: " + json.dumps(event).encode() + b"\n\ndata: [DONE]\n\n"
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: int = None) -> str:
+        rng = self._rng(messages)
+        await asyncio.sleep(self._delay(rng, self.ttft))
+        if self.error_rate and self._faults.random() < self.error_rate:
+            raise UpstreamError("503 - fake provider fault", 503)
+        reply = self._reply(rng)
+        return "".join(reply[:max_tokens] if max_tokens else reply).strip()
+
+
+class LLMRouter:
+    """Picks a provider per request and fails over between them."""
+
+    def __init__(self, providers: List[LLMProvider], routing: str = "latency", hedge_after: float = 0.0):
+        self.providers = providers
+        self.routing = routing
+        self.hedge_after = hedge_after
+        self.failovers = 0
+        self.hedges = 0
+        self.exhausted = 0
+        self.cancelled = 0
+        self.tokens_saved = 0.0
+        self.seconds_saved = 0.0
+        # Running averages of completed streams, to estimate what a cancelled one would have cost
+        self._avg_events: Optional[float] = None
+        self._avg_duration: Optional[float] = None
+
+    def ranked(self) -> List[LLMProvider]:
+        available = [p for p in self.providers if p.available()]
+        if self.routing == "latency":
+            # Stable sort: configuration order breaks ties
+            available.sort(key=lambda p: p.stats.score())
+        return available
+
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncGenerator[bytes, None]:
+        provider, first, upstream, started = await self._first_chunk(messages)
+        first_at = time.perf_counter()
+        # One SSE event is about one token; bytes.count scans in C without allocating
+        events = first.count(b"data:")
+        outcome = "error"
+        try:
+            yield first
+            async for chunk in upstream:
+                events += chunk.count(b"data:")
+                yield chunk
+            outcome = "ok"
+        except (GeneratorExit, asyncio.CancelledError):
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            provider.record_failure(e)
+            raise
+        finally:
+            await upstream.aclose()
+            now = time.perf_counter()
+            llm_duration.observe(now - started, provider.name, outcome)
+            if outcome == "ok":
+                if now > first_at:
+                    llm_rate.observe(events / (now - first_at), provider.name)
+                self._record_completed(events, now - started)
+            elif outcome == "cancelled":
+                self._record_cancelled(provider, events, now - started)
+
+    def _record_completed(self, events: int, duration: float):
+        if self._avg_events is None:
+            self._avg_events, self._avg_duration = float(events), duration
+        else:
+            self._avg_events += 0.1 * (events - self._avg_events)
+            self._avg_duration += 0.1 * (duration - self._avg_duration)
+
+    def _record_cancelled(self, provider: LLMProvider, events: int, elapsed: float):
+        self.cancelled += 1
+        llm_cancelled.inc(provider.name)
+        if self._avg_events is None:
+            return
+        tokens = max(self._avg_events - events, 0.0)
+        seconds = max(self._avg_duration - elapsed, 0.0)
+        self.tokens_saved += tokens
+        self.seconds_saved += seconds
+        llm_tokens_saved.inc(provider.name, amount=tokens)
+        llm_seconds_saved.inc(provider.name, amount=seconds)
+
+    async def _first_chunk(self, messages: List[Dict[str, str]]) -> Tuple[LLMProvider, bytes, AsyncGenerator, float]:
+        queue = self.ranked()
+        attempts: Dict[asyncio.Task, Tuple[LLMProvider, AsyncGenerator, float, bool]] = {}
+        hedged = False
+        won = False
+        last_error: Optional[Exception] = None
+
+        def launch(hedge: bool = False) -> bool:
+            while queue:
+                provider = queue.pop(0)
+                if not provider.breaker.allow():
+                    continue
+                provider.stats.requests += 1
+                if hedge:
+                    provider.stats.hedges += 1
+                upstream = provider.stream(messages)
+                attempts[asyncio.ensure_future(upstream.__anext__())] = (provider, upstream, time.perf_counter(), hedge)
+                return True
+            return False
+
+        try:
+            launch()
+            while attempts:
+                can_hedge = self.hedge_after > 0 and not hedged and queue
+                done, _ = await asyncio.wait(
+                    attempts, timeout=self.hedge_after if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = launch(hedge=True)
+                    self.hedges += hedged
+                    continue
+                for task in done:
+                    provider, upstream, started, hedge = attempts.pop(task)
+                    try:
+                        first = task.result()
+                    except StopAsyncIteration:
+                        last_error = UpstreamError(f"{provider.name} closed the stream without data")
+                    except Exception as e:
+                        last_error = e
+                    else:
+                        ttft = time.perf_counter() - started
+                        provider.record_success(ttft)
+                        llm_ttft.observe(ttft, provider.name)
+                        if hedge:
+                            provider.stats.hedges_won += 1
+                        won = True
+                        return provider, first, upstream, started
+                    logger.warning(f"LLM provider {provider.name} failed: {last_error}")
+                    provider.record_failure(last_error)
+                    await upstream.aclose()
+                if not attempts and launch():
+                    self.failovers += 1
+        finally:
+            for task, (provider, upstream, started, _) in attempts.items():
+                if won:
+                    # The loser's first token would have come later still: keep that as a lower-bound sample
+                    provider.stats.ttft.append(time.perf_counter() - started)
+                else:
+                    # Still waiting for a first token when the caller went away
+                    self._record_cancelled(provider, 0, time.perf_counter() - started)
+                task.cancel()
+                try:
+                    await task
+                except BaseException:
+                    pass
+                provider.release()
+                await upstream.aclose()
+
+        self.exhausted += 1
+        if last_error is None:
+            raise UpstreamError("No LLM provider available", 503)
+        if isinstance(last_error, UpstreamError):
+            raise last_error
+        raise UpstreamError(f"{type(last_error).__name__}: {last_error}")
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: int = None) -> str:
+        last_error: Optional[Exception] = None
+        for provider in self.ranked():
+            if not provider.breaker.allow():
+                continue
+            provider.stats.requests += 1
+            try:
+                result = await provider.complete(messages, max_tokens)
+            except asyncio.CancelledError:
+                provider.release()
+                raise
+            except Exception as e:
+                logger.warning(f"LLM provider {provider.name} failed: {e}")
+                provider.record_failure(e)
+                last_error = e
+                continue
+            provider.record_success()
+            return result
+        raise RuntimeError(f"LLM Error: {last_error or 'No LLM provider available'}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "routing": self.routing,
+            "hedge_after": self.hedge_after,
+            "order": [p.name for p in self.ranked()],
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "exhausted": self.exhausted,
+            "cancelled": self.cancelled,
+            "tokens_saved_est": round(self.tokens_saved),
+            "upstream_seconds_saved_est": round(self.seconds_saved, 1),
+            "providers": {p.name: p.snapshot() for p in self.providers},
+        }
+
+
+def providers_from_settings() -> List[LLMProvider]:
+    """LLM_PROVIDERS lists provider names in order of preference: openai, local, fake."""
+    providers: List[LLMProvider] = []
+    for name in (n.strip() for n in settings.LLM_PROVIDERS.split(",")):
+        if not name:
+            continue
+        if name == "openai":
+            if not settings.OPENAI_API_KEY:
+                logger.warning("LLM provider openai skipped: OPENAI_API_KEY is not set")
+                continue
+            providers.append(OpenAICompatibleProvider(
+                "openai", settings.OPENAI_API_URL, settings.OPENAI_MODEL, settings.OPENAI_API_KEY,
+                include_usage=settings.LLM_STREAM_USAGE,
+            ))
+        elif name == "local":
+            providers.append(OpenAICompatibleProvider(
+                "local", settings.LOCAL_LLM_URL, settings.LOCAL_LLM_MODEL, settings.LOCAL_LLM_API_KEY,
+            ))
+        elif name == "fake":
+            providers.append(FakeProvider(
+                "fake", settings.FAKE_LLM_TTFT, settings.FAKE_LLM_TOKEN_DELAY, settings.FAKE_LLM_TOKENS,
+                settings.FAKE_LLM_JITTER, settings.FAKE_LLM_ERROR_RATE, settings.FAKE_LLM_SEED,
+            ))
+        else:
+            logger.warning(f"Unknown LLM provider {name!r} in LLM_PROVIDERS, skipped")
+    return providers
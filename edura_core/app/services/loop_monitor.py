@@ -0,0 +1,147 @@
+import asyncio
+import contextvars
+import logging
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.services.telemetry import loop_blocked, loop_lag, request_scope, route_label
+
+logger = logging.getLogger("uvicorn.error")
+
+# Innermost frames kept per blocking report; the blocking call is at the bottom
+_STACK_DEPTH = 20
+_RECENT_BLOCKS = 50
+_LAG_WINDOW = 1200
+
+
+class LoopMonitor:
+    """Diagnostic mode (LOOP_MONITOR_ENABLED): event-loop lag and blocking-call detection."""
+
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags = deque(maxlen=_LAG_WINDOW)
+        self.max_lag = 0.0
+        self.blocked = 0
+        self.recent = deque(maxlen=_RECENT_BLOCKS)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._beat = 0.0
+        # Filled in by the watchdog thread while the loop is stuck, reported by the ticker afterwards
+        self._stall: Optional[Dict] = None
+        self._contexts = weakref.WeakKeyDictionary()
+        self._previous_factory = None
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._previous_factory = self._loop.get_task_factory()
+        self._loop.set_task_factory(self._task_factory)
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._loop.set_task_factory(self._previous_factory)
+        self._watchdog.join(timeout=1)
+
+    def _task_factory(self, loop, coro, context=None):
+        if context is None:
+            context = contextvars.copy_context()
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, context=context)
+        else:
+            task = asyncio.Task(coro, loop=loop, context=context)
+        self._contexts[task] = context
+        return task
+
+    async def _tick(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            lag = max(0.0, now - expected)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            loop_lag.observe(lag)
+            if lag > self.threshold:
+                self._report(lag, self._stall)
+            self._stall = None
+
+    def _watch(self):
+        poll = min(self.interval, self.threshold) / 2
+        while not self._stopped.wait(poll):
+            stuck = time.monotonic() - self._beat - self.interval
+            if stuck > self.threshold and self._stall is None:
+                try:
+                    self._stall = self._capture()
+                except Exception:
+                    # The loop may resume mid-capture; the lag is still reported, without a stack
+                    pass
+
+    def _capture(self) -> Dict:
+        # Runs on the watchdog thread while the loop thread is blocked
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = traceback.format_list(traceback.extract_stack(frame, limit=_STACK_DEPTH)) if frame else []
+        task = asyncio.current_task(self._loop)
+        route = None
+        context = self._contexts.get(task) if task is not None else None
+        if context is not None:
+            scope = context.get(request_scope)
+            if scope is not None:
+                route = f"{scope['method']} {route_label(scope)}" if "method" in scope else route_label(scope)
+        return {
+            "route": route,
+            "task": task.get_name() if task is not None else None,
+            "stack": [line.rstrip() for line in stack],
+        }
+
+    def _report(self, lag: float, stall: Optional[Dict]):
+        # A lag without a captured stall was many short callbacks, or a block just under the watchdog's poll
+        stall = stall or {"route": None, "task": None, "stack": []}
+        self.blocked += 1
+        loop_blocked.inc(stall["route"] or "none")
+        block = {"at": time.time(), "blocked_ms": round(lag * 1000, 1), **stall}
+        self.recent.append(block)
+        where = stall["route"] or stall["task"] or "a callback outside any request"
+        logger.warning(f"Event loop blocked for {block['blocked_ms']} ms in {where}\n" + "\n".join(stall["stack"]))
+
+    def snapshot(self) -> Dict:
+        lags: List[float] = sorted(self.lags)
+        pick = lambda p: round(lags[min(len(lags) - 1, int(len(lags) * p))] * 1000, 2) if lags else None
+        return {
+            "enabled": self._task is not None,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "lag_p50_ms": pick(0.50),
+            "lag_p99_ms": pick(0.99),
+            "lag_max_ms": round(self.max_lag * 1000, 2),
+            "blocked": self.blocked,
+            "recent_blocks": list(self.recent),
+        }
+
+
+loop_monitor = LoopMonitor(settings.LOOP_MONITOR_INTERVAL, settings.LOOP_BLOCK_THRESHOLD)
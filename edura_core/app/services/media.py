@@ -0,0 +1,337 @@
+import mimetypes
+import os
+import stat
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+
+# Content-addressed files never change under the same URL
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that adds a Cache-Control header to every file and 304 response."""
+
+    def __init__(self, *args, cache_control: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if self.cache_control:
+            response.headers["Cache-Control"] = self.cache_control
+        return response
+
+
+# Data stores that can sit next to media in app/data (history, homework sessions, their SQLite side files)
+PRIVATE_SUFFIXES = (".db", ".db-wal", ".db-shm", ".db-journal", ".jsonl", ".idx", ".tmp", ".migrated")
+PRIVATE_NAMES = frozenset(("history.json",))
+
+
+class PublicStaticFiles(StaticFiles):
+    """StaticFiles that never serves the data stores kept in the same directory."""
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        name = os.path.basename(path.rstrip("/")).lower()
+        if name in PRIVATE_NAMES or name.endswith(PRIVATE_SUFFIXES):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single `bytes=` range; None means serve the whole file."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class MediaFile:
+    """Response metadata of one file, computed once per version of the file."""
+
+    __slots__ = ("path", "version", "size", "etag", "last_modified", "mtime", "content_type", "checked_at", "requests")
+
+    def __init__(self, path: str, st: os.stat_result):
+        self.path = path
+        self.version = (st.st_ino, st.st_size, st.st_mtime_ns)
+        self.size = st.st_size
+        # Strong: a new inode, size or mtime is a new ETag, so equal tags mean equal bytes
+        self.etag = f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        self.mtime = int(st.st_mtime)
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.checked_at = 0.0
+        self.requests = 0
+
+
+def _stat_file(directory: str, relative: str) -> Optional[Tuple[str, os.stat_result]]:
+    path = os.path.realpath(os.path.join(directory, relative))
+    if not path.startswith(directory + os.sep):
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (path, st) if stat.S_ISREG(st.st_mode) else None
+
+
+def _read_head(path: str, length: int) -> bytes:
+    with open(path, "rb", buffering=0) as f:
+        return os.pread(f.fileno(), length, 0)
+
+
+def _route_path(scope: Scope) -> str:
+    # Path below the mount point
+    path, root = scope["path"], scope.get("root_path", "")
+    return path[len(root):] if root and path.startswith(root) else path
+
+
+class HotSegments:
+    """LRU of the first `segment_bytes` of popular files, bounded by `budget` bytes."""
+
+    def __init__(self, segment_bytes: int, budget: int, after: int):
+        self.segment_bytes = segment_bytes
+        self.budget = budget
+        self.after = after
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._loading = set()
+        self.bytes = 0
+        self.hits = 0
+        self.loads = 0
+
+    async def get(self, media: MediaFile) -> Optional[bytes]:
+        key = (media.path, media.etag)
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+        if media.requests < self.after or key in self._loading or self.segment_bytes <= 0:
+            return None
+        self._loading.add(key)
+        try:
+            data = await run_in_threadpool(_read_head, media.path, min(self.segment_bytes, media.size))
+        finally:
+            self._loading.discard(key)
+        self.loads += 1
+        self._entries[key] = data
+        self.bytes += len(data)
+        while self.bytes > self.budget and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+        return data
+
+    def snapshot(self) -> Dict:
+        return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits, "loads": self.loads}
+
+
+class MediaFiles:
+    """ASGI app serving lesson videos: single byte ranges, strong ETags, conditional requests."""
+
+    def __init__(self, directory: str, chunk_size: int, stat_interval: float, max_age: int, hot: HotSegments):
+        self.directory = os.path.realpath(directory)
+        self.chunk_size = chunk_size
+        self.stat_interval = stat_interval
+        self.cache_control = f"public, max-age={max_age}"
+        self.hot = hot
+        self._files: Dict[str, MediaFile] = {}
+        self.requests = 0
+        self.ranges = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return
+        if scope["method"] not in ("GET", "HEAD"):
+            return await PlainTextResponse("Method Not Allowed", 405, {"Allow": "GET, HEAD"})(scope, receive, send)
+        media = await self._lookup(_route_path(scope).lstrip("/"))
+        if media is None:
+            return await PlainTextResponse("Not Found", 404)(scope, receive, send)
+        self.requests += 1
+        media.requests += 1
+
+        request = Headers(scope=scope)
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": media.etag,
+            "last-modified": media.last_modified,
+            "cache-control": self.cache_control,
+        }
+        status = self._precondition(request, media)
+        if status is not None:
+            if status == 304:
+                self.not_modified += 1
+            return await Response(status_code=status, headers=headers)(scope, receive, send)
+
+        start, end = 0, media.size - 1
+        status = 200
+        range_header = request.get("range")
+        if range_header and self._if_range(request.get("if-range"), media):
+            try:
+                byte_range = parse_range(range_header, media.size)
+            except RangeNotSatisfiable:
+                headers["content-range"] = f"bytes */{media.size}"
+                return await Response(status_code=416, headers=headers)(scope, receive, send)
+            if byte_range is not None:
+                start, end = byte_range
+                status = 206
+                self.ranges += 1
+                headers["content-range"] = f"bytes {start}-{end}/{media.size}"
+
+        length = end - start + 1 if media.size else 0
+        headers["content-type"] = media.content_type
+        headers["content-length"] = str(length)
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+        })
+        if scope["method"] == "HEAD" or length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        try:
+            await self._send_body(scope, send, media, start, length)
+        except OSError:
+            # The client went away mid-transfer (seek, closed tab); nothing left to send
+            pass
+
+    async def _lookup(self, relative: str) -> Optional[MediaFile]:
+        media = self._files.get(relative)
+        now = time.monotonic()
+        if media is not None and now - media.checked_at < self.stat_interval:
+            return media
+        found = await run_in_threadpool(_stat_file, self.directory, relative)
+        if found is None:
+            self._files.pop(relative, None)
+            return None
+        path, st = found
+        if media is None or media.version != (st.st_ino, st.st_size, st.st_mtime_ns):
+            media = self._files[relative] = MediaFile(path, st)
+        media.checked_at = now
+        return media
+
+    def _precondition(self, request: Headers, media: MediaFile) -> Optional[int]:
+        if_match = request.get("if-match")
+        if if_match is not None and if_match.strip() != "*" and media.etag not in _tags(if_match):
+            return 412
+        if_none_match = request.get("if-none-match")
+        if if_none_match is not None:
+            if if_none_match.strip() == "*" or media.etag in _tags(if_none_match, weak=True):
+                return 304
+            return None
+        if_modified_since = request.get("if-modified-since")
+        if if_modified_since:
+            since = _http_date(if_modified_since)
+            if since is not None and media.mtime <= since:
+                return 304
+        return None
+
+    def _if_range(self, if_range: Optional[str], media: MediaFile) -> bool:
+        # A range is only honoured if the client's copy is still this exact version
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            return if_range == media.etag
+        return if_range == media.last_modified
+
+    async def _send_body(self, scope: Scope, send: Send, media: MediaFile, start: int, length: int):
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            with open(media.path, "rb") as f:
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": start, "count": length})
+            self.bytes_sent += length
+            return
+        if "http.response.pathsend" in extensions and start == 0 and length == media.size:
+            await send({"type": "http.response.pathsend", "path": media.path})
+            self.bytes_sent += length
+            return
+
+        offset, end = start, start + length
+        if offset < self.hot.segment_bytes:
+            head = await self.hot.get(media)
+            if head is not None:
+                # Same piece size as disk reads, so the first bytes go out without waiting for the whole head
+                stop = min(end, len(head))
+                while offset < stop:
+                    body = head[offset:min(stop, offset + self.chunk_size)]
+                    offset += len(body)
+                    await send({"type": "http.response.body", "body": body, "more_body": offset < end})
+                    self.bytes_sent += len(body)
+        if offset == end:
+            return
+        fd = await run_in_threadpool(os.open, media.path, os.O_RDONLY)
+        try:
+            while offset < end:
+                chunk = await run_in_threadpool(os.pread, fd, min(self.chunk_size, end - offset), offset)
+                if not chunk:
+                    raise OSError(f"{media.path} shrank while being served")
+                offset += len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": offset < end})
+                self.bytes_sent += len(chunk)
+        finally:
+            os.close(fd)
+
+    def snapshot(self) -> Dict:
+        return {
+            "files": len(self._files),
+            "requests": self.requests,
+            "range_requests": self.ranges,
+            "not_modified": self.not_modified,
+            "bytes_sent": self.bytes_sent,
+            "hot_segments": self.hot.snapshot(),
+        }
+
+
+def _tags(header: str, weak: bool = False) -> List[str]:
+    tags = [tag.strip() for tag in header.split(",")]
+    # If-None-Match compares weakly, If-Match strongly
+    return [tag.removeprefix("W/") for tag in tags] if weak else tags
+
+
+def _http_date(value: str) -> Optional[int]:
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+lesson_videos = MediaFiles(
+    settings.MEDIA_VIDEO_DIR,
+    settings.MEDIA_CHUNK_SIZE,
+    settings.MEDIA_STAT_INTERVAL,
+    settings.MEDIA_MAX_AGE,
+    HotSegments(settings.MEDIA_HOT_BYTES, settings.MEDIA_HOT_CACHE_BYTES, settings.MEDIA_HOT_AFTER),
+)
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterator, Dict, List, Set
+
+from app.core.config import settings
+from app.services.cache import CHARS_PER_TOKEN
+from app.services.llm import get_llm_service
+from app.services.session_store import ChatSession, SessionStore
+from app.services.sse import SSEDeltaParser
+
+logger = logging.getLogger("uvicorn.error")
+
+# Role and framing tokens the chat format adds to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a tutoring conversation between a student and a tutor.
+Merge the previous summary (if any) with the new conversation turns into one short summary.
+Keep the facts the tutor needs to continue: what the student asked, what was explained, and any open questions.
+Reply with the summary only, in under 120 words.
+""".strip()
+
+
+def estimate_tokens(text: str) -> int:
+    # Local estimate; close enough for budgeting without calling a tokenizer per turn
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def window_start(turns: List[List[str]], budget: int) -> int:
+    """Index of the oldest turn in the newest run of turns that fits in budget."""
+    used = 0
+    start = len(turns)
+    while start > 0:
+        cost = estimate_tokens(turns[start - 1][1])
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+    # Never open the window on an assistant reply whose question was cut off
+    while start < len(turns) and turns[start][0] != "user":
+        start += 1
+    return start
+
+
+class ConversationMemory:
+    """Server-side chat history, assembled into prompts under a token budget."""
+
+    def __init__(self, budget: int, summarize: bool, summary_max_tokens: int):
+        self.budget = budget
+        self.summarize = summarize
+        self.summary_max_tokens = summary_max_tokens
+        self._tasks: Set[asyncio.Task] = set()
+        self._summarizing: Set[str] = set()
+        self.turns_recorded = 0
+        self.turns_trimmed = 0
+        self.summaries = 0
+        self.summary_failures = 0
+
+    def seed(self, session: ChatSession, history: List[Dict[str, str]]):
+        # Clients that still send their whole history only initialise an empty session
+        if session.turns or session.summary:
+            return
+        session.turns = [
+            [m["role"], m["content"]] for m in history
+            if m.get("role") in ("user", "assistant") and m.get("content")
+        ]
+
+    def _history_budget(self, session: ChatSession, message: str = "") -> int:
+        used = estimate_tokens(session.system_prompt) + estimate_tokens(message)
+        if session.context:
+            used += estimate_tokens(session.context)
+        if session.summary:
+            used += estimate_tokens(session.summary)
+        return max(self.budget - used, 0)
+
+    def assemble(self, session: ChatSession, message: str) -> List[Dict[str, str]]:
+        """Messages to send after the system prompt: session context, summary, windowed history, then the new message."""
+        messages = []
+        if session.context:
+            messages.append({"role": "system", "content": session.context})
+        if session.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {session.summary}"})
+        start = window_start(session.turns, self._history_budget(session, message))
+        messages.extend({"role": role, "content": content} for role, content in session.turns[start:])
+        messages.append({"role": "user", "content": message})
+        return messages
+
+    async def stream_turn(self, store: SessionStore, session: ChatSession, message: str,
+                          stream: AsyncIterator) -> AsyncGenerator:
+        """Passes the LLM stream through and records the turn once the reply has completed."""
+        parser = SSEDeltaParser()
+        reply: List[str] = []
+        async with aclosing(stream):
+            async for chunk in stream:
+                if isinstance(chunk, bytes):
+                    reply.extend(parser.feed(chunk))
+                yield chunk
+        reply.extend(parser.flush())
+
+        # Failed or truncated replies are not remembered, so the next turn retries from a clean history
+        if not parser.done:
+            return
+        session.turns.append(["user", message])
+        session.turns.append(["assistant", "".join(reply)])
+        self.turns_recorded += 1
+        self._compact(store, session)
+        await store.put(session)
+
+    def _compact(self, store: SessionStore, session: ChatSession):
+        start = window_start(session.turns, self._history_budget(session))
+        if start == 0:
+            return
+        if not self.summarize:
+            del session.turns[:start]
+            self.turns_trimmed += start
+            return
+        # Out-of-window turns stay in the session (unused by assemble) until they are folded in
+        if session.session_id in self._summarizing:
+            return
+        self._summarizing.add(session.session_id)
+        task = asyncio.create_task(self._fold(store, session.session_id, session.turns[:start], session.summary))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, store: SessionStore, session_id: str, folded: List[List[str]], previous: str):
+        try:
+            transcript = "\n".join(f"{role}: {content}" for role, content in folded)
+            if previous:
+                transcript = f"Previous summary: {previous}\n\nNew turns:\n{transcript}"
+            summary = await get_llm_service().complete(
+                SUMMARY_PROMPT, [{"role": "user", "content": transcript}], self.summary_max_tokens
+            )
+            self.summaries += 1
+        except Exception as e:
+            # Fall back to plain trimming: the folded turns are dropped either way
+            logger.error(f"Conversation summary failed for {session_id}: {e}")
+            summary = None
+            self.summary_failures += 1
+
+        try:
+            session = await store.get(session_id)
+            if session is not None and session.turns[:len(folded)] == folded:
+                del session.turns[:len(folded)]
+                self.turns_trimmed += len(folded)
+                if summary:
+                    session.summary = summary.strip()
+                await store.put(session)
+        finally:
+            self._summarizing.discard(session_id)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "token_budget": self.budget,
+            "turns_recorded": self.turns_recorded,
+            "turns_trimmed": self.turns_trimmed,
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+            "summarizing": len(self._summarizing),
+        }
+
+
+chat_memory = ConversationMemory(
+    settings.CHAT_MEMORY_TOKEN_BUDGET, settings.CHAT_MEMORY_SUMMARIZE, settings.CHAT_SUMMARY_MAX_TOKENS
+)
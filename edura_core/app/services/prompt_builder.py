@@ -0,0 +1,105 @@
+import hashlib
+import json
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.prompt import SYSTEM_PROMPT_TEMPLATE, HW_TUTOR_PROMPT, ENGLISH_TEACHER_PROMPT
+from app.services.cache import CHARS_PER_TOKEN
+
+# SYSTEM_PROMPT_TEMPLATE keeps its single-template form for /get-system-prompt; requests send it in three parts
+_LESSON_SPLIT = "Input Context:"
+
+
+class PromptBuilder:
+    """Assembles chat prompts as static prefix, then per-session context, then per-turn messages."""
+
+    def __init__(self, reuse_window: float, max_tracked: int = 4096):
+        self.reuse_window = reuse_window
+        self.max_tracked = max_tracked
+        self._prefix_ids: Dict[str, str] = {}
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=50)
+        self.requests = 0
+        self.reused = 0
+        self.prompt_tokens_est = 0
+        self.reusable_tokens_est = 0
+        self.upstream_prompt_tokens = 0
+        self.upstream_cached_tokens = 0
+
+        lesson_prefix, _ = SYSTEM_PROMPT_TEMPLATE.split(_LESSON_SPLIT, 1)
+        self.lesson_prefix = self.intern(lesson_prefix)
+        self.hw_tutor_prefix = self.intern(HW_TUTOR_PROMPT)
+        self.english_prefix = self.intern(ENGLISH_TEACHER_PROMPT)
+
+    def intern(self, text: str) -> str:
+        # Every request for a prefix shares one string object, and it gets a short id for stats
+        text = sys.intern(text.strip())
+        if text not in self._prefix_ids:
+            self._prefix_ids[text] = hashlib.sha1(text.encode()).hexdigest()[:12]
+        return text
+
+    def lesson_messages(self, context: str, question: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self.lesson_prefix},
+            {"role": "system", "content": f"{_LESSON_SPLIT} {context}"},
+            {"role": "user", "content": f"Student Question: {question}"},
+        ]
+
+    @staticmethod
+    def student_context(student_name: str, grade_report: str) -> str:
+        return f"Student context:\nName: {student_name}\nGrade report: {grade_report}"
+
+    def observe(self, messages: List[Dict[str, str]]):
+        """Record prefix reuse for one upstream request."""
+        cacheable = 0
+        while cacheable < len(messages) and messages[cacheable]["role"] == "system":
+            cacheable += 1
+        prefix = messages[:cacheable]
+        prefix_chars = sum(len(m["content"]) for m in prefix)
+        total_chars = sum(len(m["content"]) for m in messages)
+
+        key = hashlib.sha1(json.dumps(prefix, ensure_ascii=False).encode()).hexdigest()
+        now = time.monotonic()
+        last = self._seen.pop(key, None)
+        reused = last is not None and now - last <= self.reuse_window
+        self._seen[key] = now
+        while len(self._seen) > self.max_tracked:
+            self._seen.popitem(last=False)
+
+        self.requests += 1
+        self.prompt_tokens_est += total_chars // CHARS_PER_TOKEN
+        if reused:
+            self.reused += 1
+            self.reusable_tokens_est += prefix_chars // CHARS_PER_TOKEN
+        self.recent.append({
+            "prefix_id": self._prefix_ids.get(prefix[0]["content"]) if prefix else None,
+            "prefix_tokens_est": prefix_chars // CHARS_PER_TOKEN,
+            "prompt_tokens_est": total_chars // CHARS_PER_TOKEN,
+            "reused": reused,
+        })
+
+    def record_usage(self, usage: Optional[Dict[str, Any]]):
+        # Final stream chunk when stream_options.include_usage is on (LLM_STREAM_USAGE)
+        if not usage:
+            return
+        self.upstream_prompt_tokens += usage.get("prompt_tokens") or 0
+        self.upstream_cached_tokens += (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "prefixes": len(self._prefix_ids),
+            "requests": self.requests,
+            "prefix_reused": self.reused,
+            "reuse_ratio": round(self.reused / self.requests, 3) if self.requests else 0.0,
+            "prompt_tokens_est": self.prompt_tokens_est,
+            "reusable_tokens_est": self.reusable_tokens_est,
+            "upstream_prompt_tokens": self.upstream_prompt_tokens,
+            "upstream_cached_tokens": self.upstream_cached_tokens,
+            "recent": list(self.recent),
+        }
+
+
+prompt_builder = PromptBuilder(settings.PROMPT_REUSE_WINDOW)
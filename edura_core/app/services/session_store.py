@@ -0,0 +1,231 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# Rough per-record bookkeeping cost (object header, slots, OrderedDict node)
+RECORD_OVERHEAD = 256
+
+
+class ChatSession:
+    """One tutoring chat: its canonical system prompt, student context and server-side conversation memory."""
+
+    __slots__ = ("session_id", "student_data", "grade_report", "system_prompt", "context", "turns", "summary",
+                 "created_at", "last_access", "size")
+
+    def __init__(self, session_id: str, student_data: Dict[str, Any], grade_report: str, system_prompt: str,
+                 context: str = "", turns: List[List[str]] = None, summary: str = "",
+                 created_at: float = None, last_access: float = None):
+        self.session_id = session_id
+        self.student_data = student_data
+        self.grade_report = grade_report
+        # Shared static prefix; everything student-specific goes in context so upstream prompt caching can reuse it
+        self.system_prompt = system_prompt
+        self.context = context
+        # [role, content] pairs, oldest first
+        self.turns = turns if turns is not None else []
+        self.summary = summary
+        self.created_at = created_at or time.time()
+        self.last_access = last_access or self.created_at
+        self.size = 0
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "student_data": self.student_data,
+            "grade_report": self.grade_report,
+            "system_prompt": self.system_prompt,
+            "context": self.context,
+            "turns": self.turns,
+            "summary": self.summary,
+            "created_at": self.created_at,
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, session_id: str, data: str, last_access: float) -> "ChatSession":
+        fields = json.loads(data)
+        return cls(session_id, fields["student_data"], fields["grade_report"], fields["system_prompt"],
+                   fields.get("context", ""), fields.get("turns"), fields.get("summary", ""), fields.get("created_at"), last_access)
+
+
+class SessionStore(ABC):
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[ChatSession]:
+        pass
+
+    @abstractmethod
+    async def put(self, session: ChatSession):
+        pass
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    def snapshot(self) -> Dict[str, Any]:
+        pass
+
+    def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store with LRU order, idle TTL and size caps; single worker only."""
+
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._bytes = 0
+        self.evicted_lru = 0
+        self.evicted_idle = 0
+
+    async def get(self, session_id: str) -> Optional[ChatSession]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        now = time.time()
+        if now - session.last_access > self.ttl:
+            self._remove(session_id)
+            self.evicted_idle += 1
+            return None
+        session.last_access = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def put(self, session: ChatSession):
+        self._remove(session.session_id)
+        session.size = len(session.to_json()) + RECORD_OVERHEAD
+        self._sessions[session.session_id] = session
+        self._bytes += session.size
+        self._evict()
+
+    async def delete(self, session_id: str) -> bool:
+        return self._remove(session_id)
+
+    def _remove(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self._bytes -= session.size
+        return True
+
+    def _evict(self):
+        # Idle sessions sit at the LRU end, so expired ones are dropped first
+        cutoff = time.time() - self.ttl
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.last_access < cutoff:
+                self.evicted_idle += 1
+            elif len(self._sessions) > self.max_entries or self._bytes > self.max_bytes:
+                self.evicted_lru += 1
+            else:
+                break
+            self._remove(oldest.session_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "sessions": len(self._sessions),
+            "bytes": self._bytes,
+            "evicted_lru": self.evicted_lru,
+            "evicted_idle": self.evicted_idle,
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """Shared store in a SQLite file, so every uvicorn worker sees the same sessions."""
+
+    def __init__(self, path: str, table: str, ttl: float, max_entries: int):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " session_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_access ON {table} (last_access)")
+
+    def _get(self, session_id: str) -> Optional[ChatSession]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT data, last_access FROM {self.table} WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            data, last_access = row
+            if now - last_access > self.ttl:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE session_id = ?", (session_id,))
+                return None
+            if now - last_access > self.ttl / 10:
+                self._conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE session_id = ?", (now, session_id))
+        return ChatSession.from_json(session_id, data, now)
+
+    def _put(self, session: ChatSession):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (session_id, data, last_access) VALUES (?, ?, ?)",
+                (session.session_id, session.to_json(), session.last_access),
+            )
+            self._conn.execute(f"DELETE FROM {self.table} WHERE last_access < ?", (now - self.ttl,))
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE session_id IN ("
+                f" SELECT session_id FROM {self.table} ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def _delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute(f"DELETE FROM {self.table} WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    async def get(self, session_id: str) -> Optional[ChatSession]:
+        return await run_in_threadpool(self._get, session_id)
+
+    async def put(self, session: ChatSession):
+        await run_in_threadpool(self._put, session)
+
+    async def delete(self, session_id: str) -> bool:
+        return await run_in_threadpool(self._delete, session_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {"backend": "sqlite", "sessions": count}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_session_store(name: str, backend: str = None) -> SessionStore:
+    backend = (backend or settings.HW_SESSION_BACKEND).lower()
+    if backend == "memory":
+        return MemorySessionStore(settings.HW_SESSION_TTL, settings.HW_SESSION_MAX_ENTRIES, settings.HW_SESSION_MAX_BYTES)
+    if backend == "sqlite":
+        os.makedirs(os.path.dirname(settings.HW_SESSION_DB) or ".", exist_ok=True)
+        return SQLiteSessionStore(settings.HW_SESSION_DB, name, settings.HW_SESSION_TTL, settings.HW_SESSION_MAX_ENTRIES)
+    raise ValueError(f"Unknown HW_SESSION_BACKEND: {backend}")
+
+
+hw_sessions = create_session_store("hw_sessions")
+english_sessions = create_session_store("english_sessions")
@@ -0,0 +1,150 @@
+import json
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterator, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.sse import SSEDeltaParser
+
+_SENTENCE_END = ".!?"
+# Closing quotes/brackets that still belong to the sentence they follow
+_TRAILING = "\"')]”’"
+_CLAUSE_END = ",;:"
+# Short tokens ending in a period that do not end a sentence
+_ABBREVIATIONS = frozenset(("mr.", "mrs.", "ms.", "dr.", "st.", "vs.", "etc.", "e.g.", "i.e.", "no."))
+
+
+class SentenceChunker:
+    """Incremental splitter of streamed text into speakable units."""
+
+    __slots__ = ("min_clause_chars", "max_chars", "_buf", "_scan")
+
+    def __init__(self, min_clause_chars: int, max_chars: int):
+        self.min_clause_chars = min_clause_chars
+        self.max_chars = max_chars
+        self._buf = ""
+        self._scan = 0
+
+    def feed(self, text: str) -> List[str]:
+        self._buf += text
+        units = []
+        buf = self._buf
+        start = 0
+        i = self._scan
+        n = len(buf)
+        while i < n:
+            ch = buf[i]
+            if ch == "\n":
+                cut = i
+            elif ch in _SENTENCE_END or ch in _CLAUSE_END:
+                j = i + 1
+                while j < n and buf[j] in _TRAILING:
+                    j += 1
+                if j == n:
+                    # Undecided until the next character arrives
+                    break
+                cut = j if buf[j].isspace() and self._is_boundary(buf, start, i) else -1
+                i = j - 1
+            elif i - start >= self.max_chars and ch.isspace():
+                # No punctuation for a long stretch: break at a word gap rather than stall speech
+                cut = i
+            else:
+                cut = -1
+            if cut != -1:
+                unit = buf[start:cut].strip()
+                if unit:
+                    units.append(unit)
+                start = cut
+            i += 1
+        self._buf = buf[start:]
+        self._scan = i - start
+        return units
+
+    def flush(self) -> List[str]:
+        unit, self._buf, self._scan = self._buf.strip(), "", 0
+        return [unit] if unit else []
+
+    def _is_boundary(self, buf: str, start: int, end: int) -> bool:
+        ch = buf[end]
+        if ch in _CLAUSE_END:
+            return end - start >= self.min_clause_chars
+        if ch == ".":
+            word_start = buf.rfind(" ", start, end) + 1
+            return buf[word_start:end + 1].lower() not in _ABBREVIATIONS
+        return True
+
+
+def _event(payload: Dict) -> str:
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+class SpeechStreamer:
+    """Re-frames an upstream LLM SSE stream as numbered speakable units."""
+
+    def __init__(self, min_clause_chars: int, max_chars: int):
+        self.min_clause_chars = min_clause_chars
+        self.max_chars = max_chars
+        self.streams = 0
+        self.units = 0
+        self.first_speech_ms_total = 0.0
+        self.full_reply_ms_total = 0.0
+        self.timed_streams = 0
+
+    async def stream(self, upstream: AsyncIterator) -> AsyncGenerator[str, None]:
+        started = time.perf_counter()
+        parser = SSEDeltaParser()
+        chunker = SentenceChunker(self.min_clause_chars, self.max_chars)
+        seq = 0
+        first_speech_ms: Optional[float] = None
+        self.streams += 1
+
+        async with aclosing(upstream):
+            async for chunk in upstream:
+                if not isinstance(chunk, bytes):
+                    # Error events are produced as str by the LLM service
+                    yield chunk
+                    continue
+                units = []
+                for delta in parser.feed(chunk):
+                    units.extend(chunker.feed(delta))
+                for unit in units:
+                    if first_speech_ms is None:
+                        first_speech_ms = (time.perf_counter() - started) * 1000
+                    yield _event({"seq": seq, "text": unit})
+                    seq += 1
+
+        units = []
+        for delta in parser.flush():
+            units.extend(chunker.feed(delta))
+        units.extend(chunker.flush())
+        for unit in units:
+            if first_speech_ms is None:
+                first_speech_ms = (time.perf_counter() - started) * 1000
+            yield _event({"seq": seq, "text": unit})
+            seq += 1
+
+        full_reply_ms = (time.perf_counter() - started) * 1000
+        self.units += seq
+        if first_speech_ms is not None:
+            self.timed_streams += 1
+            self.first_speech_ms_total += first_speech_ms
+            self.full_reply_ms_total += full_reply_ms
+        yield _event({
+            "done": True,
+            "units": seq,
+            "first_speech_ms": round(first_speech_ms, 1) if first_speech_ms is not None else None,
+            "full_reply_ms": round(full_reply_ms, 1),
+        })
+        yield "data: [DONE]\n\n"
+
+    def snapshot(self) -> Dict:
+        timed = self.timed_streams
+        return {
+            "streams": self.streams,
+            "units": self.units,
+            "avg_first_speech_ms": round(self.first_speech_ms_total / timed, 1) if timed else None,
+            "avg_full_reply_ms": round(self.full_reply_ms_total / timed, 1) if timed else None,
+        }
+
+
+speech_streamer = SpeechStreamer(settings.SPEECH_MIN_CLAUSE_CHARS, settings.SPEECH_MAX_CHARS)
@@ -0,0 +1,73 @@
+import json
+from typing import List, Optional
+
+
+class SSEDeltaParser:
+    """Incremental parser for OpenAI chat-completion SSE streams."""
+
+    __slots__ = ("_tail", "done")
+
+    def __init__(self):
+        self._tail = b""
+        self.done = False
+
+    def feed(self, chunk: bytes) -> List[str]:
+        data = self._tail + chunk if self._tail else chunk
+        end = data.rfind(b"\n")
+        if end == -1:
+            self._tail = data
+            return []
+        self._tail = data[end + 1:]
+
+        deltas = []
+        for line in data[:end].split(b"\n"):
+            content = self._parse_line(line)
+            if content:
+                deltas.append(content)
+        return deltas
+
+    def flush(self) -> List[str]:
+        # Upstream closed without a trailing newline
+        tail, self._tail = self._tail, b""
+        content = self._parse_line(tail) if tail else None
+        return [content] if content else []
+
+    def _parse_line(self, line: bytes) -> Optional[str]:
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            return None
+        payload = line[5:].strip()
+        if payload == b"[DONE]":
+            self.done = True
+            return None
+        try:
+            event = json.loads(payload)
+            choices = event.get("choices") or [{}]
+            return (choices[0].get("delta") or {}).get("content") or None
+        except (ValueError, AttributeError, IndexError):
+            return None
+
+
+class TranscriptTap:
+    """Opt-in, bounded capture of a passthrough stream."""
+
+    __slots__ = ("_chunks", "_size", "_max_bytes", "truncated")
+
+    def __init__(self, max_bytes: int):
+        self._chunks: List[bytes] = []
+        self._size = 0
+        self._max_bytes = max_bytes
+        self.truncated = False
+
+    def append(self, chunk: bytes):
+        if self._size >= self._max_bytes:
+            self.truncated = True
+            return
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+
+    def text(self) -> str:
+        parser = SSEDeltaParser()
+        deltas = parser.feed(b"".join(self._chunks))
+        deltas.extend(parser.flush())
+        return "".join(deltas)
@@ -0,0 +1,47 @@
+import asyncio
+from typing import Dict
+
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
+from starlette.types import Receive, Scope, Send
+
+
+class DisconnectStats:
+    def __init__(self):
+        self.completed = 0
+        self.disconnected = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"completed": self.completed, "disconnected": self.disconnected}
+
+
+disconnects = DisconnectStats()
+
+class CancellableStreamingResponse(StreamingResponse):
+    """StreamingResponse that stops its body iterator as soon as the client goes away."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        stream = asyncio.ensure_future(self.stream_response(send))
+        listener = asyncio.ensure_future(self.listen_for_disconnect(receive))
+        try:
+            await asyncio.wait((stream, listener), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (stream, listener):
+                task.cancel()
+            await asyncio.gather(stream, listener, return_exceptions=True)
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+        if stream.cancelled():
+            disconnects.disconnected += 1
+            return
+        error = stream.exception()
+        if isinstance(error, OSError):
+            disconnects.disconnected += 1
+            raise ClientDisconnect()
+        if error is not None:
+            raise error
+        disconnects.completed += 1
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,187 @@
+import bisect
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Sequence, Tuple
+
+# Seconds; covers fast proxy calls up to long LLM streams
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Prometheus histogram. Buckets are counted per slot; cumulative sums are built only when scraped."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_duration = registry.histogram(
+    "edura_http_request_duration_seconds", "Time from request start until the last response byte.",
+    ("method", "route", "status"))
+http_disconnects = registry.counter(
+    "edura_http_client_disconnects_total", "Responses abandoned by the client before they finished.", ("route",))
+llm_headers = registry.histogram(
+    "edura_llm_upstream_headers_seconds", "Time until the LLM upstream returned response headers.", ("provider",))
+llm_ttft = registry.histogram(
+    "edura_llm_time_to_first_token_seconds", "Time until the first streamed chunk from the LLM upstream.", ("provider",))
+llm_duration = registry.histogram(
+    "edura_llm_stream_duration_seconds", "Total duration of an upstream LLM stream.", ("provider", "outcome"))
+llm_rate = registry.histogram(
+    "edura_llm_tokens_per_second", "Streamed SSE events (about one token each) per second after the first token.",
+    ("provider",), RATE_BUCKETS)
+llm_errors = registry.counter(
+    "edura_llm_upstream_errors_total", "Failed LLM upstream requests by provider and status code.", ("provider", "code"))
+llm_cancelled = registry.counter(
+    "edura_llm_cancelled_streams_total", "Upstream LLM streams cancelled because no client was listening.", ("provider",))
+llm_tokens_saved = registry.counter(
+    "edura_llm_tokens_saved_total", "Estimated tokens not generated thanks to cancelled streams.", ("provider",))
+llm_seconds_saved = registry.counter(
+    "edura_llm_upstream_seconds_saved_total", "Estimated upstream stream time saved by cancelled streams.", ("provider",))
+upstream_duration = registry.histogram(
+    "edura_upstream_request_duration_seconds", "HeyGen and HW-server proxy calls, per attempt.", ("upstream", "status"))
+loop_lag = registry.histogram(
+    "edura_event_loop_lag_seconds", "How late the event loop ran a timer it was asked to run (LOOP_MONITOR_ENABLED).")
+loop_blocked = registry.counter(
+    "edura_event_loop_blocked_total", "Times the event loop was blocked for longer than LOOP_BLOCK_THRESHOLD.", ("route",))
+
+# ASGI scope of the request being handled; tasks spawned for it (streaming bodies) inherit it
+request_scope: ContextVar = ContextVar("request_scope", default=None)
+
+
+def route_label(scope) -> str:
+    # Route templates (not raw paths) keep label cardinality bounded: /api/hw/chat/{session_id}
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        # Did not match a route
+        return scope.get("root_path") or "unmatched"
+    # Included routers may hand over their own route, whose template lacks the include prefix (/api):
+    # the prefix is the part of the path before the segment where the template starts matching
+    regex = getattr(route, "path_regex", None)
+    if regex is not None:
+        path = scope["path"]
+        start = 0
+        while start != -1:
+            if regex.match(path[start:]):
+                return path[:start] + template
+            start = path.find("/", start + 1)
+    return template
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request until its last body byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        request_scope.set(scope)
+        state = {"status": 500, "finished": False, "disconnected": False}
+
+        async def tracked_receive():
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                state["disconnected"] = True
+            return message
+
+        async def tracked_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            try:
+                await send(message)
+            except OSError:
+                # Newer servers report a gone client on send instead of via http.disconnect
+                state["disconnected"] = True
+                raise
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                state["finished"] = True
+
+        try:
+            await self.app(scope, tracked_receive, tracked_send)
+        finally:
+            route = route_label(scope)
+            http_duration.observe(time.perf_counter() - started, scope["method"], route, str(state["status"]))
+            if not state["finished"] and state["disconnected"]:
+                http_disconnects.inc(route)
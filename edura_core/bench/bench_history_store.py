@@ -0,0 +1,133 @@
+"""Benchmark: history write and lookup cost at scale.
+
+Seeds each backend with N records (default 1,000,000) spread over many
+sessionIds, then times single appends and per-session lookups on top of it.
+The legacy history.json read-modify-write is O(N) per write, so it is measured
+at a smaller size and the per-record cost is extrapolated to N.
+
+Run from edura_core/:
+    python -m bench.bench_history_store [--records 1000000] [--sessions 5000]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import uuid
+
+from app.services.history_store import JSONLHistoryStore, SQLiteHistoryStore
+
+
+def make_record(i, sessions):
+    return {
+        "id": str(uuid.UUID(int=i)),
+        "sessionId": f"session_{i % sessions}",
+        "completedParts": i % 7,
+        "postedHomework": i % 3 == 0,
+        "createdAt": f"2026-01-{1 + i % 28:02d}T10:00:00Z",
+    }
+
+
+def legacy_write(path, record):
+    data = []
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            content = f.read()
+            if content:
+                data = json.loads(content)
+    data.append(record)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def legacy_lookup(path, session_id):
+    with open(path, "r") as f:
+        data = json.load(f)
+    return [h for h in data if h["sessionId"] == session_id]
+
+
+def bench_legacy(workdir, records, sessions, extrapolate_to):
+    path = os.path.join(workdir, "history.json")
+    with open(path, "w") as f:
+        json.dump([make_record(i, sessions) for i in range(records)], f, indent=2)
+    writes = 20
+    start = time.perf_counter()
+    for i in range(writes):
+        legacy_write(path, make_record(records + i, sessions))
+    write_s = (time.perf_counter() - start) / writes
+    start = time.perf_counter()
+    legacy_lookup(path, "session_1")
+    lookup_s = time.perf_counter() - start
+    scale = extrapolate_to / records
+    print(f"{'legacy json (measured @' + str(records) + ')':34s} write {write_s * 1000:9.3f} ms   lookup {lookup_s * 1000:9.3f} ms")
+    print(f"{'legacy json (extrapolated @N)':34s} write {write_s * scale * 1000:9.1f} ms   lookup {lookup_s * scale * 1000:9.1f} ms")
+
+
+def bench_store(name, store, records, sessions, writes, lookups):
+    start = time.perf_counter()
+    batch = []
+    for i in range(records):
+        batch.append(make_record(i, sessions))
+        if len(batch) == 50000:
+            store.append_many(batch)
+            batch = []
+    if batch:
+        store.append_many(batch)
+    seed_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(writes):
+        store.append(make_record(records + i, sessions))
+    write_s = (time.perf_counter() - start) / writes
+
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for _ in range(lookups):
+        list(store.iter_records(session_id=f"session_{rng.randrange(sessions)}"))
+    lookup_s = (time.perf_counter() - start) / lookups
+
+    start = time.perf_counter()
+    cursor, pages = None, 0
+    for _ in range(100):
+        _, cursor = store.page(cursor, 100)
+        pages += 1
+    page_s = (time.perf_counter() - start) / pages
+
+    print(f"{name:34s} write {write_s * 1000:9.3f} ms   lookup {lookup_s * 1000:9.3f} ms   "
+          f"page(100) {page_s * 1000:7.3f} ms   seed {seed_s:6.1f} s   count={store.count()}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--legacy-records", type=int, default=20000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="edura-history-bench-")
+    try:
+        print(f"N={args.records} records over {args.sessions} sessionIds")
+        bench_legacy(workdir, args.legacy_records, args.sessions, args.records)
+
+        store = SQLiteHistoryStore(os.path.join(workdir, "history.db"))
+        bench_store("sqlite", store, args.records, args.sessions, args.writes, args.lookups)
+        store.close()
+
+        store = JSONLHistoryStore(os.path.join(workdir, "history.jsonl"))
+        bench_store("jsonl + sidecar index", store, args.records, args.sessions, args.writes, args.lookups)
+        store.close()
+
+        start = time.perf_counter()
+        store = JSONLHistoryStore(os.path.join(workdir, "history.jsonl"))
+        print(f"{'jsonl reopen (load sidecar)':34s} {time.perf_counter() - start:.2f} s")
+        store.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
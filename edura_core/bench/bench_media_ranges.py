@@ -0,0 +1,187 @@
+"""Benchmark: lesson video serving under many concurrent range requests.
+
+Writes a few synthetic lesson videos to a temp directory and serves them from
+one uvicorn process through both the plain StaticFiles mount (/static, what
+/api/media used for videos before) and MediaFiles (/media, now mounted at
+/api/media/Videos), one after the other. Each simulated student starts a video
+(first MB, as a player does), seeks to random positions, and revalidates with
+If-None-Match once. Every response body is checked against the file. Before
+timing, MediaFiles is checked for HEAD, suffix and open ranges, 416, If-Range,
+If-Modified-Since, If-Match, path traversal and 405.
+
+Reports requests/s, MB/s, latency percentiles and time to first byte of the
+playback-start request for each path.
+
+Run from edura_core/:
+    python -m bench.bench_media_ranges [--students 64] [--seeks 8] [--videos 4] [--size-mb 48]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import aiohttp
+
+from bench.server import run_app
+
+RANGE = 1024 * 1024
+
+
+def create_app():
+    # uvicorn --factory entry point; the directory comes from the benchmark process
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Mount, Route
+    from starlette.staticfiles import StaticFiles
+
+    from app.core.config import settings
+    from app.services.media import HotSegments, MediaFiles
+
+    directory = os.environ["MEDIA_BENCH_DIR"]
+    media = MediaFiles(directory, settings.MEDIA_CHUNK_SIZE, settings.MEDIA_STAT_INTERVAL, settings.MEDIA_MAX_AGE,
+                       HotSegments(settings.MEDIA_HOT_BYTES, settings.MEDIA_HOT_CACHE_BYTES, settings.MEDIA_HOT_AFTER))
+    return Starlette(routes=[
+        Route("/", lambda request: PlainTextResponse("ok")),
+        Mount("/static", StaticFiles(directory=directory)),
+        Mount("/media", media),
+    ])
+
+
+def pct(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def get(session, url, expected, headers, start=None, end=None):
+    started = time.perf_counter()
+    async with session.get(url, headers=headers) as response:
+        first = None
+        body = bytearray()
+        async for chunk in response.content.iter_any():
+            if first is None:
+                first = time.perf_counter() - started
+            body += chunk
+        elapsed = time.perf_counter() - started
+        if start is not None:
+            assert response.status == 206, response.status
+            assert bytes(body) == expected[start:end + 1], f"wrong bytes for {start}-{end}"
+        else:
+            assert response.status == 304, response.status
+        return elapsed, first, len(body), response.headers.get("ETag")
+
+
+async def check_protocol(base, name, data):
+    url = f"{base}/{name}"
+    size = len(data)
+    async with aiohttp.ClientSession() as session:
+        async with session.head(url) as r:
+            assert r.status == 200 and r.headers["Content-Length"] == str(size), r.headers
+            assert r.headers["Accept-Ranges"] == "bytes" and await r.read() == b""
+            etag, last_modified = r.headers["ETag"], r.headers["Last-Modified"]
+        async with session.get(url, headers={"Range": "bytes=-500"}) as r:
+            assert r.status == 206 and await r.read() == data[-500:]
+            assert r.headers["Content-Range"] == f"bytes {size - 500}-{size - 1}/{size}", r.headers
+        async with session.get(url, headers={"Range": f"bytes={size - 10}-"}) as r:
+            assert r.status == 206 and await r.read() == data[-10:]
+        async with session.get(url, headers={"Range": f"bytes={size}-"}) as r:
+            assert r.status == 416 and r.headers["Content-Range"] == f"bytes */{size}", r.headers
+        async with session.get(url, headers={"Range": "bytes=0-9", "If-Range": etag}) as r:
+            assert r.status == 206 and await r.read() == data[:10]
+        async with session.get(url, headers={"Range": "bytes=0-9", "If-Range": last_modified}) as r:
+            assert r.status == 206
+        async with session.get(url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'}) as r:
+            assert r.status == 200 and await r.read() == data
+        async with session.get(url, headers={"Range": "bytes=0-1,5-9"}) as r:
+            assert r.status == 200 and int(r.headers["Content-Length"]) == size
+        async with session.get(url, headers={"If-Modified-Since": last_modified}) as r:
+            assert r.status == 304 and r.headers["ETag"] == etag
+        async with session.get(url, headers={"If-Match": '"stale"'}) as r:
+            assert r.status == 412
+        async with session.get(f"{base}/../bench_media_ranges.py") as r:
+            assert r.status == 404
+        async with session.post(url) as r:
+            assert r.status == 405
+
+
+async def student(session, base, names, contents, seeks, rng, latencies, ttfb, sent):
+    name = rng.choice(names)
+    data = contents[name]
+    url = f"{base}/{name}"
+    elapsed, first, size, etag = await get(session, url, data, {"Range": f"bytes=0-{RANGE - 1}"}, 0, RANGE - 1)
+    latencies.append(elapsed)
+    ttfb.append(first)
+    sent.append(size)
+    for _ in range(seeks):
+        start = rng.randrange(0, len(data) - RANGE) // 65536 * 65536
+        end = start + RANGE - 1
+        elapsed, _, size, _ = await get(session, url, data, {"Range": f"bytes={start}-{end}"}, start, end)
+        latencies.append(elapsed)
+        sent.append(size)
+    elapsed, _, _, _ = await get(session, url, data, {"If-None-Match": etag})
+    latencies.append(elapsed)
+
+
+async def run_round(base, names, contents, args):
+    rng = random.Random(args.seed)
+    latencies, ttfb, sent = [], [], []
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            student(session, base, names, contents, args.seeks, random.Random(rng.random()), latencies, ttfb, sent)
+            for _ in range(args.students)
+        ))
+        wall = time.perf_counter() - started
+    latencies.sort()
+    ttfb.sort()
+    return {
+        "rps": len(latencies) / wall,
+        "mbps": sum(sent) / wall / 1e6,
+        "p50": pct(latencies, .5), "p95": pct(latencies, .95), "p99": pct(latencies, .99),
+        "start_p50": pct(ttfb, .5), "start_p95": pct(ttfb, .95),
+    }
+
+
+def report(name, r):
+    print(f"{name:12s} {r['rps']:8.0f} req/s {r['mbps']:8.0f} MB/s   latency p50={r['p50'] * 1000:6.1f}ms "
+          f"p95={r['p95'] * 1000:6.1f}ms p99={r['p99'] * 1000:6.1f}ms   "
+          f"start TTFB p50={r['start_p50'] * 1000:6.1f}ms p95={r['start_p95'] * 1000:6.1f}ms")
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory(prefix="edura-media-") as directory:
+        contents = {}
+        for i in range(args.videos):
+            name = f"lesson_{i}.mp4"
+            contents[name] = os.urandom(args.size_mb * 1024 * 1024)
+            with open(os.path.join(directory, name), "wb") as f:
+                f.write(contents[name])
+        names = sorted(contents)
+
+        async with run_app({"MEDIA_BENCH_DIR": directory}, app="bench.bench_media_ranges:create_app", factory=True) as (base_url, _):
+            await check_protocol(base_url + "/media", names[0], contents[names[0]])
+            # Warm both paths (page cache, hot segments) before measuring
+            for path in ("/static", "/media"):
+                await run_round(base_url + path, names, contents, argparse.Namespace(**{**vars(args), "students": 4, "seeks": 1}))
+            results = {}
+            for label, path in (("StaticFiles", "/static"), ("MediaFiles", "/media")):
+                results[label] = await run_round(base_url + path, names, contents, args)
+
+        print(f"{args.students} students x (start + {args.seeks} seeks + 1 revalidation), "
+              f"{args.videos} videos of {args.size_mb} MB, 1 MB ranges")
+        for label, result in results.items():
+            report(label, result)
+        old, new = results["StaticFiles"], results["MediaFiles"]
+        print(f"MediaFiles vs StaticFiles: {new['rps'] / old['rps']:.2f}x throughput, "
+              f"p95 latency {new['p95'] / old['p95']:.2f}x, start TTFB p95 {new['start_p95'] / old['start_p95']:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=64)
+    parser.add_argument("--seeks", type=int, default=8)
+    parser.add_argument("--videos", type=int, default=4)
+    parser.add_argument("--size-mb", type=int, default=48)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main(parser.parse_args()))
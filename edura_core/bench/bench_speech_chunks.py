@@ -0,0 +1,84 @@
+"""Benchmark: time-to-first-speech of ?mode=speech versus waiting for the full reply.
+
+Replays a paced OpenAI SSE stream (first token after --ttft, then one token
+every --token-delay seconds) through SpeechStreamer and reports when the
+first speakable unit was emitted, compared with when the whole reply was
+available (what the UI had to wait for before re-buffering). Also checks that
+SentenceChunker stays linear: CPU per character must not grow with the reply
+length.
+
+Run from edura_core/:
+    python -m bench.bench_speech_chunks [--tokens 120] [--ttft 0.3] [--token-delay 0.02]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.services.speech import SentenceChunker, SpeechStreamer
+
+TEXT = ("Good question! A noun is a word that names a person, place, thing or idea, for example Dr. Smith, "
+        "London or happiness. Verbs, on the other hand, describe actions; they tell us what the noun does. "
+        "Do you want me to continue the lesson? ")
+
+
+def tokens_of(count: int):
+    words = TEXT.split(" ")
+    return [words[i % len(words)] + " " for i in range(count)]
+
+
+async def paced_stream(tokens, ttft: float, token_delay: float):
+    await asyncio.sleep(ttft)
+    for token in tokens:
+        event = {"choices": [{"index": 0, "delta": {"content": token}}]}
+        yield b"data: " + json.dumps(event).encode() + b"\n\n"
+        await asyncio.sleep(token_delay)
+    yield b"data: [DONE]\n\n"
+
+
+async def run_speech(tokens, ttft: float, token_delay: float):
+    streamer = SpeechStreamer(min_clause_chars=40, max_chars=200)
+    started = time.perf_counter()
+    first = None
+    units = 0
+    async for event in streamer.stream(paced_stream(tokens, ttft, token_delay)):
+        if '"seq"' in event:
+            units += 1
+            if first is None:
+                first = time.perf_counter() - started
+    return first, time.perf_counter() - started, units
+
+
+def chunker_cost(chars: int, rounds: int = 5) -> float:
+    text = (TEXT * (chars // len(TEXT) + 1))[:chars]
+    deltas = [text[i:i + 4] for i in range(0, len(text), 4)]
+    best = float("inf")
+    for _ in range(rounds):
+        chunker = SentenceChunker(40, 200)
+        start = time.process_time()
+        for delta in deltas:
+            chunker.feed(delta)
+        chunker.flush()
+        best = min(best, time.process_time() - start)
+    return best / chars * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=120)
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    first, full, units = asyncio.run(run_speech(tokens_of(args.tokens), args.ttft, args.token_delay))
+    print(f"{args.tokens} tokens, {units} speakable units")
+    print(f"first speakable unit  {first * 1000:8.1f} ms")
+    print(f"full reply            {full * 1000:8.1f} ms  ({full / first:.1f}x later)")
+
+    print("chunker CPU per character (flat = linear):")
+    for chars in (1_000, 10_000, 100_000):
+        print(f"  {chars:7d} chars  {chunker_cost(chars):7.1f} ns/char")
+
+
+if __name__ == "__main__":
+    main()
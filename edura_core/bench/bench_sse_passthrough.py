@@ -0,0 +1,137 @@
+"""Micro-benchmark: CPU per token of the LLM SSE relay.
+
+Compares the old per-line relay (decode + strip + json.loads + string +=) with
+the byte passthrough in OpenAILLMService._stream_request, with and without the
+opt-in transcript tap. Upstream chunks are cut at random offsets so SSE events
+regularly straddle network reads.
+
+Run from edura_core/:
+    python -m bench.bench_sse_passthrough [--tokens 2000] [--rounds 20]
+"""
+import argparse
+import json
+import random
+import time
+
+from app.services.sse import SSEDeltaParser, TranscriptTap
+
+
+def build_stream(tokens: int) -> bytes:
+    words = "the quick brown fox jumps over the lazy dog while students ask good questions".split()
+    parts = []
+    for i in range(tokens):
+        event = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {"content": words[i % len(words)] + " "}, "finish_reason": None}],
+        }
+        parts.append(b"data: " + json.dumps(event).encode() + b"\n\n")
+    parts.append(b"data: [DONE]\n\n")
+    return b"".join(parts)
+
+
+def split_chunks(stream: bytes, seed: int = 7):
+    rng = random.Random(seed)
+    chunks, i = [], 0
+    while i < len(stream):
+        size = rng.randint(40, 1400)
+        chunks.append(stream[i:i + size])
+        i += size
+    return chunks
+
+
+def lines_of(chunks):
+    # What `async for line in response.content` handed the old code
+    tail = b""
+    for chunk in chunks:
+        data = tail + chunk
+        *complete, tail = data.split(b"\n")
+        for line in complete:
+            yield line + b"\n"
+    if tail:
+        yield tail
+
+
+def relay_legacy(chunks):
+    full_response_text = ""
+    out = 0
+    for line in lines_of(chunks):
+        if line:
+            decoded_line = line.decode('utf-8').strip()
+            if decoded_line.startswith("data: ") and decoded_line != "data: [DONE]":
+                try:
+                    data = json.loads(decoded_line[6:])
+                    content = data.get("choices", [{}])[0].get("delta", {}).get("content", "")
+                    if content:
+                        full_response_text += content
+                except:
+                    pass
+            out += len(line)
+    return full_response_text[:100], out
+
+
+def relay_passthrough(chunks):
+    out = 0
+    for chunk in chunks:
+        out += len(chunk)
+    return None, out
+
+
+def relay_passthrough_tap(chunks):
+    tap = TranscriptTap(1 << 20)
+    out = 0
+    for chunk in chunks:
+        tap.append(chunk)
+        out += len(chunk)
+    return tap.text()[:100], out
+
+
+def relay_incremental_parse(chunks):
+    parser = SSEDeltaParser()
+    parts = []
+    out = 0
+    for chunk in chunks:
+        parts.extend(parser.feed(chunk))
+        out += len(chunk)
+    return "".join(parts)[:100], out
+
+
+def measure(fn, chunks, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.process_time()
+        fn(chunks)
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    stream = build_stream(args.tokens)
+    chunks = split_chunks(stream)
+
+    # The parsers must agree on the transcript despite the random chunking
+    expected = relay_legacy(chunks)[0]
+    assert relay_passthrough_tap(chunks)[0] == expected
+    assert relay_incremental_parse(chunks)[0] == expected
+
+    print(f"{args.tokens} tokens, {len(stream)} bytes in {len(chunks)} upstream chunks")
+    baseline = None
+    for name, fn in (
+        ("legacy per-line relay", relay_legacy),
+        ("passthrough", relay_passthrough),
+        ("passthrough + transcript tap", relay_passthrough_tap),
+        ("passthrough + incremental parse", relay_incremental_parse),
+    ):
+        seconds = measure(fn, chunks, args.rounds)
+        per_token_us = seconds / args.tokens * 1e6
+        baseline = baseline or per_token_us
+        print(f"{name:34s} {per_token_us:8.3f} us/token  ({baseline / per_token_us if per_token_us else float('inf'):6.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Times /api/heygen/stop_all_sessions against a local fake HeyGen.
+
+Seeds the stub with N live sessions (plus optional sessions that vanish before
+they are stopped) and a per-call latency, then prints the bulk-stop report
+summary and wall time.
+
+Run from edura_core/:
+    python -m bench.bulk_stop [--sessions 50] [--delay 1.0] [--gone 5]
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from bench.server import run_app
+from bench.stubs import heygen_app, start_stub
+
+
+async def main(args):
+    heygen = heygen_app(delay=args.delay)
+    heygen["sessions"].update(f"session-{i}" for i in range(args.sessions))
+    runner, heygen_url = await start_stub(heygen)
+
+    # Sessions listed by HeyGen that disappear before the stop call lands
+    original_list = heygen["sessions"].copy()
+    gone = sorted(original_list)[:args.gone]
+
+    env = {"HEYGEN_API_KEY": "stub", "HEYGEN_API_URL": heygen_url}
+    try:
+        async with run_app(env) as (base_url, _):
+            async with aiohttp.ClientSession() as session:
+                async def drop_gone():
+                    await asyncio.sleep(args.delay / 2 + args.delay)
+                    heygen["sessions"].difference_update(gone)
+
+                dropper = asyncio.create_task(drop_gone())
+                started = time.perf_counter()
+                async with session.post(base_url + "/api/heygen/stop_all_sessions") as response:
+                    report = await response.json()
+                elapsed = time.perf_counter() - started
+                await dropper
+    finally:
+        await runner.cleanup()
+
+    print(f"{args.sessions} sessions, {args.delay}s per HeyGen call: {elapsed:.2f}s wall time")
+    print(f"  {report.get('data')}")
+    print(f"  stopped={len(report.get('stoppedSessions', []))} already_gone={len(report.get('alreadyGone', []))} "
+          f"failed={len(report.get('failed', []))}")
+    print(f"  sequential loop would need ~{args.delay * (args.sessions + 1):.0f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=1.0)
+    parser.add_argument("--gone", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
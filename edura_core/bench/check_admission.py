@@ -0,0 +1,126 @@
+"""Drives LLM admission control with the in-process fake upstream and checks its guarantees.
+
+Bursts of chat streams go through OpenAILLMService (LLM_PROVIDERS=fake, so no
+network) with small limits, and the script asserts that:
+  * no more than LLM_MAX_CONCURRENT_STREAMS upstream streams run at once,
+    and no user ever has more than LLM_MAX_STREAMS_PER_USER;
+  * queued homework streams start before queued English chat streams;
+  * a full queue rejects with a retry_after hint instead of waiting;
+  * a request whose estimated wait exceeds LLM_QUEUE_TIMEOUT is rejected up front.
+
+Run from edura_core/:
+    python -m bench.check_admission
+"""
+import asyncio
+import json
+import os
+
+os.environ.update({
+    "LLM_PROVIDERS": "fake",
+    "FAKE_LLM_TTFT": "0.05",
+    "FAKE_LLM_TOKEN_DELAY": "0.005",
+    "FAKE_LLM_TOKENS": "20",
+    "LLM_COALESCE_ENABLED": "false",
+    "LLM_MAX_CONCURRENT_STREAMS": "4",
+    "LLM_MAX_STREAMS_PER_USER": "2",
+    "LLM_QUEUE_SIZE": "8",
+    "LLM_QUEUE_TIMEOUT": "5",
+})
+
+from app.services.admission import admission, Caller, PRIORITY_HOMEWORK, PRIORITY_ENGLISH  # noqa: E402
+from app.services.llm import OpenAILLMService  # noqa: E402
+
+
+class Watch:
+    """Wraps the fake provider to record concurrency as the upstream sees it."""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.active = 0
+        self.peak = 0
+        self.per_user = {}
+        self.peak_per_user = 0
+        self.order = []
+        original = provider.stream
+
+        async def stream(messages):
+            user = messages[-1]["content"].split("|")[0]
+            self.order.append(messages[-1]["content"])
+            self.active += 1
+            self.per_user[user] = self.per_user.get(user, 0) + 1
+            self.peak = max(self.peak, self.active)
+            self.peak_per_user = max(self.peak_per_user, self.per_user[user])
+            try:
+                async for chunk in original(messages):
+                    yield chunk
+            finally:
+                self.active -= 1
+                self.per_user[user] -= 1
+
+        provider.stream = stream
+
+
+async def chat(service, user: str, priority: int, tag: str = ""):
+    caller = Caller(user, priority)
+    events = []
+    messages = [{"role": "user", "content": f"{user}|{tag}"}]
+    async for chunk in service.generate_conversational_response("system", messages, caller=caller):
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        events.append(text)
+    body = "".join(events)
+    if '"retry_after"' in body:
+        return json.loads(body[len("data: "):].strip())
+    return None
+
+
+async def main():
+    service = OpenAILLMService()
+    watch = Watch(service.router.providers[0])
+
+    # 1. Burst: 12 streams from 3 users against 4 global / 2 per-user slots
+    results = await asyncio.gather(*(chat(service, f"user{i % 3}", PRIORITY_ENGLISH, str(i)) for i in range(12)))
+    assert all(r is None for r in results), results
+    assert watch.peak <= 4, watch.peak
+    assert watch.peak_per_user <= 2, watch.peak_per_user
+    snapshot = admission.snapshot()
+    assert snapshot["queued"] > 0 and snapshot["active"] == 0, snapshot
+    print(f"burst: peak {watch.peak} upstream streams, {watch.peak_per_user} per user, "
+          f"{snapshot['queued']} queued, avg wait {snapshot['wait_avg_ms']} ms")
+
+    # 2. Priority: with every slot busy, homework queued after English chat still starts first
+    watch.order.clear()
+    busy = [asyncio.create_task(chat(service, f"busy{i}", PRIORITY_ENGLISH, "busy")) for i in range(4)]
+    await asyncio.sleep(0.01)
+    english = [asyncio.create_task(chat(service, f"eng{i}", PRIORITY_ENGLISH, "english")) for i in range(2)]
+    await asyncio.sleep(0.01)
+    homework = [asyncio.create_task(chat(service, f"hw{i}", PRIORITY_HOMEWORK, "homework")) for i in range(2)]
+    await asyncio.gather(*busy, *english, *homework)
+    started = [tag.split("|")[1] for tag in watch.order if not tag.endswith("busy")]
+    assert started[:2] == ["homework", "homework"], started
+    print(f"priority: queued streams started in order {started}")
+
+    # 3. Queue full: 4 running + 8 queued, the 13th English request is rejected with a retry hint
+    tasks = [asyncio.create_task(chat(service, f"full{i}", PRIORITY_ENGLISH, str(i))) for i in range(12)]
+    await asyncio.sleep(0.01)
+    rejected = await chat(service, "late", PRIORITY_ENGLISH, "late")
+    assert rejected is not None and rejected["retry_after"] >= 1, rejected
+    # ...but a homework arrival displaces the newest English waiter instead
+    homework = asyncio.create_task(chat(service, "hw-late", PRIORITY_HOMEWORK, "late"))
+    outcomes = await asyncio.gather(*tasks, homework)
+    assert outcomes[-1] is None and sum(o is not None for o in outcomes[:-1]) == 1, outcomes
+    print(f"queue full: rejected with {rejected['error']!r}; homework displaced one English waiter")
+
+    # 4. Deadline-aware: a long hold time makes the estimated wait exceed the queue timeout
+    admission.max_wait = 0.05
+    tasks = [asyncio.create_task(chat(service, f"slow{i}", PRIORITY_ENGLISH, str(i))) for i in range(8)]
+    await asyncio.sleep(0.01)
+    outcome = await chat(service, "deadline", PRIORITY_ENGLISH, "deadline")
+    await asyncio.gather(*tasks)
+    assert outcome is not None, outcome
+    print(f"deadline: rejected up front with {outcome['error']!r}")
+
+    print("admission:", json.dumps(admission.snapshot()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
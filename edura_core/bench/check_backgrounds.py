@@ -0,0 +1,144 @@
+"""Checks the background upload pipeline end to end against a running API.
+
+Uploads a generated multi-megapixel JPEG and asserts that:
+  * the response URL is a resized WebP variant (not the original) and is much smaller;
+  * media responses carry immutable Cache-Control and answer If-None-Match with 304;
+  * GET /api/config/background returns the same background, ?width= picks a smaller variant,
+    and If-None-Match gets a 304 without a body;
+  * a new upload replaces the old files; a re-upload of the same bytes keeps the same URL;
+  * oversized bodies get 413 and undecodable "images" get 400, leaving the current background alone;
+  * none of this blocks the event loop for more than 50 ms (loop monitor);
+  * the pointer file lives outside the immutably cached directory, which holds only content-addressed images;
+  * after a restart the same background is served from the pointer, and from a legacy
+    current.json inside the directory if that is all there is.
+
+Needs Pillow (also to generate the test images). Run from edura_core/:
+    python -m bench.check_backgrounds
+"""
+import asyncio
+import io
+import os
+import random
+import tempfile
+
+import aiohttp
+from PIL import Image
+
+from bench.server import metrics_snapshot, run_app
+
+MAX_BYTES = 8 * 1024 * 1024
+
+
+def photo(width: int, height: int, seed: int) -> bytes:
+    # Noise compresses badly, like a real photo, so the original is several MB
+    rng = random.Random(seed)
+    image = Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=92)
+    return out.getvalue()
+
+
+async def upload(client, base_url, data: bytes, filename: str, content_type: str):
+    form = aiohttp.FormData()
+    form.add_field("file", data, filename=filename, content_type=content_type)
+    async with client.post(base_url + "/api/config/upload_background", data=form) as r:
+        return r.status, await r.json()
+
+
+async def fetch(client, url, **headers):
+    async with client.get(url, headers=headers) as r:
+        return r.status, r.headers, await r.read()
+
+
+async def main():
+    with tempfile.TemporaryDirectory(prefix="edura-bg-") as root:
+        directory = os.path.join(root, "backgrounds")
+        pointer = os.path.join(root, "background.json")
+        env = {
+            "BACKGROUND_DIR": directory,
+            "BACKGROUND_POINTER_FILE": pointer,
+            "BACKGROUND_MAX_BYTES": str(MAX_BYTES),
+            "LOOP_MONITOR_ENABLED": "true",
+            "LOOP_BLOCK_THRESHOLD": "0.05",
+            "AVATAR_REAPER_ENABLED": "false",
+        }
+        first = photo(3000, 2000, 1)
+        second = photo(2400, 1600, 2)
+        async with run_app(env) as (base_url, _):
+            async with aiohttp.ClientSession() as client:
+                status, body = await upload(client, base_url, first, "class.jpg", "image/jpeg")
+                assert status == 200, body
+                assert body["url"].endswith("-1280.webp"), body
+                assert set(body["variants"]) == {"640", "1280", "1920"}, body
+
+                status, headers, variant = await fetch(client, base_url + body["url"])
+                assert status == 200 and headers["Content-Type"] == "image/webp", headers
+                assert "immutable" in headers["Cache-Control"], headers
+                assert Image.open(io.BytesIO(variant)).size == (1280, 853)
+                status, headers, _ = await fetch(client, base_url + body["url"], **{"If-None-Match": headers["ETag"]})
+                assert status == 304 and "immutable" in headers["Cache-Control"], (status, headers)
+                _, headers, original = await fetch(client, base_url + body["original"])
+                assert original == first and "immutable" in headers["Cache-Control"]
+                print(f"upload: original {len(first) / 1e6:.1f} MB, display variant {len(variant) / 1e3:.0f} kB "
+                      f"({len(first) / len(variant):.0f}x smaller)")
+
+                async with client.get(base_url + "/api/config/background") as r:
+                    assert await r.json() == body
+                    etag = r.headers["ETag"]
+                async with client.get(base_url + "/api/config/background", headers={"If-None-Match": etag}) as r:
+                    assert r.status == 304 and await r.read() == b"", r.status
+                async with client.get(base_url + "/api/config/background?width=500") as r:
+                    assert (await r.json())["url"].endswith("-640.webp")
+                    assert r.headers["ETag"] != etag
+                print("lookup: ETag revalidation answers 304, ?width=500 resolves to the 640 px variant")
+
+                status, replaced = await upload(client, base_url, second, "class2.jpg", "image/jpeg")
+                assert status == 200 and replaced["original"] != body["original"], replaced
+                async with client.get(base_url + "/api/config/background", headers={"If-None-Match": etag}) as r:
+                    assert r.status == 200 and await r.json() == replaced
+                files = os.listdir(directory)
+                stem = replaced["original"].rsplit("/", 1)[1][:32]
+                assert len(files) == 4 and all(name.startswith(stem) for name in files), files
+                assert os.path.exists(pointer)
+                status, _, _ = await fetch(client, base_url + body["url"])
+                assert status == 404
+                status, again = await upload(client, base_url, second, "renamed.jpg", "image/jpeg")
+                assert again == replaced, again
+                print(f"replace: old files removed, same bytes keep the same URLs ({len(files)} files on disk)")
+
+                status, body = await upload(client, base_url, os.urandom(MAX_BYTES + 1024 * 1024), "huge.png", "image/png")
+                assert status == 413, (status, body)
+                status, body = await upload(client, base_url, b"not an image" * 100, "fake.png", "image/png")
+                assert status == 400, (status, body)
+                status, body = await upload(client, base_url, b"plain text", "notes.txt", "text/plain")
+                assert status == 400, (status, body)
+                assert sorted(os.listdir(directory)) == sorted(files), os.listdir(directory)
+                async with client.get(base_url + "/api/config/background") as r:
+                    assert await r.json() == replaced
+                print("rejects: 413 for oversized, 400 for undecodable and non-image uploads; current background kept")
+
+                snapshot = await metrics_snapshot(client, base_url)
+                loop, stats = snapshot["loop"], snapshot["backgrounds"]
+                assert loop["blocked"] == 0, loop["recent_blocks"]
+                print(f"event loop: max lag {loop['lag_max_ms']} ms, nothing blocked > 50 ms; store: {stats}")
+
+        async with run_app(env) as (base_url, _):
+            async with aiohttp.ClientSession() as client:
+                async with client.get(base_url + "/api/config/background") as r:
+                    assert await r.json() == replaced
+        print("restart: the pointer file brings back the same background")
+
+        # A pointer written inside the directory by an older version is still honoured, then cleaned up
+        os.replace(pointer, os.path.join(directory, "current.json"))
+        async with run_app(env) as (base_url, _):
+            async with aiohttp.ClientSession() as client:
+                async with client.get(base_url + "/api/config/background") as r:
+                    assert await r.json() == replaced
+                status, again = await upload(client, base_url, first, "class.jpg", "image/jpeg")
+                assert status == 200 and "current.json" not in os.listdir(directory), os.listdir(directory)
+                assert os.path.exists(pointer)
+        print("legacy: current.json inside the served directory is read, and removed by the next upload")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""Checks that a client disconnect closes the upstream LLM stream promptly.
+
+Starts a slow local OpenAI stub and the API, then for /api/chat,
+/api/hw/chat/{id} and /api/english/chat opens a stream, drops the client
+connection (once mid-stream, once while still waiting for the first token) and
+asserts the stub sees its upstream socket close within --bound seconds,
+instead of after the full generation. Prints the router's saved-token counters.
+
+Run from edura_core/:
+    python -m bench.check_disconnect [--bound 1.0]
+"""
+import argparse
+import asyncio
+import time
+import warnings
+
+import aiohttp
+
+from bench.server import metrics_snapshot, run_app
+from bench.stubs import openai_app, start_stub
+
+
+async def open_stream(base_url: str, path: str, body: dict, wait_first_chunk: bool):
+    # A dedicated session per stream: closing it drops the TCP connection, like a closed tab
+    session = aiohttp.ClientSession()
+    response = await session.post(base_url + path, json=body)
+    if wait_first_chunk:
+        await response.content.readany()
+    return session, response
+
+
+async def drop_and_measure(stub, session, response, bound: float) -> float:
+    aborted_before = len(stub["aborted_at"])
+    response.close()
+    await session.close()
+    closed_at = asyncio.get_running_loop().time()
+    deadline = closed_at + bound
+    while len(stub["aborted_at"]) == aborted_before:
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError(f"upstream still open {bound}s after the client disconnected")
+        await asyncio.sleep(0.01)
+    return stub["aborted_at"][-1] - closed_at
+
+
+async def main(args):
+    # 200 tokens at 50 ms each: a full generation would take about 10 s
+    stub = openai_app(ttft=0.05, token_delay=0.05, tokens=200)
+    runner, openai_url = await start_stub(stub)
+    env = {
+        "LLM_PROVIDERS": "openai",
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_API_URL": openai_url + "/v1/chat/completions",
+        "LLM_CACHE_ENABLED": "false",
+        "LLM_COALESCE_ENABLED": "false",
+    }
+    try:
+        async with run_app(env) as (base_url, _):
+            async with aiohttp.ClientSession() as client:
+                async with client.post(base_url + "/api/hw/session/start", json={"student_data": {"name": "Ada"}}) as r:
+                    hw_session = (await r.json())["session_id"]
+                # One complete stream, so the router has a baseline for the saved-token estimate
+                stub["tokens"] = 40
+                async with client.post(base_url + "/api/english/chat", json={"message": "warm up"}) as r:
+                    await r.read()
+                stub["tokens"] = 200
+
+            endpoints = [
+                ("/api/chat", {"messages": [{"role": "user", "content": "What is a noun?"}]}),
+                (f"/api/hw/chat/{hw_session}", {"message": "How did I do?"}),
+                ("/api/english/chat", {"message": "Explain verbs."}),
+            ]
+            for path, body in endpoints:
+                session, response = await open_stream(base_url, path, body, wait_first_chunk=True)
+                mid_stream = await drop_and_measure(stub, session, response, args.bound)
+
+                stub["ttft"] = 5.0
+                session, response = await open_stream(base_url, path, body, wait_first_chunk=False)
+                await asyncio.sleep(0.2)
+                before_first_token = await drop_and_measure(stub, session, response, args.bound)
+                stub["ttft"] = 0.05
+
+                print(f"{path:28s} upstream closed {mid_stream * 1000:6.1f} ms after disconnect mid-stream, "
+                      f"{before_first_token * 1000:6.1f} ms while waiting for the first token")
+
+            await asyncio.sleep(0.2)
+            assert stub["open_streams"] == 0, stub["open_streams"]
+            async with aiohttp.ClientSession() as client:
+                llm = (await metrics_snapshot(client, base_url))["llm"]
+            print(f"cancelled {llm['cancelled']} upstream streams, saved ~{llm['tokens_saved_est']} tokens "
+                  f"and ~{llm['upstream_seconds_saved_est']} s of upstream time; responses: {llm['responses']}")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    # The stub's timings are changed between runs, as the other benchmarks do
+    warnings.filterwarnings("ignore", "Changing state", DeprecationWarning)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bound", type=float, default=1.0)
+    started = time.perf_counter()
+    asyncio.run(main(parser.parse_args()))
+    print(f"done in {time.perf_counter() - started:.1f}s")
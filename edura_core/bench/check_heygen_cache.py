@@ -0,0 +1,122 @@
+"""Checks the HeyGen avatar list / credits cache against a slow local HeyGen stub.
+
+Asserts that:
+  * requests arriving while the startup warm-up fetch runs share it (one upstream call);
+  * fresh hits never reach HeyGen, carry X-Cache/Age/ETag, and answer If-None-Match with 304;
+  * past the TTL the cached value is served at once while exactly one background refresh runs;
+  * while HeyGen is down the last good value is served with "stale": true, and a recovery clears it;
+  * a new streaming token makes the next credits read revalidate;
+  * with nothing cached and HeyGen down the endpoint still fails with 500.
+
+Run from edura_core/:
+    python -m bench.check_heygen_cache
+"""
+import asyncio
+import time
+
+import aiohttp
+
+from bench.server import metrics_snapshot, run_app
+from bench.stubs import heygen_app, start_stub
+
+DELAY = 0.3
+TTL = 1.0
+
+
+async def fetch(client, url, **headers):
+    started = time.perf_counter()
+    async with client.get(url, headers=headers) as r:
+        body = await r.json() if r.status != 304 else None
+        return r.status, r.headers, body, time.perf_counter() - started
+
+
+async def settle(heygen, name, calls):
+    # Waits for the background refresh to reach (and leave) the stub
+    for _ in range(100):
+        if heygen["calls"].get(name, 0) >= calls:
+            break
+        await asyncio.sleep(0.02)
+    await asyncio.sleep(DELAY + 0.1)
+
+
+async def main():
+    heygen = heygen_app(delay=DELAY)
+    runner, heygen_url = await start_stub(heygen)
+    env = {
+        "HEYGEN_API_KEY": "stub",
+        "HEYGEN_API_URL": heygen_url,
+        "HEYGEN_AVATAR_LIST_TTL": str(TTL),
+        "HEYGEN_CREDITS_TTL": "60",
+        "UPSTREAM_RETRIES": "0",
+        "AVATAR_REAPER_ENABLED": "false",
+    }
+    try:
+        async with run_app(env) as (base_url, _):
+            avatars = base_url + "/api/heygen/avatar_list"
+            credits = base_url + "/api/heygen/available_credits"
+            async with aiohttp.ClientSession() as client:
+                results = await asyncio.gather(*(fetch(client, avatars) for _ in range(50)))
+                assert all(status == 200 and body["data"][0]["avatar_id"] == "stub_avatar"
+                           for status, _, body, _ in results), results[0]
+                assert heygen["calls"]["avatar_list"] == 1, heygen["calls"]
+                print(f"cold start: 50 concurrent requests, {heygen['calls']['avatar_list']} HeyGen call "
+                      f"({sorted({r[1]['X-Cache'] for r in results})})")
+
+                status, headers, body, elapsed = await fetch(client, avatars)
+                assert status == 200 and headers["X-Cache"] == "HIT" and "stale" not in body, headers
+                assert heygen["calls"]["avatar_list"] == 1
+                status, headers, _, _ = await fetch(client, avatars, **{"If-None-Match": headers["ETag"]})
+                assert status == 304 and headers["X-Cache"] == "HIT", (status, headers)
+                _, _, _, uncached = await fetch(client, base_url + "/api/heygen/active_sessions")
+                print(f"hit: {elapsed * 1000:.1f} ms (uncached HeyGen proxy call: {uncached * 1000:.0f} ms), "
+                      f"If-None-Match answers 304")
+
+                await asyncio.sleep(TTL + 0.1)
+                results = await asyncio.gather(*(fetch(client, avatars) for _ in range(20)))
+                assert all(r[1]["X-Cache"] == "REVALIDATING" and r[3] < DELAY for r in results), \
+                    [(r[1]["X-Cache"], r[3]) for r in results]
+                await settle(heygen, "avatar_list", 2)
+                assert heygen["calls"]["avatar_list"] == 2, heygen["calls"]
+                status, headers, _, _ = await fetch(client, avatars)
+                assert headers["X-Cache"] == "HIT" and int(headers["Age"]) == 0, headers
+                slowest = max(r[3] for r in results)
+                print(f"expired: 20 requests served from memory (slowest {slowest * 1000:.1f} ms) "
+                      f"while one background refresh ran")
+
+                heygen["down"] = True
+                await asyncio.sleep(TTL + 0.1)
+                status, headers, body, _ = await fetch(client, avatars)
+                assert status == 200 and headers["X-Cache"] == "REVALIDATING", headers
+                await settle(heygen, "avatar_list", 3)
+                status, headers, body, _ = await fetch(client, avatars)
+                assert status == 200 and headers["X-Cache"] == "STALE" and body["stale"] is True, (headers, body)
+                assert body["data"][0]["avatar_id"] == "stub_avatar"
+                heygen["down"] = False
+                await settle(heygen, "avatar_list", 4)
+                status, headers, body, _ = await fetch(client, avatars)
+                assert headers["X-Cache"] == "HIT" and "stale" not in body, (headers, body)
+                print("outage: last good avatar list served with \"stale\": true, cleared after recovery")
+
+                _, headers, _, _ = await fetch(client, credits)
+                assert headers["X-Cache"] == "HIT", headers
+                async with client.post(base_url + "/api/heygen/token") as r:
+                    assert r.status == 200
+                _, headers, body, _ = await fetch(client, credits)
+                assert headers["X-Cache"] == "REVALIDATING" and body["data"]["remaining_quota"] == 3600, headers
+                print("credits: a new streaming token makes the next read revalidate")
+
+                stats = (await metrics_snapshot(client, base_url))["heygen_cache"]
+                print(f"avatar_list cache: {stats['avatar_list']}")
+
+        heygen["down"] = True
+        async with run_app(env) as (base_url, _):
+            async with aiohttp.ClientSession() as client:
+                async with client.get(base_url + "/api/heygen/avatar_list") as r:
+                    assert r.status == 500, r.status
+        print("cold cache with HeyGen down: 500, as before")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
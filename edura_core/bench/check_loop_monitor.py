@@ -0,0 +1,117 @@
+"""Checks that the loop monitor reports blocking calls with their route and stack.
+
+Runs a small FastAPI app behind MetricsMiddleware in-process with the monitor
+started, and drives it over ASGI directly:
+  * a handler that calls time.sleep() inside `async def` must be reported with
+    its route template and a stack ending in the sleep;
+  * a streaming body that blocks (a task spawned for the response) must still be
+    attributed to its route;
+  * a handler that awaits asyncio.sleep() for as long must not be reported.
+
+Run from edura_core/:
+    python -m bench.check_loop_monitor
+"""
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI
+
+from app.services.loop_monitor import LoopMonitor
+from app.services.streaming import CancellableStreamingResponse
+from app.services.telemetry import MetricsMiddleware
+
+BLOCK = 0.25
+
+app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+
+def read_report_from_disk():
+    # Stands in for requests.get / open().read() / shutil.copyfileobj in a handler
+    time.sleep(BLOCK)
+
+
+@app.get("/lessons/{lesson_id}/report")
+async def blocking_handler(lesson_id: str):
+    read_report_from_disk()
+    return {"lesson": lesson_id}
+
+
+@app.post("/chat")
+async def blocking_stream():
+    async def body():
+        yield b"data: first\n\n"
+        read_report_from_disk()
+        yield b"data: [DONE]\n\n"
+    return CancellableStreamingResponse(body(), media_type="text/event-stream")
+
+
+@app.get("/waits")
+async def awaiting_handler():
+    await asyncio.sleep(BLOCK)
+    return {"ok": True}
+
+
+async def call(method: str, path: str):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [], "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000),
+    }
+    sent = []
+    request_sent = False
+    never = asyncio.get_running_loop().create_future()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # The client stays connected until the response is complete
+        return await never
+
+    async def send(message):
+        sent.append(message)
+
+    # Its own task, like a server connection: the request context stays out of this coroutine's
+    await asyncio.create_task(app(scope, receive, send))
+    return sent[0]["status"]
+
+
+async def main():
+    monitor = LoopMonitor(interval=0.02, threshold=0.1)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.1)
+
+        assert await call("GET", "/waits") == 200
+        await asyncio.sleep(0.1)
+        assert monitor.blocked == 0, monitor.snapshot()
+        print(f"awaiting handler: not reported (lag max {monitor.snapshot()['lag_max_ms']} ms)")
+
+        assert await call("GET", "/lessons/42/report") == 200
+        await asyncio.sleep(0.1)
+        assert monitor.blocked == 1, monitor.snapshot()
+        block = monitor.recent[-1]
+        assert block["route"] == "GET /lessons/{lesson_id}/report", block
+        assert block["blocked_ms"] >= BLOCK * 1000 * 0.9, block
+        assert "time.sleep(BLOCK)" in block["stack"][-1] and "read_report_from_disk" in block["stack"][-1], block
+        assert any("blocking_handler" in frame for frame in block["stack"]), block
+        print(f"blocking handler: {block['blocked_ms']} ms in {block['route']}, stack ends in\n{block['stack'][-1]}")
+
+        assert await call("POST", "/chat") == 200
+        await asyncio.sleep(0.1)
+        assert monitor.blocked == 2, monitor.snapshot()
+        block = monitor.recent[-1]
+        assert block["route"] == "POST /chat", block
+        assert "read_report_from_disk" in block["stack"][-1], block
+        print(f"blocking stream body: {block['blocked_ms']} ms in {block['route']} (task {block['task']})")
+
+        print("loop:", json.dumps({k: v for k, v in monitor.snapshot().items() if k != "recent_blocks"}))
+    finally:
+        await monitor.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""Checks the pre-warmed HeyGen streaming token pool against a slow local HeyGen stub.
+
+Asserts that:
+  * after startup one token is ready and POST /api/heygen/token returns it without waiting for HeyGen;
+  * every token is handed out once;
+  * a burst of session starts drains the pool (the rest fall back to a direct fetch), the target
+    depth rises with the start rate, and the next burst of the same size is served from the pool;
+  * tokens whose JWT `exp` is close are dropped and replaced, never handed out.
+
+Prints avatar-start token latency from the pool vs the direct fetch it replaces.
+
+Run from edura_core/:
+    python -m bench.check_token_pool [--heygen-delay 0.4] [--burst 6]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import statistics
+import time
+
+import aiohttp
+
+from bench.server import metrics_snapshot, run_app
+from bench.stubs import heygen_app, start_stub
+
+
+async def take(client, base_url):
+    started = time.perf_counter()
+    async with client.post(base_url + "/api/heygen/token") as r:
+        assert r.status == 200, await r.text()
+        token = (await r.json())["data"]["token"]
+    return token, time.perf_counter() - started
+
+
+async def pool_stats(client, base_url):
+    return (await metrics_snapshot(client, base_url))["token_pool"]
+
+
+async def wait_for_depth(client, base_url, depth):
+    for _ in range(100):
+        stats = await pool_stats(client, base_url)
+        if stats["depth"] >= depth:
+            return stats
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"pool never reached depth {depth}: {stats}")
+
+
+def seconds_left(token):
+    payload = token.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))["exp"] - time.time()
+
+
+async def main(args):
+    heygen = heygen_app(delay=args.heygen_delay)
+    runner, heygen_url = await start_stub(heygen)
+    env = {
+        "HEYGEN_API_KEY": "stub",
+        "HEYGEN_API_URL": heygen_url,
+        "HEYGEN_TOKEN_POOL_MIN": "1",
+        "HEYGEN_TOKEN_POOL_MAX": str(args.burst),
+        # A burst of N starts within the window asks for N tokens
+        "HEYGEN_TOKEN_POOL_WINDOW": "20",
+        "HEYGEN_TOKEN_POOL_HORIZON": "20",
+        "AVATAR_REAPER_ENABLED": "false",
+    }
+    try:
+        async with run_app(env) as (base_url, _):
+            async with aiohttp.ClientSession() as client:
+                await wait_for_depth(client, base_url, 1)
+                token, pooled = await take(client, base_url)
+                assert pooled < args.heygen_delay, pooled
+                print(f"warm: token ready at startup, handed out in {pooled * 1000:.1f} ms")
+
+                await wait_for_depth(client, base_url, 1)
+                first = await asyncio.gather(*(take(client, base_url) for _ in range(args.burst)))
+                stats = await pool_stats(client, base_url)
+                direct = [t for _, t in first if t >= args.heygen_delay]
+                assert stats["fallbacks"] == len(direct) == args.burst - 1, stats
+                assert stats["target"] == args.burst, stats
+
+                await wait_for_depth(client, base_url, args.burst)
+                second = await asyncio.gather(*(take(client, base_url) for _ in range(args.burst)))
+                assert all(t < args.heygen_delay for _, t in second), [t for _, t in second]
+                tokens = [token] + [t for t, _ in first + second]
+                assert len(set(tokens)) == len(tokens), "a token was handed out twice"
+                stats = await pool_stats(client, base_url)
+                print(f"burst of {args.burst}: first {args.burst - 1} fell back to HeyGen "
+                      f"(p50 {statistics.median(direct) * 1000:.0f} ms); pool grew to {args.burst}, "
+                      f"next burst p50 {statistics.median(t for _, t in second) * 1000:.1f} ms")
+                print(f"pool: {stats}")
+
+        heygen["token_ttl"] = 3.0
+        env.update({"HEYGEN_TOKEN_MIN_REMAINING": "1.5", "HEYGEN_TOKEN_POOL_MAX": "2"})
+        async with run_app(env) as (base_url, _):
+            async with aiohttp.ClientSession() as client:
+                await wait_for_depth(client, base_url, 1)
+                await asyncio.sleep(2.5)
+                token, _ = await take(client, base_url)
+                stats = await pool_stats(client, base_url)
+                assert stats["expired"] >= 1 and seconds_left(token) > 1.5, (stats, seconds_left(token))
+                print(f"expiry: {stats['expired']} token(s) dropped before their exp claim; "
+                      f"the one handed out had {seconds_left(token):.1f} s left")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heygen-delay", type=float, default=0.4)
+    parser.add_argument("--burst", type=int, default=6)
+    asyncio.run(main(parser.parse_args()))
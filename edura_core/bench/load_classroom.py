@@ -0,0 +1,479 @@
+"""Load test: realistic classroom traffic against the API with every upstream stubbed.
+
+Starts local OpenAI (SSE), HeyGen and homework-server stubs plus the API, then
+runs --students virtual students for --duration seconds. Each student loops:
+pick an operation from the traffic mix, run it, think for a random (exponential,
+mean --think) pause. Operations:
+
+  lesson_qa      POST /api/chat, a growing lesson conversation (SSE)
+  hw_chat        POST /api/hw/chat/{session_id} on the student's own session (SSE)
+  history_write  POST /api/history
+  history_read   GET  /api/history/{sessionId}
+  sessions_read  GET  /api/sessions
+  topics_read    GET  /api/topics
+  post_homework  POST /api/sessions/post_homework/{id}, proxied to the homework server
+  avatar_token   POST /api/heygen/token
+
+Reports throughput, per-operation latency, p50/p95/p99 time-to-first-byte and
+stream duration for the SSE operations, API event-loop lag and API memory, and
+writes everything to --output as JSON. Pass --compare with an earlier result to
+print the changes; the exit status is 1 if any of them is worse than
+--tolerance. The API runs with its normal settings, so repeated lesson
+questions may be served by the response cache (its counters are saved under
+"server"); pass --env LLM_CACHE_ENABLED=false to measure upstream streams only.
+
+Event-loop lag is estimated from outside: a probe GETs /api/config/background every
+--probe-interval seconds on its own connection, and its latency above the idle
+median (measured before the load starts) is time the request spent waiting for
+the loop. The API also runs with LOOP_MONITOR_ENABLED, so its own lag figures
+and any blocking calls (route and stack) are saved under "server"/"loop" and
+blocked calls count as a regression. Memory is the RSS of the uvicorn process
+and its workers (Linux /proc).
+
+Run from edura_core/:
+    python -m bench.load_classroom [--mix classroom] [--students 40] [--duration 30]
+        [--output load_classroom.json] [--compare previous.json] [--env LLM_MAX_CONCURRENT_STREAMS=10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+import aiohttp
+
+from bench.server import CORE_DIR, metrics_snapshot, run_app
+from bench.stubs import heygen_app, hw_app, openai_app, start_stub
+
+# Relative weights per operation
+MIXES = {
+    "classroom": {"lesson_qa": 30, "hw_chat": 15, "history_write": 15, "history_read": 5,
+                  "sessions_read": 20, "topics_read": 10, "post_homework": 2, "avatar_token": 3},
+    "homework": {"hw_chat": 55, "history_write": 20, "history_read": 10, "sessions_read": 10, "post_homework": 5},
+    "lesson": {"lesson_qa": 70, "sessions_read": 15, "topics_read": 10, "avatar_token": 5},
+    "reads": {"history_read": 30, "sessions_read": 40, "topics_read": 30},
+}
+STREAMING = ("lesson_qa", "hw_chat")
+
+QUESTIONS = [
+    "What is a noun?",
+    "Can you give me an example of a preposition?",
+    "Why is 'under' a preposition?",
+    "Is 'happiness' a noun?",
+    "What is the difference between a proper noun and a common noun?",
+    "Can you repeat the last part more slowly?",
+    "How do I find the subject of a sentence?",
+    "Can you give me another exercise?",
+]
+
+
+class Recorder:
+    """Collects operations that complete inside the measured window (after warm-up, before the stop time)."""
+
+    def __init__(self):
+        self.recording = False
+        self.until = float("inf")
+        self.latency = defaultdict(list)
+        self.ttfb = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+
+    def ok(self, op, latency, ttfb=None):
+        if not self.recording or time.perf_counter() > self.until:
+            return
+        self.latency[op].append(latency)
+        if ttfb is not None:
+            self.ttfb[op].append(ttfb)
+
+    def error(self, op, detail):
+        if not self.recording or time.perf_counter() > self.until:
+            return
+        self.errors[op] += 1
+        self.error_samples.setdefault(op, str(detail)[:200])
+
+
+class Student:
+    def __init__(self, index, session, base_url, recorder, args):
+        self.index = index
+        self.session = session
+        self.base_url = base_url
+        self.recorder = recorder
+        self.args = args
+        self.rng = random.Random(args.seed * 1000 + index)
+        # No Authorization header: the UI sends none, so lesson chat is unidentified like real clients
+        self.headers = {}
+        self.lesson = []
+        self.hw_session = None
+        self.history_session = f"bench-{uuid.uuid4()}"
+
+    async def run(self, mix, stop_at):
+        ops, weights = zip(*mix.items())
+        while time.perf_counter() < stop_at:
+            op = self.rng.choices(ops, weights)[0]
+            started = time.perf_counter()
+            try:
+                ttfb = await getattr(self, op)()
+            except Exception as e:
+                self.recorder.error(op, repr(e))
+            else:
+                self.recorder.ok(op, time.perf_counter() - started, ttfb)
+            think = self.rng.expovariate(1 / self.args.think) if self.args.think else 0
+            await asyncio.sleep(min(think, max(0.0, stop_at - time.perf_counter())))
+
+    async def _stream(self, path, body):
+        started = time.perf_counter()
+        ttfb = None
+        chunks = []
+        async with self.session.post(self.base_url + path, json=body, headers=self.headers) as response:
+            if response.status != 200:
+                raise RuntimeError(f"{path} -> {response.status}: {(await response.text())[:100]}")
+            async for chunk in response.content.iter_any():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - started
+                chunks.append(chunk)
+        body = b"".join(chunks)
+        if b'"error"' in body or not body.rstrip().endswith(b"[DONE]"):
+            raise RuntimeError(f"{path} stream failed: {body[-200:]!r}")
+        return ttfb, body
+
+    async def _json(self, method, path, body=None):
+        async with self.session.request(method, self.base_url + path, json=body, headers=self.headers) as response:
+            payload = await response.read()
+            if response.status >= 400:
+                raise RuntimeError(f"{path} -> {response.status}: {payload[:100]!r}")
+            return payload
+
+    async def lesson_qa(self):
+        self.lesson.append({"role": "user", "content": self.rng.choice(QUESTIONS)})
+        ttfb, _ = await self._stream("/api/chat", {"messages": self.lesson[-7:]})
+        self.lesson.append({"role": "assistant", "content": "Good question! A noun names a person, place or thing."})
+        return ttfb
+
+    async def hw_chat(self):
+        if self.hw_session is None:
+            student = {"name": f"Student {self.index}"}
+            payload = await self._json("POST", "/api/hw/session/start", {"student_data": student})
+            self.hw_session = json.loads(payload)["session_id"]
+        ttfb, _ = await self._stream(f"/api/hw/chat/{self.hw_session}", {"message": self.rng.choice(QUESTIONS)})
+        return ttfb
+
+    async def history_write(self):
+        record = {
+            "id": str(uuid.uuid4()),
+            "sessionId": self.history_session,
+            "completedParts": self.rng.randint(0, 6),
+            "postedHomework": False,
+            "createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        await self._json("POST", "/api/history", record)
+
+    async def history_read(self):
+        await self._json("GET", f"/api/history/{self.history_session}")
+
+    async def sessions_read(self):
+        await self._json("GET", "/api/sessions")
+
+    async def topics_read(self):
+        await self._json("GET", "/api/topics")
+
+    async def post_homework(self):
+        await self._json("POST", "/api/sessions/post_homework/nouns_1001")
+
+    async def avatar_token(self):
+        await self._json("POST", "/api/heygen/token")
+
+
+def percentiles(values, scale=1000.0):
+    if not values:
+        return None
+    ordered = sorted(values)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+    return {
+        "p50": round(pick(0.50) * scale, 2),
+        "p95": round(pick(0.95) * scale, 2),
+        "p99": round(pick(0.99) * scale, 2),
+        "max": round(ordered[-1] * scale, 2),
+    }
+
+
+def rss_mb(pid):
+    # The uvicorn process plus its worker processes; None where /proc is unavailable
+    total = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+    except (FileNotFoundError, ProcessLookupError):
+        if not total:
+            return None
+    return round(total / 1024, 1)
+
+
+async def probe(base_url, interval, stop, samples):
+    async with aiohttp.ClientSession() as session:
+        while not stop.is_set():
+            started = time.perf_counter()
+            async with session.get(base_url + "/api/config/background") as response:
+                await response.read()
+            samples.append(time.perf_counter() - started)
+            await asyncio.sleep(interval)
+
+
+async def sample_memory(pid, interval, stop, samples):
+    while not stop.is_set():
+        value = rss_mb(pid)
+        if value is not None:
+            samples.append(value)
+        await asyncio.sleep(interval)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=CORE_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def run(args, data_dir):
+    openai = openai_app(ttft=args.ttft, token_delay=args.token_delay, tokens=args.tokens)
+    stubs = [await start_stub(app) for app in (openai, heygen_app(), hw_app())]
+    (_, openai_url), (_, heygen_url), (_, hw_url) = stubs
+    env = {
+        "LLM_PROVIDERS": "openai",
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_API_URL": openai_url + "/v1/chat/completions",
+        "HEYGEN_API_KEY": "stub",
+        "HEYGEN_API_URL": heygen_url,
+        "HW_SERVER_API_KEY": "stub",
+        "HW_API_URL": hw_url,
+        # Writes go to a scratch store, never to app/data
+        "HISTORY_DIR": data_dir,
+        "HW_SESSION_DB": os.path.join(data_dir, "hw_sessions.db"),
+        "AVATAR_REAPER_ENABLED": "false",
+        "LOOP_MONITOR_ENABLED": "true",
+    }
+    if args.workers > 1:
+        # Homework sessions must be visible to whichever worker gets the next turn
+        env["HW_SESSION_BACKEND"] = "sqlite"
+    env.update(item.split("=", 1) for item in args.env)
+
+    recorder = Recorder()
+    mix = MIXES[args.mix]
+    try:
+        async with run_app(env, workers=args.workers) as (base_url, proc):
+            idle_probe = []
+            stop = asyncio.Event()
+            probe_task = asyncio.create_task(probe(base_url, args.probe_interval, stop, idle_probe))
+            await asyncio.sleep(1.0)
+            stop.set()
+            await probe_task
+            idle = statistics.median(idle_probe)
+
+            connector = aiohttp.TCPConnector(limit=0)
+            async with aiohttp.ClientSession(connector=connector) as session:
+                students = [Student(i, session, base_url, recorder, args) for i in range(args.students)]
+                stop_at = time.perf_counter() + args.warmup + args.duration
+                tasks = [asyncio.create_task(student.run(mix, stop_at)) for student in students]
+
+                await asyncio.sleep(args.warmup)
+                memory_start = rss_mb(proc.pid)
+                probe_samples, memory_samples = [], []
+                stop = asyncio.Event()
+                monitors = [
+                    asyncio.create_task(probe(base_url, args.probe_interval, stop, probe_samples)),
+                    asyncio.create_task(sample_memory(proc.pid, 0.5, stop, memory_samples)),
+                ]
+                recorder.until = stop_at
+                recorder.recording = True
+                elapsed = stop_at - time.perf_counter()
+                await asyncio.gather(*tasks)
+                recorder.recording = False
+                stop.set()
+                await asyncio.gather(*monitors)
+                memory_end = rss_mb(proc.pid)
+
+                snapshot = await metrics_snapshot(session, base_url)
+                server = {name: snapshot[name] for name in ("llm", "admission", "cache", "coalesce", "pool", "loop")}
+    finally:
+        for runner, _ in stubs:
+            await runner.cleanup()
+
+    ops = {}
+    for op in mix:
+        done = len(recorder.latency[op])
+        stats = {
+            "count": done,
+            "errors": recorder.errors[op],
+            "rps": round(done / elapsed, 2),
+            "latency_ms": percentiles(recorder.latency[op]),
+        }
+        if op in STREAMING:
+            stats["ttfb_ms"] = percentiles(recorder.ttfb[op])
+        if op in recorder.error_samples:
+            stats["error_sample"] = recorder.error_samples[op]
+        ops[op] = stats
+
+    requests = sum(len(v) for v in recorder.latency.values())
+    errors = sum(recorder.errors.values())
+    streams = [t for op in STREAMING for t in recorder.latency[op]]
+    ttfb = [t for op in STREAMING for t in recorder.ttfb[op]]
+    lag = [max(0.0, sample - idle) for sample in probe_samples]
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+            "mix": mix,
+        },
+        "summary": {
+            "duration_s": round(elapsed, 2),
+            "requests": requests,
+            "errors": errors,
+            "throughput_rps": round(requests / elapsed, 2),
+            "streams": len(streams),
+            "ttfb_ms": percentiles(ttfb),
+            "stream_ms": percentiles(streams),
+        },
+        "ops": ops,
+        "event_loop_lag_ms": dict(percentiles(lag) or {}, idle_probe_ms=round(idle * 1000, 2), samples=len(lag)),
+        "memory_mb": {
+            "start": memory_start,
+            "peak": max(memory_samples) if memory_samples else None,
+            "end": memory_end,
+        },
+        "server": server,
+    }
+
+
+# (label, path into the result, True when larger is better)
+COMPARED = [
+    ("throughput rps", ("summary", "throughput_rps"), True),
+    ("errors", ("summary", "errors"), False),
+    ("TTFB p50 ms", ("summary", "ttfb_ms", "p50"), False),
+    ("TTFB p95 ms", ("summary", "ttfb_ms", "p95"), False),
+    ("TTFB p99 ms", ("summary", "ttfb_ms", "p99"), False),
+    ("stream p50 ms", ("summary", "stream_ms", "p50"), False),
+    ("stream p95 ms", ("summary", "stream_ms", "p95"), False),
+    ("stream p99 ms", ("summary", "stream_ms", "p99"), False),
+    ("loop lag p99 ms", ("event_loop_lag_ms", "p99"), False),
+    ("server loop lag p99 ms", ("server", "loop", "lag_p99_ms"), False),
+    ("blocked loop callbacks", ("server", "loop", "blocked"), False),
+    ("memory peak MB", ("memory_mb", "peak"), False),
+]
+
+
+def lookup(result, path):
+    for key in path:
+        if not isinstance(result, dict) or result.get(key) is None:
+            return None
+        result = result[key]
+    return result
+
+
+def compare(previous, current, tolerance):
+    """Prints old -> new for the headline numbers; returns the labels that got worse by more than `tolerance`."""
+    regressions = []
+    paths = list(COMPARED)
+    for op in current["ops"]:
+        paths.append((f"{op} p95 ms", ("ops", op, "latency_ms", "p95"), False))
+    print(f"\ncompared with {previous['meta'].get('git')} ({previous['meta'].get('timestamp')}):")
+    for label, path, higher_is_better in paths:
+        old, new = lookup(previous, path), lookup(current, path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else (0.0 if new == old else float("inf"))
+        worse = -change if higher_is_better else change
+        # Sub-millisecond timings are noise, not regressions
+        flagged = worse > tolerance and (abs(new - old) >= 1 or label in ("errors", "throughput rps"))
+        if label == "blocked loop callbacks":
+            # Any new blocking call is a regression, however few there were before
+            flagged = new > old
+        if flagged:
+            regressions.append(label)
+        print(f"  {label:24s} {old:10.2f} -> {new:10.2f}  {change * 100:+7.1f}%{'  REGRESSION' if flagged else ''}")
+    return regressions
+
+
+def report(result):
+    summary = result["summary"]
+    print(f"{result['meta']['args']['students']} students, mix {result['meta']['args']['mix']!r}, "
+          f"{summary['duration_s']}s: {summary['requests']} requests ({summary['throughput_rps']} rps), "
+          f"{summary['errors']} errors")
+    for op, stats in result["ops"].items():
+        latency = stats["latency_ms"] or {}
+        line = (f"  {op:14s} n={stats['count']:5d} err={stats['errors']:3d}  "
+                f"p50={latency.get('p50', 0):8.1f}ms p95={latency.get('p95', 0):8.1f}ms p99={latency.get('p99', 0):8.1f}ms")
+        if stats.get("ttfb_ms"):
+            line += f"   TTFB p50={stats['ttfb_ms']['p50']:7.1f}ms p99={stats['ttfb_ms']['p99']:7.1f}ms"
+        print(line)
+        if "error_sample" in stats:
+            print(f"    e.g. {stats['error_sample']}")
+    lag = result["event_loop_lag_ms"]
+    if "p50" in lag:
+        print(f"  event-loop lag p50={lag['p50']}ms p99={lag['p99']}ms max={lag['max']}ms "
+              f"(idle probe {lag['idle_probe_ms']}ms)")
+    loop = result["server"].get("loop") or {}
+    if loop.get("enabled"):
+        print(f"  server loop lag p50={loop['lag_p50_ms']}ms p99={loop['lag_p99_ms']}ms, "
+              f"{loop['blocked']} callbacks blocked > {loop['threshold_ms']}ms")
+        for block in loop["recent_blocks"][-3:]:
+            print(f"    {block['blocked_ms']} ms in {block['route'] or block['task']}")
+    memory = result["memory_mb"]
+    print(f"  memory start={memory['start']}MB peak={memory['peak']}MB end={memory['end']}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mix", choices=sorted(MIXES), default="classroom")
+    parser.add_argument("--students", type=int, default=40)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--think", type=float, default=1.0, help="mean pause between a student's requests (s)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--ttft", type=float, default=0.3, help="stub LLM time to first token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--tokens", type=int, default=60)
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra API settings, e.g. --env LLM_CACHE_ENABLED=false")
+    parser.add_argument("--output", default="load_classroom.json")
+    parser.add_argument("--compare", metavar="PREVIOUS_JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="edura-load-") as data_dir:
+        result = asyncio.run(run(args, data_dir))
+    report(result)
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        regressions = compare(previous, result, args.tolerance)
+        if regressions:
+            print(f"regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
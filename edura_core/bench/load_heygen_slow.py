@@ -0,0 +1,96 @@
+"""Load test: chat streaming latency while HeyGen is slow.
+
+Starts local OpenAI and HeyGen stubs plus the API, then measures /api/chat
+time-to-first-byte and stream duration twice: once on its own and once while
+a batch of /api/heygen/active_sessions calls is stuck on an artificially slow
+HeyGen. With blocking proxies the second run degrades by the HeyGen delay; with
+the async client it should stay flat.
+
+Run from edura_core/:
+    python -m bench.load_heygen_slow [--streams 20] [--heygen-delay 2] [--heygen-calls 10]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiohttp
+
+from bench.server import run_app
+from bench.stubs import heygen_app, openai_app, start_stub
+
+
+async def one_stream(session, base_url, i):
+    started = time.perf_counter()
+    ttfb = None
+    body = {"messages": [{"role": "user", "content": f"[SYSTEM CONTEXT: nouns]\n\nUser Question: question {i}"}]}
+    async with session.post(base_url + "/api/chat", json=body) as response:
+        async for _ in response.content.iter_any():
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+    return ttfb, time.perf_counter() - started
+
+
+async def chat_round(session, base_url, streams):
+    results = await asyncio.gather(*(one_stream(session, base_url, i) for i in range(streams)))
+    ttfb = sorted(r[0] for r in results)
+    total = sorted(r[1] for r in results)
+    return ttfb, total
+
+
+def pct(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def report(name, ttfb, total):
+    print(f"{name:28s} TTFB p50={pct(ttfb, .5) * 1000:7.1f}ms p95={pct(ttfb, .95) * 1000:7.1f}ms   "
+          f"stream p50={pct(total, .5) * 1000:7.1f}ms p95={pct(total, .95) * 1000:7.1f}ms")
+
+
+async def main(args):
+    openai_runner, openai_url = await start_stub(openai_app())
+    heygen = heygen_app(delay=args.heygen_delay)
+    heygen_runner, heygen_url = await start_stub(heygen)
+    env = {
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_API_URL": openai_url + "/v1/chat/completions",
+        "HEYGEN_API_KEY": "stub",
+        "HEYGEN_API_URL": heygen_url,
+        "HEYGEN_TIMEOUT": str(args.heygen_delay * 4),
+        # Measure real upstream streams, not cache replays or coalesced followers
+        "LLM_CACHE_ENABLED": "false",
+        "LLM_COALESCE_ENABLED": "false",
+    }
+    try:
+        async with run_app(env) as (base_url, _):
+            async with aiohttp.ClientSession() as session:
+                await chat_round(session, base_url, 2)  # warm up the pool
+
+                baseline = await chat_round(session, base_url, args.streams)
+
+                async def slow_heygen():
+                    # Not avatar_list: that is cached now, so only one of these calls would reach HeyGen
+                    async with session.get(base_url + "/api/heygen/active_sessions") as response:
+                        await response.read()
+
+                heygen_calls = [asyncio.create_task(slow_heygen()) for _ in range(args.heygen_calls)]
+                await asyncio.sleep(0.05)
+                loaded = await chat_round(session, base_url, args.streams)
+                await asyncio.gather(*heygen_calls)
+
+        print(f"{args.streams} concurrent chat streams, {args.heygen_calls} HeyGen calls delayed {args.heygen_delay}s")
+        report("chat alone", *baseline)
+        report("chat + slow HeyGen", *loaded)
+        ratio = statistics.median(loaded[0]) / statistics.median(baseline[0])
+        print(f"median TTFB ratio (loaded / alone): {ratio:.2f}")
+    finally:
+        await openai_runner.cleanup()
+        await heygen_runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--heygen-delay", type=float, default=2.0)
+    parser.add_argument("--heygen-calls", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,57 @@
+"""Runs the Edura API (main:app, or another ASGI app) under uvicorn in a subprocess for benchmarks."""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+CORE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# METRICS_API_KEY of every API started here
+METRICS_KEY = "bench"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def run_app(env: dict, workers: int = 1, app: str = "main:app", factory: bool = False):
+    port = free_port()
+    proc_env = dict(os.environ, PYTHONUNBUFFERED="1", METRICS_API_KEY=METRICS_KEY)
+    proc_env.update(env)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"] + (["--factory"] if factory else []),
+        cwd=CORE_DIR, env=proc_env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        async with aiohttp.ClientSession() as session:
+            for _ in range(100):
+                try:
+                    async with session.get(base_url + "/") as response:
+                        if response.status == 200:
+                            break
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("API did not start")
+        yield base_url, proc
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+async def metrics_snapshot(session: aiohttp.ClientSession, base_url: str) -> dict:
+    async with session.get(base_url + "/api/metrics/snapshot", headers={"x-api-key": METRICS_KEY}) as response:
+        assert response.status == 200, response.status
+        return await response.json()
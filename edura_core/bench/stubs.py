@@ -0,0 +1,149 @@
+"""Local stand-ins for the upstream services (OpenAI SSE, HeyGen, HW server).
+
+Each factory returns an aiohttp.web.Application; `start_stub` serves it on an
+ephemeral localhost port. Delays live in `app["delay"]` etc. so a benchmark
+can slow an upstream down while it runs.
+"""
+import asyncio
+import base64
+import json
+import time
+import uuid
+
+from aiohttp import web
+
+
+def openai_app(ttft: float = 0.05, token_delay: float = 0.01, tokens: int = 40) -> web.Application:
+    app = web.Application()
+    app["ttft"] = ttft
+    app["token_delay"] = token_delay
+    app["tokens"] = tokens
+    app["requests"] = 0
+    # Streams currently being written, and when each aborted one noticed its client had gone
+    app["open_streams"] = 0
+    app["aborted_at"] = []
+
+    words = "Good question! A noun is a word that names a person, place, thing or idea. Do you want me to continue the lesson?".split()
+
+    async def chat(request):
+        await request.json()
+        request.app["requests"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        request.app["open_streams"] += 1
+        async def pause(seconds):
+            # Sleep in short steps so a client that hangs up is noticed even before the first token
+            deadline = asyncio.get_running_loop().time() + seconds
+            while True:
+                if request.transport is None or request.transport.is_closing():
+                    raise ConnectionResetError()
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    return
+                await asyncio.sleep(min(remaining, 0.01))
+
+        try:
+            await pause(request.app["ttft"])
+            for i in range(request.app["tokens"]):
+                event = {"choices": [{"index": 0, "delta": {"content": words[i % len(words)] + " "}}]}
+                await response.write(b"data: " + json.dumps(event).encode() + b"\n\n")
+                await pause(request.app["token_delay"])
+            await response.write(b"data: [DONE]\n\n")
+        except ConnectionResetError:
+            request.app["aborted_at"].append(asyncio.get_running_loop().time())
+        except asyncio.CancelledError:
+            request.app["aborted_at"].append(asyncio.get_running_loop().time())
+            raise
+        finally:
+            request.app["open_streams"] -= 1
+        return response
+
+    app.router.add_post("/v1/chat/completions", chat)
+    return app
+
+
+def heygen_app(delay: float = 0.0) -> web.Application:
+    app = web.Application()
+    app["delay"] = delay
+    app["sessions"] = set()
+    app["calls"] = {}
+    # Set to make every endpoint answer 503, as during a HeyGen outage
+    app["down"] = False
+    # Seconds until issued tokens expire; None issues opaque tokens without an expiry
+    app["token_ttl"] = None
+
+    def handler(name, fn):
+        async def wrapped(request):
+            request.app["calls"][name] = request.app["calls"].get(name, 0) + 1
+            if request.app["delay"]:
+                await asyncio.sleep(request.app["delay"])
+            if request.app["down"]:
+                return web.json_response({"code": 503, "message": "Service Unavailable"}, status=503)
+            return await fn(request)
+        return wrapped
+
+    async def create_token(request):
+        ttl = request.app["token_ttl"]
+        if ttl is None:
+            return web.json_response({"error": None, "data": {"token": f"stub-{uuid.uuid4()}"}})
+        # JWT-shaped, so the API can read the expiry from the `exp` claim
+        claims = json.dumps({"exp": time.time() + ttl, "jti": str(uuid.uuid4())}).encode()
+        payload = base64.urlsafe_b64encode(claims).rstrip(b"=").decode()
+        return web.json_response({"error": None, "data": {"token": f"stub.{payload}.sig"}})
+
+    async def avatar_list(request):
+        return web.json_response({"code": 100, "data": [{"avatar_id": "stub_avatar", "status": "ACTIVE"}]})
+
+    async def streaming_list(request):
+        sessions = [{"session_id": sid, "status": "connected"} for sid in sorted(request.app["sessions"])]
+        return web.json_response({"code": 100, "data": {"sessions": sessions}})
+
+    async def streaming_stop(request):
+        body = await request.json()
+        session_id = body.get("session_id")
+        if session_id not in request.app["sessions"]:
+            return web.json_response({"code": 10005, "message": "Session not found"}, status=400)
+        request.app["sessions"].discard(session_id)
+        return web.json_response({"code": 100, "message": "success"})
+
+    async def remaining_quota(request):
+        return web.json_response({"error": None, "data": {"remaining_quota": 3600}})
+
+    app.router.add_post("/v1/streaming.create_token", handler("create_token", create_token))
+    app.router.add_get("/v1/streaming/avatar.list", handler("avatar_list", avatar_list))
+    app.router.add_get("/v1/streaming.list", handler("list", streaming_list))
+    app.router.add_post("/v1/streaming.stop", handler("stop", streaming_stop))
+    app.router.add_get("/v2/user/remaining_quota", handler("remaining_quota", remaining_quota))
+    return app
+
+
+def hw_app(delay: float = 0.0) -> web.Application:
+    app = web.Application()
+    app["delay"] = delay
+
+    async def login(request):
+        await asyncio.sleep(request.app["delay"])
+        body = await request.json()
+        return web.json_response({"token": f"stub-{body.get('email')}", "user": {"email": body.get("email")}})
+
+    async def check_api(request):
+        await asyncio.sleep(request.app["delay"])
+        return web.json_response({"status": "ok"})
+
+    async def post_by_chapter(request):
+        await asyncio.sleep(request.app["delay"])
+        return web.json_response({"status": "posted", "chapter": request.match_info["chapter_id"]})
+
+    app.router.add_post("/api/login", login)
+    app.router.add_get("/api/check_api", check_api)
+    app.router.add_put("/api/post_by_chapter/{chapter_id}", post_by_chapter)
+    return app
+
+
+async def start_stub(app: web.Application):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
@@ -1,11 +1,53 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
-from app.routers import chat, prompts, topics, sessions, config, heygen, history, hw_chat, english_chat, auth
+from starlette.concurrency import run_in_threadpool
+from app.routers import chat, prompts, topics, sessions, config, heygen, history, hw_chat, english_chat, auth, metrics
+from app.core.config import settings
+from app.services.http import http_pool
+from app.services.heygen import cached_lookups, token_pool
+from app.services.avatar_sessions import avatar_reaper, avatar_registry
+from app.services.history_store import get_history_store, close_history_store
+from app.services.session_store import hw_sessions, english_sessions
+from app.services.telemetry import MetricsMiddleware
+from app.services.loop_monitor import loop_monitor
+from app.services.backgrounds import background_store
+from app.services.media import CachedStaticFiles, IMMUTABLE, PublicStaticFiles, lesson_videos
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.LOOP_MONITOR_ENABLED:
+        # First, so blocking calls made during startup are reported too
+        loop_monitor.start()
+    # Outbound connections (LLM, HeyGen, HW server) share one keep-alive pool for the app lifetime
+    await http_pool.start()
+    app.state.http_pool = http_pool
+    if settings.HEYGEN_API_KEY:
+        # The first avatar start then finds the avatar list and credits already cached
+        for lookup in cached_lookups:
+            lookup.warm()
+        if settings.HEYGEN_TOKEN_POOL_MAX > 0:
+            token_pool.start()
+    # Opens the history store and migrates a legacy history.json on first start
+    await run_in_threadpool(get_history_store)
+    if settings.AVATAR_REAPER_ENABLED:
+        avatar_reaper.start()
+    yield
+    await avatar_reaper.stop()
+    await token_pool.stop()
+    for lookup in cached_lookups:
+        await lookup.close()
+    await http_pool.close()
+    await run_in_threadpool(close_history_store)
+    background_store.close()
+    hw_sessions.close()
+    english_sessions.close()
+    avatar_registry.close()
+    await loop_monitor.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -14,8 +56,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Session-Id", "X-Cache"],
 )
 
+# Request timing for /api/metrics; added last so it wraps CORS and sees every response
+app.add_middleware(MetricsMiddleware)
+
 # Include Routers
 app.include_router(chat.router, prefix="/api", tags=["Chat"])
 app.include_router(prompts.router, prefix="/api", tags=["System"])
@@ -27,9 +73,14 @@ app.include_router(history.router, prefix="/api", tags=["History"])
 app.include_router(hw_chat.router, prefix="/api/hw", tags=["Homework Chat"])
 app.include_router(english_chat.router, prefix="/api/english", tags=["English Chat"])
 app.include_router(auth.router, prefix="/api", tags=["Auth"])
+app.include_router(metrics.router, prefix="/api", tags=["Metrics"])
 
-# Mount the data directory to serve videos and other media
-app.mount("/api/media", StaticFiles(directory="app/data"), name="media")
+# Background images are content-addressed, so browsers and CDNs may cache them forever
+app.mount("/api/media/backgrounds", CachedStaticFiles(directory=settings.BACKGROUND_DIR, check_dir=False, cache_control=IMMUTABLE), name="backgrounds")
+# Lesson videos: byte ranges, conditional requests and an in-memory head cache for fast playback start
+app.mount("/api/media/Videos", lesson_videos, name="videos")
+# Mount the data directory to serve other media; databases and history files in it are never served
+app.mount("/api/media", PublicStaticFiles(directory="app/data"), name="media")
 
 # Static files are no longer served by FastAPI as we moved to a React UI.
 # The React app handles the frontend, and FastAPI serves as the API backend.
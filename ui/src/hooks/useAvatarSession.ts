@@ -16,6 +16,8 @@ export const useAvatarSession = () => {
     const [isSpeaking, setIsSpeaking] = useState(false);
     const [avatarService] = useState(() => new HeyGenService());
     const [remoteStream, setRemoteStream] = useState<MediaStream | null>(null);
+    const heartbeatRef = useRef<ReturnType<typeof setInterval> | null>(null);
+    const heygenSessionIdRef = useRef<string | null>(null);
     
     // We might get separate audio/video tracks or a single stream.
     // WebRTC ontrack usually gives a track and a stream.
@@ -33,7 +35,7 @@ export const useAvatarSession = () => {
             // Initialize and start
             await avatarService.initialize(token);
             
-            await avatarService.startSession({
+            const heygenSessionId = await avatarService.startSession({
                 quality: AvatarQuality.Low,
                 avatarName: config.avatarCharacter,
                 voice: {
@@ -45,6 +47,19 @@ export const useAvatarSession = () => {
             });
 
             setIsSessionActive(true);
+
+            // Heartbeat so the backend reaper can stop this avatar if the tab dies
+            if (heygenSessionId) {
+                heygenSessionIdRef.current = heygenSessionId;
+                ApiClient.registerAvatarSession(heygenSessionId)
+                    .then((ttl) => {
+                        const intervalMs = Math.max(2000, (ttl * 1000) / 3);
+                        heartbeatRef.current = setInterval(() => {
+                            ApiClient.heartbeatAvatarSession(heygenSessionId).catch(() => {});
+                        }, intervalMs);
+                    })
+                    .catch((e) => console.warn("[USEAVATARSERVICE] Failed to register avatar session:", e));
+            }
             
         } catch (error) {
             console.error("[USEAVATARSERVICE] Failed to start session:", error);
@@ -54,6 +69,14 @@ export const useAvatarSession = () => {
     }, [avatarService]);
 
     const stopSession = useCallback(async () => {
+        if (heartbeatRef.current) {
+            clearInterval(heartbeatRef.current);
+            heartbeatRef.current = null;
+        }
+        if (heygenSessionIdRef.current) {
+            ApiClient.unregisterAvatarSession(heygenSessionIdRef.current).catch(() => {});
+            heygenSessionIdRef.current = null;
+        }
         setIsSessionActive(false);
         setRemoteStream(null);
         await avatarService.stopSpeaking();
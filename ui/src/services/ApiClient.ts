@@ -68,6 +68,22 @@ class ApiClientService {
         return json.data;
     }
 
+    // Lets the backend reaper stop the avatar if this tab dies without cleaning up
+    async registerAvatarSession(sessionId: string): Promise<number> {
+        const response = await fetch(`${this.BASE_URL}/api/heygen/sessions/${sessionId}`, { method: 'POST' });
+        if (!response.ok) throw new Error('Failed to register avatar session');
+        const json = await response.json();
+        return json.heartbeat_ttl;
+    }
+
+    async heartbeatAvatarSession(sessionId: string): Promise<void> {
+        await fetch(`${this.BASE_URL}/api/heygen/sessions/${sessionId}/heartbeat`, { method: 'POST', keepalive: true });
+    }
+
+    async unregisterAvatarSession(sessionId: string): Promise<void> {
+        await fetch(`${this.BASE_URL}/api/heygen/sessions/${sessionId}`, { method: 'DELETE', keepalive: true });
+    }
+
     async uploadBackgroundImage(file: File): Promise<string> {
         const formData = new FormData();
         formData.append('file', file);
@@ -68,10 +68,11 @@ export class HeyGenService {
         this.avatar.on("stream_disconnected", (e) => this.eventHandler({type: "stream_disconnected", detail: e.detail}));
     }
 
-    async startSession(config: StartAvatarRequest): Promise<void> {
+    async startSession(config: StartAvatarRequest): Promise<string | undefined> {
         if (!this.avatar) throw new Error("HeyGenService not initialized");
         try {
-            await this.avatar.createStartAvatar(config);
+            const sessionInfo: any = await this.avatar.createStartAvatar(config);
+            return sessionInfo?.session_id;
         } catch (e) {
             console.error("Failed to start avatar:", e);
             throw e;